@@ -0,0 +1,83 @@
+import os
+import re
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+from app.services import blob_store
+
+router = APIRouter()
+
+_RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+# Nội dung của một blob id không bao giờ thay đổi
+_CACHE_CONTROL = "public, max-age=31536000, immutable"
+_CHUNK_SIZE = 64 * 1024
+
+
+def _strip_weak(tag: str) -> str:
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def _iter_file(f, start: int, length: int):
+    """Đọc file theo từng khối từ `start`, tối đa `length` byte, rồi đóng file."""
+    try:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(_CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        f.close()
+
+
+@router.get("/blobs/{blob_id}", tags=["Blob"])
+def get_blob(blob_id: str, request: Request):
+    """Trả về ảnh đã lưu trong kho blob (đọc từng khối), hỗ trợ ETag (304), Range (206) và If-Range."""
+    path = blob_store.blob_path(blob_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Không tìm thấy blob.")
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Không tìm thấy blob.")
+    size = os.fstat(f.fileno()).st_size
+
+    etag = f'"{blob_id.split(".")[0]}"'
+    headers = {"ETag": etag, "Cache-Control": _CACHE_CONTROL, "Accept-Ranges": "bytes"}
+    media_type = blob_store.MIME_TYPES[os.path.splitext(blob_id)[1]]
+
+    # If-None-Match dùng so sánh yếu: W/"x" khớp với "x"
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and (
+        if_none_match.strip() == "*" or etag in [_strip_weak(tag) for tag in if_none_match.split(",")]
+    ):
+        f.close()
+        return Response(status_code=304, headers=headers)
+
+    range_header = request.headers.get("range")
+    # If-Range dùng so sánh mạnh; không khớp (hoặc là một ngày) thì trả toàn bộ nội dung
+    if_range = request.headers.get("if-range")
+    if range_header and (if_range is None or if_range.strip() == etag):
+        match = _RANGE_PATTERN.match(range_header.strip())
+        if match and any(match.groups()):
+            start_text, end_text = match.groups()
+            if start_text:
+                start = int(start_text)
+                end = min(int(end_text), size - 1) if end_text else size - 1
+            else:
+                # bytes=-N: N byte cuối
+                start = max(0, size - int(end_text))
+                end = size - 1
+            if start >= size or start > end:
+                f.close()
+                return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+            length = end - start + 1
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+            headers["Content-Length"] = str(length)
+            return StreamingResponse(
+                _iter_file(f, start, length), status_code=206, media_type=media_type, headers=headers
+            )
+
+    headers["Content-Length"] = str(size)
+    return StreamingResponse(_iter_file(f, 0, size), media_type=media_type, headers=headers)
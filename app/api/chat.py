@@ -1,9 +1,9 @@
 from fastapi import APIRouter, UploadFile, File, Form, HTTPException
 from fastapi.responses import StreamingResponse
 from app.models.schemas import ChatRequest
-from app.services import gemini_service
-from app.services.file_parser import parse_file
-import shutil
+from app.services import gemini_service, file_ingest, image_preprocess, sse
+from app.services.file_parser import is_supported
+from app.core.config import UPLOAD_MAX_BYTES
 from pathlib import Path
 
 router = APIRouter()
@@ -14,51 +14,95 @@ UPLOAD_DIR.mkdir(exist_ok=True)
 @router.post("/chat-agent", tags=["AI Agent"])
 async def chat_agent_endpoint(request: ChatRequest):
     return StreamingResponse(
-        gemini_service.process_user_request(prompt=request.prompt, session_id=request.session_id),
-        media_type="text/event-stream"
+        sse.coalesce(gemini_service.process_user_request(
+            prompt=request.prompt,
+            session_id=request.session_id,
+            latency_budget_ms=request.latency_budget_ms
+        )),
+        media_type="text/event-stream",
+        headers=sse.SSE_HEADERS
     )
 
+async def _stream_with_file(
+    prompt: str,
+    session_id: str,
+    filename: str,
+    mime_type: str | None,
+    image_bytes: bytes | None,
+    file_path: Path | None,
+    file_digest: str | None,
+    latency_budget_ms: int | None
+):
+    file_content = None
+    if image_bytes is not None:
+        # Thu nhỏ và nén lại ảnh trên worker pool; mime_type lấy theo định dạng thật của ảnh
+        try:
+            prepared = await image_preprocess.prepare_image(image_bytes, mime_type=mime_type)
+        except Exception as e:
+            yield sse.error(f"Lỗi khi xử lý ảnh: {str(e)}")
+            return
+        image_bytes, mime_type = prepared.data, prepared.mime_type
+
+    if file_path is not None:
+        # Phân tích file trong thread pool, đồng thời báo tiến độ cho client
+        parse_future = file_ingest.start_parse(file_path, file_digest)
+        try:
+            async for event in file_ingest.parse_progress_events(parse_future, filename):
+                yield event
+            file_content = await parse_future
+        except Exception as e:
+            yield sse.error(f"Lỗi khi xử lý file: {str(e)}")
+            return
+        finally:
+            file_ingest.remove_upload(file_path)
+
+    async for event in gemini_service.process_user_request(
+        prompt=prompt,
+        session_id=session_id,
+        image_bytes=image_bytes,
+        file_content=file_content,
+        filename=filename,
+        mime_type=mime_type,
+        latency_budget_ms=latency_budget_ms
+    ):
+        yield event
+
 @router.post("/chat-with-file", tags=["AI Agent with File"])
 async def chat_with_file_endpoint(
     session_id: str = Form(...),
     prompt: str = Form(...),
-    file: UploadFile = File(...)
+    file: UploadFile = File(...),
+    latency_budget_ms: int | None = Form(None)
 ):
     if not file:
         raise HTTPException(status_code=400, detail="Không có file nào được tải lên.")
-    if file.size > 100 * 1024 * 1024:
-        raise HTTPException(status_code=413, detail="Kích thước file vượt quá 100MB.")
+    # file.size có thể không có; giới hạn thực sự được kiểm tra khi đọc từng khối
+    if file.size is not None and file.size > UPLOAD_MAX_BYTES:
+        raise HTTPException(status_code=413, detail=file_ingest.too_large_message())
 
-    file_extension = Path(file.filename).suffix.lower()
+    filename = file.filename or "upload"
+    file_extension = Path(filename).suffix.lower()
     is_image = file_extension in ['.png', '.jpg', '.jpeg', '.webp', '.heic', '.heif']
-    
-    file_content = None
+    if not is_image and not is_supported(Path(filename)):
+        raise HTTPException(status_code=400, detail=f"Định dạng file '{file_extension}' không được hỗ trợ.")
+
     image_bytes = None
+    file_path = None
+    file_digest = None
 
     try:
         if is_image:
-            # --- THAY ĐỔI: ĐỌC BYTES TRỰC TIẾP ---
-            image_bytes = await file.read()
+            image_bytes = await file_ingest.read_upload_bytes(file)
         else:
-            # Lưu file tạm thời để các parser đọc
-            file_path = UPLOAD_DIR / file.filename
-            with file_path.open("wb") as buffer:
-                shutil.copyfileobj(file.file, buffer)
-            file_content = parse_file(file_path)
-
-    except ValueError as ve:
-        raise HTTPException(status_code=400, detail=str(ve))
+            # Ghi file tạm với tên duy nhất để các parser đọc
+            file_path, file_digest = await file_ingest.save_upload(file, UPLOAD_DIR)
+    except file_ingest.UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Lỗi khi xử lý file: {str(e)}")
 
     return StreamingResponse(
-        gemini_service.process_user_request(
-            prompt=prompt,
-            session_id=session_id,
-            image_bytes=image_bytes,
-            file_content=file_content,
-            filename=file.filename,
-            mime_type=file.content_type
-        ),
-        media_type="text/event-stream"
-    )
\ No newline at end of file
+        sse.coalesce(_stream_with_file(prompt, session_id, filename, file.content_type, image_bytes, file_path, file_digest, latency_budget_ms)),
+        media_type="text/event-stream",
+        headers=sse.SSE_HEADERS
+    )
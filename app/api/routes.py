@@ -1,16 +1,20 @@
 from fastapi import APIRouter
 from fastapi.responses import StreamingResponse
-from app.schemas import ChatPayload, ChatAgentRequest, ChatRequest
+from app.models.schemas6 import ChatPayload, ChatAgentRequest
 from app.memory_store import MemoryStore
 import json, asyncio
 
+# Router chat của backend lưu file (config2/schemas6), gắn dưới /api/file để không trùng /api/chat-agent
 router = APIRouter()
 memory = MemoryStore()
 
+def close_file_memory():
+    memory.close()
+
 def sse(event: dict) -> str:
     return "data: " + json.dumps(event, ensure_ascii=False) + "\n\n"
 
-@router.post("/chat-agent")
+@router.post("/chat-agent", tags=["File backend"])
 async def chat_agent(req: ChatPayload):
     # Hợp nhất “phiên”:
     if isinstance(req, ChatAgentRequest):
@@ -20,13 +24,13 @@ async def chat_agent(req: ChatPayload):
         sid = f"{req.user_id}:{req.conversation_id}"
         prompt = req.prompt
 
-    history = memory.get(sid)
-    history.append({"role":"user","content": prompt})
+    # Ghi file có thể phải chờ flock của worker khác: chạy ngoài event loop
+    await asyncio.to_thread(memory.append, sid, "user", prompt)
 
     # ... tính answer thực tế ở đây ...
     answer = f"Đã nhận: “{prompt}”. (demo SSE & session_id)"
 
-    history.append({"role":"assistant","content": answer})
+    await asyncio.to_thread(memory.append, sid, "assistant", answer)
 
     async def stream():
         yield sse({"type":"status_update","content":"Đang phân tích yêu cầu…"})
@@ -0,0 +1,18 @@
+from fastapi import APIRouter
+from app.db.shared_cache import get_shared_cache_stats
+from app.services import request_router, admission
+from app.services.hedging import ttft_tracker
+from app.services.search_cache import serper_cache
+
+router = APIRouter()
+
+@router.get("/stats", tags=["Vận hành"])
+def get_stats():
+    """Các bộ đếm nội bộ của worker hiện tại (mỗi gunicorn worker có số liệu riêng), trừ shared_cache là số liệu chung của cả máy."""
+    return {
+        "router": request_router.get_router_stats(),
+        "serper_cache": serper_cache.stats(),
+        "admission": admission.get_admission_stats(),
+        "ttft": ttft_tracker.stats(),
+        "shared_cache": get_shared_cache_stats(),
+    }
@@ -15,6 +15,143 @@ if not SERPER_API_KEY:
 MODEL_PRO = "gemini-2.5-pro"
 MODEL_FLASH = "gemini-2.5-flash"
 MODEL_LIVE = "gemini-live-2.5-flash-preview"
+MODEL_NANO_BANANA = "gemini-2.5-flash-image-preview"
+MODEL_WARMUP = os.getenv("MODEL_WARMUP", "1") == "1"
+# Stream câu trả lời cuối theo từng phần (final_answer_chunk) trước gói final_answer đầy đủ
+STREAM_FINAL_ANSWER = os.getenv("STREAM_FINAL_ANSWER", "1") == "1"
+
+# ==== Khởi động nhanh (cold start) ====
+# Import nền các thư viện nặng (pandas, pypdf, Pillow...) sau khi server đã nhận request, thay vì lúc import app
+IMPORT_WARMUP = os.getenv("IMPORT_WARMUP", "1") == "1"
+IMPORT_WARMUP_DELAY = float(os.getenv("IMPORT_WARMUP_DELAY", "2"))
+
+# ==== Tải lên và phân tích file ====
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(100 * 1024 * 1024)))
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", "2"))
+PARSE_PROGRESS_INTERVAL = float(os.getenv("PARSE_PROGRESS_INTERVAL", "2"))
+# Nội dung tài liệu đã trích xuất, lưu trong cache dùng chung (namespace "parsed")
+PARSED_CACHE_TTL = float(os.getenv("PARSED_CACHE_TTL", str(7 * 24 * 3600)))
+PARSED_CACHE_MAX_BYTES = int(os.getenv("PARSED_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+PDF_MAX_PAGES = int(os.getenv("PDF_MAX_PAGES", "1000"))
+PDF_PARSE_TIMEOUT = float(os.getenv("PDF_PARSE_TIMEOUT", "60"))
+# Số process trích xuất PDF song song (<= 1 để tắt chế độ song song)
+PDF_PARALLEL_WORKERS = int(os.getenv("PDF_PARALLEL_WORKERS", "2"))
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "40"))
+
+# ==== Tiền xử lý ảnh trước khi gửi model ====
+# Cạnh dài tối đa (px) của ảnh gửi cho model vision / chỉnh sửa ảnh
+IMAGE_MAX_EDGE = int(os.getenv("IMAGE_MAX_EDGE", "1536"))
+IMAGE_EDIT_MAX_EDGE = int(os.getenv("IMAGE_EDIT_MAX_EDGE", "2048"))
+IMAGE_OUTPUT_FORMAT = os.getenv("IMAGE_OUTPUT_FORMAT", "JPEG").upper()  # JPEG | WEBP | PNG
+IMAGE_OUTPUT_QUALITY = int(os.getenv("IMAGE_OUTPUT_QUALITY", "85"))
+# Ảnh JPEG/PNG/WEBP nhỏ hơn ngưỡng này và không cần xoay/thu nhỏ được gửi nguyên bản
+IMAGE_PASSTHROUGH_MAX_BYTES = int(os.getenv("IMAGE_PASSTHROUGH_MAX_BYTES", str(1024 * 1024)))
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "2"))
+IMAGE_CACHE_MAX_ENTRIES = int(os.getenv("IMAGE_CACHE_MAX_ENTRIES", "64"))
+
+# ==== Kho blob (ảnh sinh ra / chỉnh sửa) ====
+BLOB_DIR = os.getenv("BLOB_DIR", "blobs")
+BLOB_MAX_BYTES = int(os.getenv("BLOB_MAX_BYTES", str(1024 * 1024 * 1024)))
+BLOB_MAX_AGE_SECONDS = float(os.getenv("BLOB_MAX_AGE_SECONDS", str(7 * 24 * 3600)))
+# Chu kỳ quét thư mục blob để dọn file quá hạn (ngoài lần quét khi tổng dung lượng ước tính vượt giới hạn)
+BLOB_EVICT_INTERVAL = float(os.getenv("BLOB_EVICT_INTERVAL", "600"))
+# Tiền tố URL công khai của API (vd. https://api.example.com); để trống thì trả về URL tương đối
+PUBLIC_BASE_URL = os.getenv("PUBLIC_BASE_URL", "").rstrip("/")
+
+# ==== Đóng gói ngữ cảnh tài liệu đính kèm ====
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "30000"))
+CONTEXT_CHUNK_CHARS = int(os.getenv("CONTEXT_CHUNK_CHARS", "1500"))
+
+# ==== Tóm tắt lịch sử cuốn chiếu ====
+HISTORY_RECENT_TOKEN_BUDGET = int(os.getenv("HISTORY_RECENT_TOKEN_BUDGET", "3000"))
+HISTORY_SUMMARY_TRIGGER_TOKENS = int(os.getenv("HISTORY_SUMMARY_TRIGGER_TOKENS", "1500"))
+HISTORY_SUMMARY_MAX_TOKENS = int(os.getenv("HISTORY_SUMMARY_MAX_TOKENS", "600"))
+HISTORY_FETCH_LIMIT = int(os.getenv("HISTORY_FETCH_LIMIT", "50"))
+
+# ==== Lịch sử hội thoại (SQLite) ====
+HISTORY_DB_POOL_SIZE = int(os.getenv("HISTORY_DB_POOL_SIZE", "4"))
+HISTORY_DB_BUSY_TIMEOUT = float(os.getenv("HISTORY_DB_BUSY_TIMEOUT", "5"))
+ENTITY_DB_POOL_SIZE = int(os.getenv("ENTITY_DB_POOL_SIZE", "2"))
+ENTITY_DB_BUSY_TIMEOUT = float(os.getenv("ENTITY_DB_BUSY_TIMEOUT", "5"))
+
+# ==== HTTP client dùng chung cho các công cụ ====
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_DEFAULT_TIMEOUT = float(os.getenv("HTTP_DEFAULT_TIMEOUT", "30"))
+SERPER_TIMEOUT = float(os.getenv("SERPER_TIMEOUT", "10"))
+IMAGE_API_TIMEOUT = float(os.getenv("IMAGE_API_TIMEOUT", "90"))
+# Địa chỉ các API bên ngoài (đổi sang server giả lập khi chạy benchmark)
+SERPER_URL = os.getenv("SERPER_URL", "https://google.serper.dev/search")
+IMAGE_API_URL = os.getenv("IMAGE_API_URL", "https://image.pollinations.ai/prompt").rstrip("/")
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", "3600"))
+SEARCH_CACHE_MAX_ENTRIES = int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "2048"))
+SEARCH_SHARED_CACHE_MAX_BYTES = int(os.getenv("SEARCH_SHARED_CACHE_MAX_BYTES", str(128 * 1024 * 1024)))
+
+# ==== Vòng lặp agent gọi công cụ ====
+# Số vòng "gọi công cụ -> quan sát" tối đa cho một request
+MAX_AGENT_STEPS = int(os.getenv("MAX_AGENT_STEPS", "3"))
+# Số công cụ chạy đồng thời tối đa trong một vòng
+AGENT_TOOL_CONCURRENCY = int(os.getenv("AGENT_TOOL_CONCURRENCY", "4"))
+TOOL_TIMEOUT = float(os.getenv("TOOL_TIMEOUT", "30"))
+TOOL_TIMEOUT_IMAGE = float(os.getenv("TOOL_TIMEOUT_IMAGE", "100"))
+
+# ==== Kiểm soát tải gọi Gemini (giới hạn áp dụng cho từng worker) ====
+ADMISSION_PRO_CONCURRENCY = int(os.getenv("ADMISSION_PRO_CONCURRENCY", "8"))
+ADMISSION_PRO_RPM = float(os.getenv("ADMISSION_PRO_RPM", "60"))
+ADMISSION_FLASH_CONCURRENCY = int(os.getenv("ADMISSION_FLASH_CONCURRENCY", "32"))
+ADMISSION_FLASH_RPM = float(os.getenv("ADMISSION_FLASH_RPM", "500"))
+ADMISSION_IMAGE_CONCURRENCY = int(os.getenv("ADMISSION_IMAGE_CONCURRENCY", "4"))
+ADMISSION_IMAGE_RPM = float(os.getenv("ADMISSION_IMAGE_RPM", "20"))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "64"))
+ADMISSION_MAX_WAIT = float(os.getenv("ADMISSION_MAX_WAIT", "30"))
+ADMISSION_STATUS_INTERVAL = float(os.getenv("ADMISSION_STATUS_INTERVAL", "2"))
+
+# ==== Ngân sách độ trễ: hedge request và chuyển Pro -> Flash ====
+# Ngân sách mặc định (ms) cho tới khi có token đầu tiên; 0 = tắt, request có thể tự truyền latency_budget_ms
+LATENCY_BUDGET_MS = int(os.getenv("LATENCY_BUDGET_MS", "0"))
+# Sau tỉ lệ ngân sách này mà Pro chưa bắt đầu trả lời thì chạy song song MODEL_FLASH
+LATENCY_FALLBACK_FRACTION = float(os.getenv("LATENCY_FALLBACK_FRACTION", "0.5"))
+HEDGE_ENABLED = os.getenv("HEDGE_ENABLED", "true").lower() == "true"
+# Gửi thêm một lượt Pro khi TTFT vượt phân vị này của các lượt gần đây
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "95"))
+HEDGE_DEFAULT_DELAY = float(os.getenv("HEDGE_DEFAULT_DELAY", "4"))
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+HEDGE_TTFT_WINDOW = int(os.getenv("HEDGE_TTFT_WINDOW", "200"))
+# Hạn chót cho toàn bộ một lượt stream tới Gemini (giây)
+UPSTREAM_STREAM_TIMEOUT = float(os.getenv("UPSTREAM_STREAM_TIMEOUT", "300"))
+
+# ==== Cache dùng chung giữa các worker trên cùng máy (SQLite) ====
+SHARED_CACHE_ENABLED = os.getenv("SHARED_CACHE_ENABLED", "1") == "1"
+SHARED_CACHE_PATH = os.getenv("SHARED_CACHE_PATH", "cache/shared_cache.db")
+SHARED_CACHE_POOL_SIZE = int(os.getenv("SHARED_CACHE_POOL_SIZE", "4"))
+SHARED_CACHE_BUSY_TIMEOUT = float(os.getenv("SHARED_CACHE_BUSY_TIMEOUT", "5"))
+# Giới hạn dung lượng cho namespace không khai báo giới hạn riêng
+SHARED_CACHE_DEFAULT_MAX_BYTES = int(os.getenv("SHARED_CACHE_DEFAULT_MAX_BYTES", str(64 * 1024 * 1024)))
+# Worker giữ lease là worker duy nhất tính giá trị; các worker khác hỏi lại sau mỗi POLL_INTERVAL
+SHARED_CACHE_LEASE_TTL = float(os.getenv("SHARED_CACHE_LEASE_TTL", "30"))
+SHARED_CACHE_POLL_INTERVAL = float(os.getenv("SHARED_CACHE_POLL_INTERVAL", "0.05"))
+SHARED_CACHE_EVICT_INTERVAL = float(os.getenv("SHARED_CACHE_EVICT_INTERVAL", "30"))
+SHARED_CACHE_STATS_FLUSH_INTERVAL = float(os.getenv("SHARED_CACHE_STATS_FLUSH_INTERVAL", "5"))
+
+# ==== Số liệu vận hành ====
+# Chu kỳ (giây) đo độ trễ của event loop; 0 = tắt
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", "0.5"))
+
+# ==== Stream SSE ====
+# Gộp các thinking_chunk liên tiếp trong cửa sổ này (ms) hoặc tới khi đủ số byte; 0 = tắt
+SSE_COALESCE_WINDOW_MS = float(os.getenv("SSE_COALESCE_WINDOW_MS", "30"))
+SSE_COALESCE_MAX_BYTES = int(os.getenv("SSE_COALESCE_MAX_BYTES", "2048"))
+
+# ==== Định tuyến cục bộ (trước khi gọi router Flash) ====
+ROUTER_CACHE_SIZE = int(os.getenv("ROUTER_CACHE_SIZE", "4096"))
+# Quyết định của router Flash được chia sẻ giữa các worker trong thời gian này
+ROUTER_SHARED_CACHE_TTL = float(os.getenv("ROUTER_SHARED_CACHE_TTL", str(24 * 3600)))
+ROUTER_SHARED_CACHE_MAX_BYTES = int(os.getenv("ROUTER_SHARED_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+ROUTER_MODEL_MIN_CONFIDENCE = float(os.getenv("ROUTER_MODEL_MIN_CONFIDENCE", "0.9"))
+ROUTER_MODEL_MAX_WORDS = int(os.getenv("ROUTER_MODEL_MAX_WORDS", "12"))
 
 SYSTEM_PROMPT_V7 = """
 TUYÊN NGÔN SỨ MỆNH VÀ BỘ LUẬT VẬN HÀNH CHO LOCAITH AI (v7) - GIAO THỨC TRỢ LÝ NGHIÊN CỨU
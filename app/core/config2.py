@@ -29,6 +29,10 @@ SYSTEM_PROMPT_V7 = os.getenv(
 BASE_DIR   = Path(os.getenv("AGENT_DATA_DIR", "./data")).resolve()
 USERS_FILE = BASE_DIR / "users.json"
 BASE_DIR.mkdir(parents=True, exist_ok=True)
+MEMORY_SEGMENT_MAX_BYTES      = int(os.getenv("MEMORY_SEGMENT_MAX_BYTES", str(1024 * 1024)))
+MEMORY_COMPACT_MIN_SEGMENTS   = int(os.getenv("MEMORY_COMPACT_MIN_SEGMENTS", "4"))
+MEMORY_MAX_OPEN_CONVERSATIONS = int(os.getenv("MEMORY_MAX_OPEN_CONVERSATIONS", "256"))
+MEMORY_FSYNC                  = os.getenv("MEMORY_FSYNC", "0") == "1"
 
 # ==== Ngrok ====
 NGROK_AUTHTOKEN = os.getenv("NGROK_AUTHTOKEN", "")
@@ -0,0 +1,153 @@
+import asyncio
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from app.core.config import LOOP_LAG_INTERVAL
+
+# Bộ đếm và histogram đơn giản, xuất theo định dạng text của Prometheus tại /metrics.
+# Số liệu nằm trong bộ nhớ của từng process: mỗi gunicorn worker có số liệu riêng
+# (Prometheus phân biệt theo instance khi scrape từng worker).
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+_registry: list = []
+
+
+def _format_labels(labelnames: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    """Bộ đếm tăng dần, giá trị nhãn truyền theo đúng thứ tự `labelnames`."""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = list(self._values.items())
+        for labels, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    """Histogram theo bucket cố định; observe() chỉ tốn một bisect và vài phép cộng dưới lock."""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [số mẫu theo từng bucket (không cộng dồn, phần tử cuối là +Inf), tổng, số mẫu]
+        self._series: dict[tuple, list] = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value: float, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, *labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = [(labels, list(series[0]), series[1], series[2]) for labels, series in self._series.items()]
+        for labels, counts, total, count in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+def render_metrics() -> str:
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# ==== Các số liệu của pipeline agent ====
+STAGE_SECONDS = Histogram(
+    "agent_stage_seconds",
+    "Thời gian từng bước của process_user_request.",
+    ("stage", "model", "route"),
+)
+REQUESTS_TOTAL = Counter(
+    "agent_requests_total",
+    "Số request theo hướng xử lý và kết quả.",
+    ("route", "outcome"),
+)
+TOOL_SECONDS = Histogram(
+    "agent_tool_seconds",
+    "Thời gian chạy từng công cụ.",
+    ("tool", "outcome"),
+)
+PARSER_SECONDS = Histogram(
+    "file_parser_seconds",
+    "Thời gian trích xuất nội dung theo từng loại parser.",
+    ("parser", "outcome"),
+)
+LOOP_LAG_SECONDS = Histogram(
+    "event_loop_lag_seconds",
+    "Độ trễ của event loop: thời gian thức dậy muộn so với lịch của một tác vụ sleep định kỳ.",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+)
+
+_loop_lag_task: asyncio.Task | None = None
+
+
+async def _monitor_loop_lag(interval: float):
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        LOOP_LAG_SECONDS.observe(max(0.0, loop.time() - expected))
+
+
+def start_loop_lag_monitor():
+    """Chạy nền tác vụ đo độ trễ event loop (gọi trong sự kiện startup)."""
+    global _loop_lag_task
+    if LOOP_LAG_INTERVAL > 0 and _loop_lag_task is None:
+        _loop_lag_task = asyncio.create_task(_monitor_loop_lag(LOOP_LAG_INTERVAL))
@@ -0,0 +1,169 @@
+import re
+import sqlite3
+import time
+import urllib.parse
+from app.core.config import ENTITY_DB_POOL_SIZE, ENTITY_DB_BUSY_TIMEOUT
+from app.db.history_manager import DB_DIR
+from app.db.sqlite_pool import SQLiteDatabase
+from app.services.text_utils import tokenize
+
+# Chỉ mục cục bộ các doanh nghiệp (MST, tên, người đại diện, địa chỉ) tích luỹ từ kết quả tìm kiếm
+ENTITY_DB_PATH = DB_DIR / "entities.db"
+UNKNOWN = "Không rõ"
+ENTITY_FIELDS = ("tax_code", "name", "representative", "address", "source")
+DETAIL_FIELDS = ("name", "representative", "address")
+# Trang đăng ký/tra cứu doanh nghiệp: dữ liệu từ đây được ưu tiên hơn kết quả web thông thường
+AUTHORITATIVE_SOURCES = (
+    "dangkykinhdoanh.gov.vn", "gdt.gov.vn", "masothue.com", "thongtindoanhnghiep.co", "hosocongty.vn",
+)
+
+TAX_CODE_PATTERN = re.compile(r"(?<!\d)(\d{10})(?:-?(\d{3}))?(?!\d)")
+# Các cụm từ ý định thường đứng trước tên doanh nghiệp trong câu truy vấn (đã bỏ dấu)
+_QUERY_PREFIXES = (
+    "tra cuu", "tim kiem", "tim", "thong tin", "ma so thue", "mst", "nguoi dai dien", "dia chi", "cua",
+)
+
+_db = SQLiteDatabase(ENTITY_DB_PATH, ENTITY_DB_POOL_SIZE, "entity-db", ENTITY_DB_BUSY_TIMEOUT)
+
+
+def normalize_tax_code(code: str) -> str:
+    return code.replace("-", "").replace(" ", "")
+
+
+def normalize_name(name: str) -> str:
+    return " ".join(tokenize(name))
+
+
+def _is_known(value: str | None) -> bool:
+    return bool(value) and value != UNKNOWN
+
+
+def _is_complete(entity: dict) -> bool:
+    return all(_is_known(entity.get(field)) for field in DETAIL_FIELDS)
+
+
+def _source_rank(source: str | None) -> int:
+    host = urllib.parse.urlsplit(source or "").hostname or ""
+    return int(any(host == domain or host.endswith("." + domain) for domain in AUTHORITATIVE_SOURCES))
+
+
+def init_entity_index():
+    try:
+        with _db.connection() as con:
+            con.execute("""
+                CREATE TABLE IF NOT EXISTS entities (
+                    tax_code TEXT PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    name_norm TEXT NOT NULL,
+                    representative TEXT NOT NULL,
+                    address TEXT NOT NULL,
+                    source TEXT NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            con.execute("CREATE INDEX IF NOT EXISTS idx_entities_name_norm ON entities (name_norm)")
+            con.commit()
+    except sqlite3.Error as e:
+        print(f"Lỗi khi khởi tạo chỉ mục doanh nghiệp: {e}")
+
+
+def close_entity_index():
+    _db.close()
+
+
+def upsert_entities(entities: list[dict]):
+    """
+    Thêm/gộp bản ghi. Giá trị mới (đã biết) thay giá trị cũ trừ khi nguồn cũ đáng tin cậy hơn
+    (xem AUTHORITATIVE_SOURCES); khi đó giá trị mới chỉ điền vào các trường còn 'Không rõ'.
+    """
+    try:
+        with _db.connection() as con:
+            for entity in entities:
+                tax_code = normalize_tax_code(entity.get("tax_code", ""))
+                if not tax_code:
+                    continue
+                row = con.execute(
+                    "SELECT name, representative, address, source FROM entities WHERE tax_code = ?",
+                    (tax_code,)
+                ).fetchone()
+                merged = {field: entity.get(field) or UNKNOWN for field in DETAIL_FIELDS}
+                merged["source"] = entity.get("source", "")
+                if row:
+                    old = dict(zip(DETAIL_FIELDS + ("source",), row))
+                    newer_wins = _source_rank(merged["source"]) >= _source_rank(old["source"])
+                    for field in DETAIL_FIELDS:
+                        if _is_known(old[field]) and (not newer_wins or not _is_known(merged[field])):
+                            merged[field] = old[field]
+                    if not newer_wins:
+                        merged["source"] = old["source"]
+                con.execute(
+                    """INSERT INTO entities (tax_code, name, name_norm, representative, address, source, updated_at)
+                       VALUES (?, ?, ?, ?, ?, ?, ?)
+                       ON CONFLICT(tax_code) DO UPDATE SET
+                           name = excluded.name, name_norm = excluded.name_norm,
+                           representative = excluded.representative, address = excluded.address,
+                           source = excluded.source, updated_at = excluded.updated_at""",
+                    (tax_code, merged["name"], normalize_name(merged["name"]), merged["representative"],
+                     merged["address"], merged["source"], time.time())
+                )
+            con.commit()
+    except sqlite3.Error as e:
+        print(f"Lỗi khi cập nhật chỉ mục doanh nghiệp: {e}")
+
+
+def _row_to_entity(row) -> dict:
+    return dict(zip(ENTITY_FIELDS, row))
+
+
+def lookup(query: str) -> list[dict] | None:
+    """
+    Trả lời truy vấn từ chỉ mục nếu có thể:
+    - truy vấn chứa MST: mọi MST trong truy vấn đều phải có trong chỉ mục;
+    - ngược lại: tên doanh nghiệp (sau khi bỏ các cụm ý định ở đầu) phải khớp chính xác.
+    Bản ghi còn trường 'Không rõ' không được dùng để trả lời. Trả về None để gọi tìm kiếm web
+    (kết quả web sau đó được gộp vào chỉ mục).
+    """
+    codes = [a + (b or "") for a, b in TAX_CODE_PATTERN.findall(query)]
+    try:
+        with _db.connection() as con:
+            if codes:
+                found = []
+                for code in dict.fromkeys(codes):
+                    row = con.execute(
+                        "SELECT tax_code, name, representative, address, source FROM entities WHERE tax_code = ?",
+                        (code,)
+                    ).fetchone()
+                    if row is None:
+                        return None
+                    found.append(_row_to_entity(row))
+                return found if all(_is_complete(entity) for entity in found) else None
+
+            name_norm = normalize_name(query)
+            stripped = True
+            while stripped:
+                stripped = False
+                for prefix in _QUERY_PREFIXES:
+                    if name_norm.startswith(prefix + " "):
+                        name_norm = name_norm[len(prefix) + 1:]
+                        stripped = True
+            if not name_norm:
+                return None
+            rows = con.execute(
+                "SELECT tax_code, name, representative, address, source FROM entities WHERE name_norm = ?",
+                (name_norm,)
+            ).fetchall()
+    except sqlite3.Error as e:
+        print(f"Lỗi khi tra cứu chỉ mục doanh nghiệp: {e}")
+        return None
+    found = [_row_to_entity(row) for row in rows]
+    if not found or not all(_is_complete(entity) for entity in found):
+        return None
+    return found
+
+
+async def upsert_entities_async(entities: list[dict]):
+    await _db.run(upsert_entities, entities)
+
+
+async def lookup_async(query: str) -> list[dict] | None:
+    return await _db.run(lookup, query)
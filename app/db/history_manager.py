@@ -1,55 +1,185 @@
 import sqlite3
-import os
 from pathlib import Path
+from app.core.config import HISTORY_DB_POOL_SIZE, HISTORY_DB_BUSY_TIMEOUT
+from app.db.sqlite_pool import SQLiteDatabase
 
 DB_DIR = Path(__file__).resolve().parent.parent.parent / "sessions"
 DB_PATH = DB_DIR / "chat_history.db"
 DB_DIR.mkdir(exist_ok=True)
 
+_db = SQLiteDatabase(DB_PATH, HISTORY_DB_POOL_SIZE, "history-db", HISTORY_DB_BUSY_TIMEOUT)
+
+
 def init_db():
     try:
-        con = sqlite3.connect(DB_PATH)
-        cur = con.cursor()
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS chat_history (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                session_id TEXT NOT NULL,
-                role TEXT NOT NULL,
-                content TEXT NOT NULL,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+        with _db.connection() as con:
+            con.execute("""
+                CREATE TABLE IF NOT EXISTS chat_history (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    session_id TEXT NOT NULL,
+                    role TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            # Index (session_id, id) phục vụ đọc theo keyset, tránh quét toàn bảng.
+            con.execute(
+                "CREATE INDEX IF NOT EXISTS idx_chat_history_session_id ON chat_history (session_id, id)"
             )
-        """)
-        con.commit()
-        con.close()
+            # Tóm tắt cuốn chiếu: gộp các tin nhắn có id <= summarized_until_id
+            con.execute("""
+                CREATE TABLE IF NOT EXISTS chat_summary (
+                    session_id TEXT PRIMARY KEY,
+                    rolling_summary TEXT NOT NULL DEFAULT '',
+                    summarized_until_id INTEGER NOT NULL DEFAULT 0,
+                    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            con.commit()
     except sqlite3.Error as e:
         print(f"Lỗi khi khởi tạo database: {e}")
 
+
+def close_db():
+    _db.close()
+
+
 def add_message(session_id: str, role: str, content: str):
     try:
-        con = sqlite3.connect(DB_PATH)
-        cur = con.cursor()
-        cur.execute(
-            "INSERT INTO chat_history (session_id, role, content) VALUES (?, ?, ?)",
-            (session_id, role, content)
-        )
-        con.commit()
-        con.close()
+        with _db.connection() as con:
+            con.execute(
+                "INSERT INTO chat_history (session_id, role, content) VALUES (?, ?, ?)",
+                (session_id, role, content)
+            )
+            con.commit()
     except sqlite3.Error as e:
         print(f"Lỗi khi thêm tin nhắn: {e}")
 
-def get_history(session_id: str, limit: int = 10) -> list:
+
+def get_history(session_id: str, limit: int = 10, before_id: int | None = None) -> list:
+    """
+    Lấy `limit` tin nhắn gần nhất của phiên, theo thứ tự thời gian.
+    `before_id` cho phép phân trang theo keyset (lấy các tin nhắn cũ hơn id này).
+    """
     history = []
     try:
-        con = sqlite3.connect(DB_PATH)
-        cur = con.cursor()
-        res = cur.execute(
-            "SELECT role, content FROM chat_history WHERE session_id = ? ORDER BY timestamp DESC LIMIT ?",
-            (session_id, limit)
-        )
-        rows = reversed(res.fetchall())
-        for row in rows:
-            history.append({"role": row[0], "parts": [row[1]]})
-        con.close()
+        with _db.connection() as con:
+            if before_id is None:
+                res = con.execute(
+                    "SELECT role, content FROM chat_history WHERE session_id = ? ORDER BY id DESC LIMIT ?",
+                    (session_id, limit)
+                )
+            else:
+                res = con.execute(
+                    "SELECT role, content FROM chat_history WHERE session_id = ? AND id < ? ORDER BY id DESC LIMIT ?",
+                    (session_id, before_id, limit)
+                )
+            rows = reversed(res.fetchall())
+            for row in rows:
+                history.append({"role": row[0], "parts": [row[1]]})
+    except sqlite3.Error as e:
+        print(f"Lỗi khi lấy lịch sử: {e}")
+    return history
+
+
+def get_messages_after(session_id: str, after_id: int = 0, limit: int = 50) -> list:
+    """
+    Lấy tối đa `limit` tin nhắn mới nhất có id > `after_id`, theo thứ tự thời gian,
+    kèm id để phục vụ việc tóm tắt cuốn chiếu.
+    """
+    messages = []
+    try:
+        with _db.connection() as con:
+            res = con.execute(
+                "SELECT id, role, content FROM chat_history WHERE session_id = ? AND id > ? ORDER BY id DESC LIMIT ?",
+                (session_id, after_id, limit)
+            )
+            for row in reversed(res.fetchall()):
+                messages.append({"id": row[0], "role": row[1], "content": row[2]})
+    except sqlite3.Error as e:
+        print(f"Lỗi khi lấy lịch sử: {e}")
+    return messages
+
+
+def get_messages_between(session_id: str, after_id: int, before_id: int, limit: int = 50) -> list:
+    """
+    Lấy tối đa `limit` tin nhắn cũ nhất có `after_id` < id < `before_id`, theo thứ tự thời gian
+    (dùng để tóm tắt lần lượt từng trang, không bỏ sót tin nhắn nào).
+    """
+    messages = []
+    try:
+        with _db.connection() as con:
+            res = con.execute(
+                "SELECT id, role, content FROM chat_history WHERE session_id = ? AND id > ? AND id < ? ORDER BY id LIMIT ?",
+                (session_id, after_id, before_id, limit)
+            )
+            for row in res.fetchall():
+                messages.append({"id": row[0], "role": row[1], "content": row[2]})
     except sqlite3.Error as e:
         print(f"Lỗi khi lấy lịch sử: {e}")
-    return history
\ No newline at end of file
+    return messages
+
+
+def get_summary(session_id: str) -> tuple[str, int]:
+    """Trả về (rolling_summary, summarized_until_id) của phiên; ('', 0) nếu chưa có."""
+    try:
+        with _db.connection() as con:
+            row = con.execute(
+                "SELECT rolling_summary, summarized_until_id FROM chat_summary WHERE session_id = ?",
+                (session_id,)
+            ).fetchone()
+    except sqlite3.Error as e:
+        print(f"Lỗi khi lấy tóm tắt: {e}")
+        return "", 0
+    return (row[0], row[1]) if row else ("", 0)
+
+
+def set_summary(session_id: str, rolling_summary: str, summarized_until_id: int, expected_until_id: int) -> bool:
+    """
+    Cập nhật tóm tắt nếu mốc hiện tại vẫn là `expected_until_id` (compare-and-set),
+    tránh ghi đè khi hai worker cùng tóm tắt một phiên.
+    """
+    try:
+        with _db.connection() as con:
+            if expected_until_id == 0:
+                con.execute(
+                    "INSERT OR IGNORE INTO chat_summary (session_id) VALUES (?)",
+                    (session_id,)
+                )
+            cur = con.execute(
+                """UPDATE chat_summary
+                   SET rolling_summary = ?, summarized_until_id = ?, updated_at = CURRENT_TIMESTAMP
+                   WHERE session_id = ? AND summarized_until_id = ?""",
+                (rolling_summary, summarized_until_id, session_id, expected_until_id)
+            )
+            con.commit()
+            return cur.rowcount == 1
+    except sqlite3.Error as e:
+        print(f"Lỗi khi lưu tóm tắt: {e}")
+        return False
+
+
+async def add_message_async(session_id: str, role: str, content: str):
+    """Phiên bản bất đồng bộ của `add_message`, chạy trên thread pool riêng."""
+    await _db.run(add_message, session_id, role, content)
+
+
+async def get_history_async(session_id: str, limit: int = 10, before_id: int | None = None) -> list:
+    """Phiên bản bất đồng bộ của `get_history`, chạy trên thread pool riêng."""
+    return await _db.run(get_history, session_id, limit, before_id)
+
+
+async def get_messages_after_async(session_id: str, after_id: int = 0, limit: int = 50) -> list:
+    return await _db.run(get_messages_after, session_id, after_id, limit)
+
+
+async def get_messages_between_async(session_id: str, after_id: int, before_id: int, limit: int = 50) -> list:
+    return await _db.run(get_messages_between, session_id, after_id, before_id, limit)
+
+
+async def get_summary_async(session_id: str) -> tuple[str, int]:
+    return await _db.run(get_summary, session_id)
+
+
+async def set_summary_async(session_id: str, rolling_summary: str, summarized_until_id: int, expected_until_id: int) -> bool:
+    return await _db.run(set_summary, session_id, rolling_summary, summarized_until_id, expected_until_id)
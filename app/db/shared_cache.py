@@ -0,0 +1,392 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+from typing import Awaitable, Callable
+from app.core.config import (
+    SHARED_CACHE_ENABLED, SHARED_CACHE_PATH, SHARED_CACHE_POOL_SIZE, SHARED_CACHE_BUSY_TIMEOUT,
+    SHARED_CACHE_DEFAULT_MAX_BYTES,
+    SHARED_CACHE_LEASE_TTL, SHARED_CACHE_POLL_INTERVAL, SHARED_CACHE_EVICT_INTERVAL,
+    SHARED_CACHE_STATS_FLUSH_INTERVAL,
+)
+from app.db.sqlite_pool import SQLiteDatabase
+
+# Cache dùng chung cho mọi gunicorn worker trên cùng một máy, lưu trong một file SQLite (WAL).
+# Mỗi namespace có TTL và giới hạn dung lượng riêng (loại bỏ theo LRU); get_or_compute dùng lease
+# trong database để một giá trị chỉ được tính một lần dù nhiều worker cùng hỏi.
+DB_PATH = Path(SHARED_CACHE_PATH).resolve()
+DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+# Chỉ cập nhật thời điểm truy cập (cho LRU) khi giá trị cũ hơn khoảng này, tránh ghi ở mỗi lần đọc
+TOUCH_INTERVAL = 60.0
+STAT_FIELDS = ("hits", "misses", "waits", "stores", "evictions")
+
+_db = SQLiteDatabase(DB_PATH, SHARED_CACHE_POOL_SIZE, "shared-cache", SHARED_CACHE_BUSY_TIMEOUT)
+_namespaces: dict[str, "Namespace"] = {}
+
+# Bộ đếm của process hiện tại, được cộng dồn vào bảng cache_stats định kỳ
+_pending_stats: dict[str, Counter] = {}
+_stats_lock = threading.Lock()
+_last_stats_flush = time.monotonic()
+_last_evict = 0.0
+
+
+def init_shared_cache():
+    try:
+        with _db.connection() as con:
+            con.execute("""
+                CREATE TABLE IF NOT EXISTS cache_entries (
+                    namespace TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    expires_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL,
+                    PRIMARY KEY (namespace, key)
+                )
+            """)
+            con.execute(
+                "CREATE INDEX IF NOT EXISTS idx_cache_entries_lru ON cache_entries (namespace, accessed_at)"
+            )
+            con.execute("""
+                CREATE TABLE IF NOT EXISTS cache_leases (
+                    namespace TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    owner TEXT NOT NULL,
+                    expires_at REAL NOT NULL,
+                    PRIMARY KEY (namespace, key)
+                )
+            """)
+            con.execute("""
+                CREATE TABLE IF NOT EXISTS cache_stats (
+                    namespace TEXT PRIMARY KEY,
+                    hits INTEGER NOT NULL DEFAULT 0,
+                    misses INTEGER NOT NULL DEFAULT 0,
+                    waits INTEGER NOT NULL DEFAULT 0,
+                    stores INTEGER NOT NULL DEFAULT 0,
+                    evictions INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            con.commit()
+    except sqlite3.Error as e:
+        print(f"Lỗi khi khởi tạo cache dùng chung: {e}")
+
+
+def close_shared_cache():
+    _flush_stats(force=True)
+    _db.close()
+
+
+def _count(namespace: str, field: str, n: int = 1):
+    with _stats_lock:
+        _pending_stats.setdefault(namespace, Counter())[field] += n
+
+
+def _flush_stats(force: bool = False):
+    global _last_stats_flush
+    with _stats_lock:
+        if not force and time.monotonic() - _last_stats_flush < SHARED_CACHE_STATS_FLUSH_INTERVAL:
+            return
+        pending = {ns: counter for ns, counter in _pending_stats.items() if counter}
+        _pending_stats.clear()
+        _last_stats_flush = time.monotonic()
+    if not pending:
+        return
+    try:
+        with _db.connection() as con:
+            for namespace, counter in pending.items():
+                con.execute("INSERT OR IGNORE INTO cache_stats (namespace) VALUES (?)", (namespace,))
+                con.execute(
+                    f"UPDATE cache_stats SET {', '.join(f'{f} = {f} + ?' for f in STAT_FIELDS)} WHERE namespace = ?",
+                    (*(counter[f] for f in STAT_FIELDS), namespace)
+                )
+            con.commit()
+    except sqlite3.Error as e:
+        print(f"Lỗi khi ghi thống kê cache dùng chung: {e}")
+
+
+def _get(namespace: str, key: str) -> str | None:
+    now = time.time()
+    try:
+        with _db.connection() as con:
+            row = con.execute(
+                "SELECT value, accessed_at FROM cache_entries WHERE namespace = ? AND key = ? AND expires_at > ?",
+                (namespace, key, now)
+            ).fetchone()
+            if row is not None and row[1] < now - TOUCH_INTERVAL:
+                con.execute(
+                    "UPDATE cache_entries SET accessed_at = ? WHERE namespace = ? AND key = ?",
+                    (now, namespace, key)
+                )
+                con.commit()
+    except sqlite3.Error as e:
+        print(f"Lỗi khi đọc cache dùng chung: {e}")
+        return None
+    return row[0] if row else None
+
+
+def _put(namespace: str, key: str, value: str, ttl: float, owner: str | None = None):
+    """Lưu giá trị (và trả lease của `owner` nếu có) trong cùng một giao dịch."""
+    now = time.time()
+    try:
+        with _db.connection() as con:
+            con.execute(
+                """INSERT OR REPLACE INTO cache_entries (namespace, key, value, size, expires_at, accessed_at)
+                   VALUES (?, ?, ?, ?, ?, ?)""",
+                (namespace, key, value, len(value.encode("utf-8")), now + ttl, now)
+            )
+            if owner is not None:
+                con.execute(
+                    "DELETE FROM cache_leases WHERE namespace = ? AND key = ? AND owner = ?",
+                    (namespace, key, owner)
+                )
+            con.commit()
+    except sqlite3.Error as e:
+        print(f"Lỗi khi ghi cache dùng chung: {e}")
+        return
+    _count(namespace, "stores")
+    _maybe_evict()
+
+
+def _try_acquire(namespace: str, key: str, owner: str, lease_ttl: float) -> tuple[str | None, bool]:
+    """
+    Trong một giao dịch ghi: trả về (giá trị, False) nếu đã có trong cache, ngược lại thử nhận lease
+    (thành công khi chưa ai giữ hoặc lease cũ đã hết hạn) và trả về (None, đã_nhận_lease).
+    """
+    now = time.time()
+    try:
+        with _db.connection() as con:
+            con.execute("BEGIN IMMEDIATE")
+            row = con.execute(
+                "SELECT value FROM cache_entries WHERE namespace = ? AND key = ? AND expires_at > ?",
+                (namespace, key, now)
+            ).fetchone()
+            if row is not None:
+                con.commit()
+                return row[0], False
+            cur = con.execute(
+                """INSERT INTO cache_leases (namespace, key, owner, expires_at) VALUES (?, ?, ?, ?)
+                   ON CONFLICT (namespace, key) DO UPDATE
+                   SET owner = excluded.owner, expires_at = excluded.expires_at
+                   WHERE cache_leases.expires_at < ?""",
+                (namespace, key, owner, now + lease_ttl, now)
+            )
+            con.commit()
+            return None, cur.rowcount == 1
+    except sqlite3.Error as e:
+        # Database bận/lỗi: tự tính giá trị thay vì chặn request
+        print(f"Lỗi khi nhận lease cache dùng chung: {e}")
+        return None, True
+
+
+def _release(namespace: str, key: str, owner: str):
+    try:
+        with _db.connection() as con:
+            con.execute(
+                "DELETE FROM cache_leases WHERE namespace = ? AND key = ? AND owner = ?",
+                (namespace, key, owner)
+            )
+            con.commit()
+    except sqlite3.Error as e:
+        print(f"Lỗi khi trả lease cache dùng chung: {e}")
+
+
+def _maybe_evict():
+    global _last_evict
+    with _stats_lock:
+        if time.monotonic() - _last_evict < SHARED_CACHE_EVICT_INTERVAL:
+            return
+        _last_evict = time.monotonic()
+    evict()
+
+
+def evict():
+    """Xoá mục hết hạn và lease bỏ dở, rồi loại bỏ theo LRU cho tới khi mỗi namespace dưới giới hạn dung lượng."""
+    now = time.time()
+    try:
+        with _db.connection() as con:
+            expired = con.execute(
+                "SELECT namespace, COUNT(*) FROM cache_entries WHERE expires_at <= ? GROUP BY namespace", (now,)
+            ).fetchall()
+            con.execute("DELETE FROM cache_entries WHERE expires_at <= ?", (now,))
+            con.execute("DELETE FROM cache_leases WHERE expires_at <= ?", (now,))
+            con.commit()
+            for namespace, count in expired:
+                _count(namespace, "evictions", count)
+
+            totals = con.execute("SELECT namespace, SUM(size) FROM cache_entries GROUP BY namespace").fetchall()
+            for namespace, total in totals:
+                max_bytes = _max_bytes(namespace)
+                if total <= max_bytes:
+                    continue
+                # Xoá xuống 90% giới hạn để không phải loại bỏ lại ngay ở lần ghi tiếp theo
+                to_free = total - int(max_bytes * 0.9)
+                victims = []
+                for key, size in con.execute(
+                    "SELECT key, size FROM cache_entries WHERE namespace = ? ORDER BY accessed_at", (namespace,)
+                ).fetchall():
+                    victims.append((namespace, key))
+                    to_free -= size
+                    if to_free <= 0:
+                        break
+                con.executemany("DELETE FROM cache_entries WHERE namespace = ? AND key = ?", victims)
+                con.commit()
+                _count(namespace, "evictions", len(victims))
+    except sqlite3.Error as e:
+        print(f"Lỗi khi dọn cache dùng chung: {e}")
+
+
+def _max_bytes(namespace: str) -> int:
+    ns = _namespaces.get(namespace)
+    return ns.max_bytes if ns is not None else SHARED_CACHE_DEFAULT_MAX_BYTES
+
+
+def _new_owner() -> str:
+    return f"{os.getpid()}-{uuid.uuid4().hex}"
+
+
+class Namespace:
+    """
+    Một vùng khoá trong cache dùng chung, với TTL và giới hạn dung lượng riêng.
+    Các hàm đồng bộ dùng được từ thread pool; các hàm *_async chạy truy vấn trên thread pool của database.
+    """
+
+    def __init__(self, name: str, ttl: float, max_bytes: int = SHARED_CACHE_DEFAULT_MAX_BYTES):
+        self.name = name
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        _namespaces[name] = self
+
+    @property
+    def enabled(self) -> bool:
+        return SHARED_CACHE_ENABLED and self.ttl > 0
+
+    def get(self, key: str) -> str | None:
+        if not self.enabled:
+            return None
+        value = _get(self.name, key)
+        _count(self.name, "hits" if value is not None else "misses")
+        _flush_stats()
+        return value
+
+    def put(self, key: str, value: str):
+        if self.enabled:
+            _put(self.name, key, value, self.ttl)
+            _flush_stats()
+
+    def get_or_compute(
+        self,
+        key: str,
+        compute: Callable[[], str],
+        cacheable: Callable[[str], bool] = lambda _: True,
+        lease_ttl: float = SHARED_CACHE_LEASE_TTL,
+    ) -> str:
+        """
+        Trả về giá trị trong cache, hoặc gọi `compute()` đúng một lần trên toàn máy: worker nhận được lease
+        tính và lưu giá trị, các worker khác chờ tới khi giá trị xuất hiện (hoặc lease hết hạn/bị trả).
+        """
+        if not self.enabled:
+            return compute()
+        owner = _new_owner()
+        waited = False
+        while True:
+            value, acquired = _try_acquire(self.name, key, owner, lease_ttl)
+            if value is not None:
+                _count(self.name, "hits")
+                _flush_stats()
+                return value
+            if acquired:
+                break
+            if not waited:
+                waited = True
+                _count(self.name, "waits")
+            time.sleep(SHARED_CACHE_POLL_INTERVAL)
+
+        _count(self.name, "misses")
+        try:
+            value = compute()
+        except BaseException:
+            _release(self.name, key, owner)
+            raise
+        if cacheable(value):
+            _put(self.name, key, value, self.ttl, owner)
+        else:
+            _release(self.name, key, owner)
+        _flush_stats()
+        return value
+
+    async def get_async(self, key: str) -> str | None:
+        if not self.enabled:
+            return None
+        return await _db.run(self.get, key)
+
+    async def put_async(self, key: str, value: str):
+        if self.enabled:
+            await _db.run(self.put, key, value)
+
+    async def get_or_compute_async(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[str]],
+        cacheable: Callable[[str], bool] = lambda _: True,
+        lease_ttl: float = SHARED_CACHE_LEASE_TTL,
+    ) -> str:
+        """Phiên bản bất đồng bộ của `get_or_compute` với `compute` là coroutine function."""
+        if not self.enabled:
+            return await compute()
+        owner = _new_owner()
+        waited = False
+        while True:
+            value, acquired = await _db.run(_try_acquire, self.name, key, owner, lease_ttl)
+            if value is not None:
+                _count(self.name, "hits")
+                await _db.run(_flush_stats)
+                return value
+            if acquired:
+                break
+            if not waited:
+                waited = True
+                _count(self.name, "waits")
+            await asyncio.sleep(SHARED_CACHE_POLL_INTERVAL)
+
+        _count(self.name, "misses")
+        try:
+            value = await compute()
+        except BaseException:
+            await asyncio.shield(_db.run(_release, self.name, key, owner))
+            raise
+        if cacheable(value):
+            await _db.run(_put, self.name, key, value, self.ttl, owner)
+        else:
+            await _db.run(_release, self.name, key, owner)
+        await _db.run(_flush_stats)
+        return value
+
+
+def get_shared_cache_stats() -> dict:
+    """Số liệu theo namespace, cộng dồn từ mọi worker trên máy (có độ trễ tối đa một chu kỳ ghi thống kê)."""
+    _flush_stats(force=True)
+    stats = {}
+    try:
+        with _db.connection() as con:
+            for row in con.execute(f"SELECT namespace, {', '.join(STAT_FIELDS)} FROM cache_stats"):
+                stats[row[0]] = dict(zip(STAT_FIELDS, row[1:]))
+            usage = con.execute(
+                "SELECT namespace, COUNT(*), COALESCE(SUM(size), 0) FROM cache_entries GROUP BY namespace"
+            ).fetchall()
+    except sqlite3.Error as e:
+        print(f"Lỗi khi đọc thống kê cache dùng chung: {e}")
+        return {"enabled": SHARED_CACHE_ENABLED, "namespaces": {}}
+
+    for namespace, entries, size in usage:
+        stats.setdefault(namespace, dict.fromkeys(STAT_FIELDS, 0)).update(entries=entries, bytes=size)
+    for namespace, ns_stats in stats.items():
+        ns_stats.setdefault("entries", 0)
+        ns_stats.setdefault("bytes", 0)
+        ns_stats["max_bytes"] = _max_bytes(namespace)
+        lookups = ns_stats["hits"] + ns_stats["misses"]
+        ns_stats["hit_rate"] = round(ns_stats["hits"] / lookups, 4) if lookups else None
+    return {"enabled": SHARED_CACHE_ENABLED, "path": str(DB_PATH), "namespaces": stats}
@@ -0,0 +1,120 @@
+import sqlite3
+import os
+import queue
+import threading
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+
+
+class ConnectionPool:
+    """
+    Pool kết nối SQLite dùng lâu dài (WAL) cho một process.
+    Kết nối được tạo dần đến `size` và tái sử dụng thay vì mở/đóng mỗi lần gọi.
+    `busy_timeout` (giây) là thời gian chờ khoá ghi của process khác trước khi báo lỗi.
+    """
+
+    def __init__(self, db_path: Path, size: int, busy_timeout: float):
+        self._db_path = db_path
+        self._size = max(1, size)
+        self._busy_timeout = busy_timeout
+        self._idle: queue.LifoQueue = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        con = sqlite3.connect(self._db_path, timeout=self._busy_timeout, check_same_thread=False)
+        con.execute("PRAGMA journal_mode=WAL")
+        con.execute("PRAGMA synchronous=NORMAL")
+        con.execute(f"PRAGMA busy_timeout={int(self._busy_timeout * 1000)}")
+        return con
+
+    @contextmanager
+    def connection(self):
+        try:
+            con = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_create = self._created < self._size
+                if can_create:
+                    self._created += 1
+            if can_create:
+                try:
+                    con = self._connect()
+                except sqlite3.Error:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            else:
+                con = self._idle.get()
+
+        broken = False
+        try:
+            yield con
+        finally:
+            # Giao dịch còn mở (do exception bất kỳ, kể cả huỷ task, hoặc quên commit) không được
+            # mang sang lần dùng sau
+            try:
+                if con.in_transaction:
+                    con.rollback()
+            except sqlite3.Error:
+                broken = True
+            if broken:
+                con.close()
+                with self._lock:
+                    self._created -= 1
+            else:
+                self._idle.put(con)
+
+    def close(self):
+        while True:
+            try:
+                con = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            con.close()
+            with self._lock:
+                self._created -= 1
+
+
+class SQLiteDatabase:
+    """
+    Một file SQLite kèm pool kết nối và thread pool riêng để chạy truy vấn ngoài event loop.
+    Pool được tạo lười theo từng process để an toàn khi gunicorn fork worker.
+    """
+
+    def __init__(self, db_path: Path, pool_size: int, name: str, busy_timeout: float):
+        self.db_path = db_path
+        self.pool_size = pool_size
+        self.name = name
+        self.busy_timeout = busy_timeout
+        self._pool: ConnectionPool | None = None
+        self._executor: ThreadPoolExecutor | None = None
+        self._pid: int | None = None
+        self._lock = threading.Lock()
+
+    def _ensure(self) -> ConnectionPool:
+        if self._pool is None or self._pid != os.getpid():
+            with self._lock:
+                if self._pool is None or self._pid != os.getpid():
+                    self._pool = ConnectionPool(self.db_path, self.pool_size, self.busy_timeout)
+                    self._executor = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix=self.name)
+                    self._pid = os.getpid()
+        return self._pool
+
+    def connection(self):
+        return self._ensure().connection()
+
+    def run(self, func, *args) -> asyncio.Future:
+        """Chạy `func(*args)` (hàm đồng bộ dùng `connection()`) trên thread pool của database."""
+        self._ensure()
+        return asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    def close(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+            if self._pool is not None:
+                self._pool.close()
+            self._pool, self._executor, self._pid = None, None, None
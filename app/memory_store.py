@@ -0,0 +1,417 @@
+# app/memory_store.py
+"""
+Kho hội thoại dạng file, ghi nối tiếp (append-only) theo từng hội thoại.
+
+Mỗi hội thoại nằm trong data/users/<user_id>/conversations/<conversation_id>/:
+    log/<start>.jsonl          segment đang ghi hoặc đã đóng, mỗi dòng một tin nhắn
+    log/<start>-<end>.jsonl    segment đã gộp (compaction) chứa tin nhắn [start, end)
+    meta.json                  ghi nguyên tử (file tạm + os.replace)
+
+Thêm tin nhắn là một lần os.write vào file mở bằng O_APPEND (O(1), không ghi lại cả file).
+Chỉ mục offset từng dòng được giữ trong bộ nhớ nên đọc N tin nhắn cuối chỉ parse đúng N dòng.
+Các process dùng chung thư mục phối hợp qua flock trên <conversation>/.lock; chỉ mục của mỗi process
+được đồng bộ lại với kích thước/danh sách segment trên đĩa trước mỗi thao tác.
+"""
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import hashlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+
+# fcntl chỉ có trên POSIX; không có (Windows, chạy một process) thì chỉ khoá giữa các thread
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from app.core.config2 import (
+    BASE_DIR, MEMORY_SEGMENT_MAX_BYTES, MEMORY_COMPACT_MIN_SEGMENTS,
+    MEMORY_MAX_OPEN_CONVERSATIONS, MEMORY_FSYNC,
+)
+
+_SAFE_COMPONENT = re.compile(r"^[\w-]{1,128}$")
+_SEGMENT_NAME = re.compile(r"^(\d{12})(?:-(\d{12}))?\.jsonl$")
+
+
+def _atomic_write_json(path: Path, data: dict):
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=".tmp-", suffix=".json")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+        if MEMORY_FSYNC:
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _read_json(path: Path, default: dict) -> dict:
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (FileNotFoundError, json.JSONDecodeError):
+        return dict(default)
+
+
+def _safe(component: str) -> str:
+    if _SAFE_COMPONENT.match(component):
+        return component
+    return hashlib.sha256(component.encode("utf-8")).hexdigest()[:32]
+
+
+class _Segment:
+    __slots__ = ("path", "start", "end", "size")
+
+    def __init__(self, path: Path, start: int, end: int | None, size: int):
+        self.path = path
+        self.start = start
+        self.end = end      # None: segment thường (chưa gộp)
+        self.size = size
+
+
+class _Conversation:
+    """
+    Trạng thái trong bộ nhớ của một hội thoại: danh sách segment và chỉ mục offset.
+    Nhiều process (gunicorn worker) có thể cùng mở một hội thoại: mọi thao tác giữ flock trên file
+    .lock và đồng bộ chỉ mục với đĩa trước khi dùng (xem `locked`).
+    """
+
+    def __init__(self, conv_dir: Path):
+        self.dir = conv_dir
+        self.log_dir = conv_dir / "log"
+        self.lock = threading.RLock()
+        self.segments: list[_Segment] = []
+        # Mỗi tin nhắn: (chỉ số segment, offset, độ dài dòng)
+        self.index: list[tuple[int, int, int]] = []
+        self.fd: int | None = None
+        self._lock_fd: int | None = None
+        self.compacting = False
+        self.log_dir.mkdir(parents=True, exist_ok=True)
+        with self.locked():
+            pass
+
+    # --- Khoá giữa các process & đồng bộ với đĩa ---
+    @contextmanager
+    def locked(self):
+        """
+        Khoá hội thoại giữa các thread (RLock) và giữa các process (flock), rồi đồng bộ chỉ mục với đĩa.
+        Không gọi lồng nhau.
+        """
+        with self.lock:
+            if fcntl is not None:
+                if self._lock_fd is None:
+                    self._lock_fd = os.open(self.dir / ".lock", os.O_RDWR | os.O_CREAT, 0o644)
+                fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+            try:
+                self._sync()
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def _sync(self):
+        """Cập nhật chỉ mục khi process khác đã ghi thêm, tạo segment mới hoặc compaction."""
+        names = {name for name in os.listdir(self.log_dir) if _SEGMENT_NAME.match(name)}
+        if not self.segments or names != {seg.path.name for seg in self.segments}:
+            self._load()
+            return
+        active = self.segments[-1]
+        size = os.stat(active.path).st_size
+        if size > active.size:
+            self._index_appended(active, size)
+        elif size < active.size:
+            self._load()
+
+    def _index_appended(self, active: _Segment, size: int):
+        """Đánh chỉ mục phần process khác đã ghi thêm vào cuối segment đang ghi."""
+        with open(active.path, "rb") as f:
+            f.seek(active.size)
+            data = f.read(size - active.size)
+        seg_no = len(self.segments) - 1
+        pos = 0
+        while True:
+            newline = data.find(b"\n", pos)
+            if newline < 0:
+                break
+            self.index.append((seg_no, active.size + pos, newline - pos))
+            pos = newline + 1
+        if pos < len(data):
+            # Người ghi luôn ghi trọn dòng khi giữ khoá: dòng dở chỉ còn lại sau sự cố, cắt bỏ
+            os.truncate(active.path, active.size + pos)
+        active.size += pos
+
+    # --- Nạp & phục hồi ---
+    def _load(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+        self.segments = []
+        self.index = []
+        self._migrate_legacy()
+
+        found = []
+        for entry in os.scandir(self.log_dir):
+            match = _SEGMENT_NAME.match(entry.name)
+            if match:
+                end = int(match.group(2)) if match.group(2) else None
+                found.append((int(match.group(1)), end is None, -(end or 0), Path(entry.path)))
+        # Segment gộp đứng trước segment thường cùng điểm bắt đầu; giữa các segment gộp
+        # cùng điểm bắt đầu, segment bao phủ nhiều hơn đứng trước (không phụ thuộc thứ tự scandir)
+        found.sort(key=lambda item: item[:3])
+
+        covered_until = 0
+        for start, _, neg_end, path in found:
+            if start < covered_until:
+                # Phần còn sót lại của một lần compaction bị gián đoạn
+                path.unlink(missing_ok=True)
+                continue
+            data = path.read_bytes()
+            segment = _Segment(path, start, -neg_end or None, len(data))
+            seg_no = len(self.segments)
+            self.segments.append(segment)
+            pos = 0
+            while True:
+                newline = data.find(b"\n", pos)
+                if newline < 0:
+                    break
+                self.index.append((seg_no, pos, newline - pos))
+                pos = newline + 1
+            if pos < len(data):
+                # Dòng cuối bị ghi dở (ví dụ mất điện): cắt bỏ
+                os.truncate(path, pos)
+                segment.size = pos
+            covered_until = len(self.index)
+
+        if not self.segments:
+            self._new_segment()
+        else:
+            self._open_active()
+
+    def _migrate_legacy(self):
+        legacy = self.dir / "messages.json"
+        if not legacy.exists() or any(self.log_dir.iterdir()):
+            return
+        try:
+            messages = json.loads(legacy.read_text(encoding="utf-8"))
+        except json.JSONDecodeError:
+            messages = []
+        if messages:
+            fd, tmp_path = tempfile.mkstemp(dir=self.log_dir, prefix=".tmp-")
+            with os.fdopen(fd, "wb") as f:
+                for message in messages:
+                    f.write(json.dumps(message, ensure_ascii=False).encode("utf-8") + b"\n")
+            os.replace(tmp_path, self.log_dir / f"{0:012d}.jsonl")
+        legacy.rename(self.dir / "messages.json.bak")
+
+    def _open_active(self):
+        active = self.segments[-1]
+        self.fd = os.open(active.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+
+    def _new_segment(self):
+        if self.fd is not None:
+            os.close(self.fd)
+        start = len(self.index)
+        path = self.log_dir / f"{start:012d}.jsonl"
+        self.segments.append(_Segment(path, start, None, 0))
+        self._open_active()
+
+    def close(self):
+        with self.lock:
+            if self.fd is not None:
+                os.close(self.fd)
+                self.fd = None
+            if self._lock_fd is not None:
+                os.close(self._lock_fd)
+                self._lock_fd = None
+
+    # --- Ghi & đọc ---
+    def append(self, record: dict):
+        line = json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n"
+        with self.locked():
+            if self.fd is None:
+                self._open_active()
+            active = self.segments[-1]
+            if active.size and active.size + len(line) > MEMORY_SEGMENT_MAX_BYTES:
+                self._new_segment()
+                active = self.segments[-1]
+            os.write(self.fd, line)
+            if MEMORY_FSYNC:
+                os.fsync(self.fd)
+            # Offset lấy từ kích thước thật của file sau khi ghi (đang giữ khoá nên dòng vừa ghi nằm ở cuối)
+            end = os.fstat(self.fd).st_size
+            self.index.append((len(self.segments) - 1, end - len(line), len(line) - 1))
+            active.size = end
+
+    def count(self) -> int:
+        with self.locked():
+            return len(self.index)
+
+    def tail(self, limit: int | None) -> list[dict]:
+        try:
+            return self._read_tail(limit)
+        except FileNotFoundError:
+            # Segment vừa bị compaction xoá giữa chừng: đọc lại theo chỉ mục mới
+            return self._read_tail(limit)
+
+    def _read_tail(self, limit: int | None) -> list[dict]:
+        with self.locked():
+            entries = self.index if limit is None else self.index[-limit:] if limit > 0 else []
+            paths = [seg.path for seg in self.segments]
+        records = []
+        handles = {}
+        try:
+            for seg_no, offset, length in entries:
+                f = handles.get(seg_no)
+                if f is None:
+                    f = handles[seg_no] = open(paths[seg_no], "rb")
+                f.seek(offset)
+                records.append(json.loads(f.read(length)))
+        finally:
+            for f in handles.values():
+                f.close()
+        return records
+
+    # --- Compaction ---
+    def sealed_segments(self) -> int:
+        return len(self.segments) - 1
+
+    def compact(self):
+        """Gộp các segment đã đóng thành một file duy nhất (ghi file tạm rồi os.replace)."""
+        compact_fd = os.open(self.dir / ".compact.lock", os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(compact_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    # Một process khác đang gộp hội thoại này
+                    return
+            self._compact_locked()
+        finally:
+            os.close(compact_fd)
+
+    def _compact_locked(self):
+        # File tạm sót lại từ lần compaction/migration bị gián đoạn (chỉ người giữ .compact.lock dọn)
+        for entry in os.scandir(self.log_dir):
+            if entry.name.startswith(".tmp-"):
+                os.unlink(entry.path)
+
+        with self.locked():
+            sealed = self.segments[:-1]
+            if len(sealed) < 2:
+                return
+            first = sealed[0].start
+            end = self.segments[-1].start
+
+        # Đọc và ghi ngoài khoá: segment đã đóng không còn thay đổi
+        fd, tmp_path = tempfile.mkstemp(dir=self.log_dir, prefix=".tmp-")
+        bases = []
+        merged_size = 0
+        with os.fdopen(fd, "wb") as out:
+            for seg in sealed:
+                bases.append(merged_size)
+                data = seg.path.read_bytes()
+                out.write(data)
+                merged_size += len(data)
+            out.flush()
+            os.fsync(out.fileno())
+        merged_path = self.log_dir / f"{first:012d}-{end:012d}.jsonl"
+
+        with self.locked():
+            if [seg.path for seg in self.segments[:len(sealed)]] != [seg.path for seg in sealed]:
+                # Danh sách segment đã đổi trong lúc gộp: bỏ kết quả, lần sau gộp lại
+                os.unlink(tmp_path)
+                return
+            os.replace(tmp_path, merged_path)
+            removed = len(sealed) - 1
+            self.segments = [_Segment(merged_path, first, end, merged_size)] + self.segments[len(sealed):]
+            self.index = [
+                (0, bases[seg_no] + offset, length) if seg_no < len(sealed) else (seg_no - removed, offset, length)
+                for seg_no, offset, length in self.index
+            ]
+            for seg in sealed:
+                if seg.path != merged_path:
+                    seg.path.unlink(missing_ok=True)
+
+
+class MemoryStore:
+    """
+    Kho hội thoại file-based. `session_id` dạng "<user_id>:<conversation_id>" được ánh xạ vào
+    data/users/...; các session khác nằm trong data/sessions/<session_id>/.
+    Chỉ giữ tối đa MEMORY_MAX_OPEN_CONVERSATIONS hội thoại "nóng" trong bộ nhớ (LRU).
+    """
+
+    def __init__(self, base_dir: Path = BASE_DIR, max_open: int = MEMORY_MAX_OPEN_CONVERSATIONS):
+        self.base_dir = Path(base_dir)
+        self.max_open = max_open
+        self._open: OrderedDict[str, _Conversation] = OrderedDict()
+        self._lock = threading.Lock()
+        self._compactor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="memory-compact")
+
+    def _conversation_dir(self, session_id: str) -> Path:
+        if ":" in session_id:
+            user_id, conversation_id = session_id.split(":", 1)
+            return self.base_dir / "users" / _safe(user_id) / "conversations" / _safe(conversation_id)
+        return self.base_dir / "sessions" / _safe(session_id)
+
+    def _conversation(self, session_id: str) -> _Conversation:
+        with self._lock:
+            conv = self._open.get(session_id)
+            if conv is not None:
+                self._open.move_to_end(session_id)
+                return conv
+            conv = _Conversation(self._conversation_dir(session_id))
+            self._open[session_id] = conv
+            while len(self._open) > self.max_open:
+                _, evicted = self._open.popitem(last=False)
+                evicted.close()
+            return conv
+
+    def append(self, session_id: str, role: str, content: str) -> dict:
+        """Thêm một tin nhắn vào cuối hội thoại (O(1))."""
+        record = {"role": role, "content": content, "ts": int(time.time())}
+        conv = self._conversation(session_id)
+        conv.append(record)
+        with conv.lock:
+            if conv.sealed_segments() < MEMORY_COMPACT_MIN_SEGMENTS or conv.compacting:
+                return record
+            conv.compacting = True
+        self._compactor.submit(self._compact, conv)
+        return record
+
+    def get(self, session_id: str, limit: int | None = None) -> list[dict]:
+        """Trả về `limit` tin nhắn cuối (hoặc toàn bộ nếu None), theo thứ tự thời gian."""
+        return self._conversation(session_id).tail(limit)
+
+    def count(self, session_id: str) -> int:
+        return self._conversation(session_id).count()
+
+    def get_meta(self, session_id: str) -> dict:
+        return _read_json(self._conversation_dir(session_id) / "meta.json", {})
+
+    def update_meta(self, session_id: str, **fields) -> dict:
+        conv = self._conversation(session_id)
+        with conv.locked():
+            meta = _read_json(conv.dir / "meta.json", {"created_at": int(time.time())})
+            meta.update(fields)
+            meta["updated_at"] = int(time.time())
+            _atomic_write_json(conv.dir / "meta.json", meta)
+        return meta
+
+    def _compact(self, conv: _Conversation):
+        try:
+            conv.compact()
+        except OSError as e:
+            print(f"Lỗi khi compaction hội thoại {conv.dir}: {e}")
+        finally:
+            with conv.lock:
+                conv.compacting = False
+
+    def close(self):
+        self._compactor.shutdown(wait=True)
+        with self._lock:
+            for conv in self._open.values():
+                conv.close()
+            self._open.clear()
@@ -4,6 +4,7 @@ from typing import Literal, Union
 class ChatRequest(BaseModel):
     prompt: str
     session_id: str
+    latency_budget_ms: int | None = None
 
 class ThinkingChunk(BaseModel):
     type: Literal["thinking_chunk"] = "thinking_chunk"
@@ -16,6 +17,16 @@ class StatusUpdate(BaseModel):
     type: Literal["status_update"] = "status_update"
     content: str
 
+class ModelInfo(BaseModel):
+    type: Literal["model_info"] = "model_info"
+    model: str
+    hedged: bool = False
+    fallback: bool = False
+
+class FinalAnswerChunk(BaseModel):
+    type: Literal["final_answer_chunk"] = "final_answer_chunk"
+    content: str
+
 class FinalAnswer(BaseModel):
     type: Literal["final_answer"] = "final_answer"
     content: str
@@ -26,8 +37,9 @@ class ErrorMessage(BaseModel):
 
 class GeneratedImage(BaseModel):
     type: Literal["generated_image"] = "generated_image"
-    base64_data: str
+    url: str | None = None
+    base64_data: str | None = None
     alt_text: str
-    final_message: str
+    final_message: str = ""
 
-StreamResponse = Union[ThinkingChunk, ThinkingDone, StatusUpdate, FinalAnswer, ErrorMessage, GeneratedImage]
\ No newline at end of file
+StreamResponse = Union[ThinkingChunk, ThinkingDone, StatusUpdate, ModelInfo, FinalAnswerChunk, FinalAnswer, ErrorMessage, GeneratedImage]
\ No newline at end of file
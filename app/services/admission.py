@@ -0,0 +1,190 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from app.core.config import (
+    MODEL_PRO, MODEL_FLASH, MODEL_LIVE, MODEL_NANO_BANANA,
+    ADMISSION_PRO_CONCURRENCY, ADMISSION_PRO_RPM,
+    ADMISSION_FLASH_CONCURRENCY, ADMISSION_FLASH_RPM,
+    ADMISSION_IMAGE_CONCURRENCY, ADMISSION_IMAGE_RPM,
+    ADMISSION_MAX_QUEUE, ADMISSION_MAX_WAIT,
+)
+
+
+class AdmissionRejected(Exception):
+    """Yêu cầu bị từ chối vì hàng đợi đã đầy hoặc chờ quá lâu."""
+
+
+class Ticket:
+    """Vé chờ của một lời gọi model: biết vị trí trong hàng đợi và phải được release sau khi dùng."""
+
+    def __init__(self, limiter: "ModelLimiter"):
+        self._limiter = limiter
+        self._admitted = asyncio.get_running_loop().create_future()
+        self._released = False
+        self.enqueued_at = time.monotonic()
+
+    @property
+    def admitted(self) -> bool:
+        return self._admitted.done() and not self._admitted.cancelled()
+
+    @property
+    def position(self) -> int:
+        """Vị trí trong hàng đợi (1 là đầu hàng), 0 nếu đã được cấp slot."""
+        try:
+            return self._limiter._waiters.index(self) + 1
+        except ValueError:
+            return 0
+
+    async def wait(self, timeout: float) -> bool:
+        """Chờ tối đa `timeout` giây; True nếu đã được cấp slot. Quá ADMISSION_MAX_WAIT thì từ chối."""
+        if self.admitted:
+            return True
+        remaining = self.enqueued_at + ADMISSION_MAX_WAIT - time.monotonic()
+        done, _ = await asyncio.wait({self._admitted}, timeout=max(0.0, min(timeout, remaining)))
+        if done:
+            return True
+        if time.monotonic() - self.enqueued_at >= ADMISSION_MAX_WAIT:
+            self._limiter._abandon(self, timed_out=True)
+            raise AdmissionRejected(f"Chờ quá {ADMISSION_MAX_WAIT:.0f} giây để gọi {self._limiter.model_name}.")
+        return False
+
+    def release(self):
+        """Trả slot (an toàn khi gọi nhiều lần, kể cả khi vé chưa được cấp slot)."""
+        if self._released:
+            return
+        self._released = True
+        if self.admitted:
+            self._limiter._release()
+        else:
+            self._limiter._abandon(self)
+
+
+class ModelLimiter:
+    """
+    Giới hạn cho một model upstream trong worker hiện tại:
+    số lời gọi đồng thời, token bucket (số request/phút) và hàng đợi chờ có giới hạn.
+    """
+
+    def __init__(self, model_name: str, max_concurrency: int, rpm: float, max_queue: int):
+        self.model_name = model_name
+        self.max_concurrency = max(1, max_concurrency)
+        # rpm <= 0: không giới hạn tốc độ, chỉ giới hạn số lời gọi đồng thời
+        self.rate = rpm / 60.0
+        self.burst = float(self.max_concurrency)
+        self.max_queue = max_queue
+        self._tokens = self.burst
+        self._last_refill = time.monotonic()
+        self._waiters: deque[Ticket] = deque()
+        self._in_flight = 0
+        self._timer: asyncio.TimerHandle | None = None
+        # Số liệu
+        self.admitted_total = 0
+        self.rejected_queue_full = 0
+        self.rejected_timeout = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def _refill(self):
+        if self.rate <= 0:
+            self._tokens = self.burst
+            return
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+    def _admit(self, ticket: Ticket):
+        self._tokens -= 1
+        self._in_flight += 1
+        waited = time.monotonic() - ticket.enqueued_at
+        self.admitted_total += 1
+        self.wait_seconds_total += waited
+        self.wait_seconds_max = max(self.wait_seconds_max, waited)
+        ticket._admitted.set_result(True)
+
+    def _dispatch(self):
+        self._timer = None
+        self._refill()
+        while self._waiters and self._in_flight < self.max_concurrency:
+            if self._tokens < 1:
+                delay = (1 - self._tokens) / self.rate
+                self._timer = asyncio.get_running_loop().call_later(delay, self._dispatch)
+                return
+            self._admit(self._waiters.popleft())
+
+    def enqueue(self) -> Ticket:
+        if len(self._waiters) >= self.max_queue:
+            self.rejected_queue_full += 1
+            raise AdmissionRejected(f"Hàng đợi gọi {self.model_name} đã đầy.")
+        ticket = Ticket(self)
+        self._waiters.append(ticket)
+        if self._timer is None:
+            self._dispatch()
+        return ticket
+
+    def _release(self):
+        self._in_flight -= 1
+        if self._timer is None:
+            self._dispatch()
+
+    def _abandon(self, ticket: Ticket, timed_out: bool = False):
+        try:
+            self._waiters.remove(ticket)
+        except ValueError:
+            return
+        ticket._released = True
+        if timed_out:
+            self.rejected_timeout += 1
+        if not ticket._admitted.done():
+            ticket._admitted.cancel()
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self._in_flight,
+            "queued": len(self._waiters),
+            "max_concurrency": self.max_concurrency,
+            "rate_per_minute": self.rate * 60,
+            "admitted": self.admitted_total,
+            "rejected_queue_full": self.rejected_queue_full,
+            "rejected_timeout": self.rejected_timeout,
+            "wait_seconds_avg": (self.wait_seconds_total / self.admitted_total) if self.admitted_total else 0.0,
+            "wait_seconds_max": self.wait_seconds_max,
+        }
+
+
+_LIMITS = {
+    MODEL_PRO: (ADMISSION_PRO_CONCURRENCY, ADMISSION_PRO_RPM),
+    MODEL_FLASH: (ADMISSION_FLASH_CONCURRENCY, ADMISSION_FLASH_RPM),
+    MODEL_LIVE: (ADMISSION_FLASH_CONCURRENCY, ADMISSION_FLASH_RPM),
+    MODEL_NANO_BANANA: (ADMISSION_IMAGE_CONCURRENCY, ADMISSION_IMAGE_RPM),
+}
+_limiters: dict[str, ModelLimiter] = {}
+
+
+def get_limiter(model_name: str) -> ModelLimiter:
+    limiter = _limiters.get(model_name)
+    if limiter is None:
+        concurrency, rpm = _LIMITS.get(model_name, (ADMISSION_FLASH_CONCURRENCY, ADMISSION_FLASH_RPM))
+        limiter = _limiters[model_name] = ModelLimiter(model_name, concurrency, rpm, ADMISSION_MAX_QUEUE)
+    return limiter
+
+
+def enqueue(model_name: str) -> Ticket:
+    """Xếp hàng chờ slot gọi `model_name`; ném AdmissionRejected nếu hàng đợi đầy."""
+    return get_limiter(model_name).enqueue()
+
+
+@asynccontextmanager
+async def slot(model_name: str):
+    """Chờ slot (không phát sự kiện) rồi tự release khi ra khỏi khối lệnh."""
+    ticket = enqueue(model_name)
+    try:
+        while not await ticket.wait(ADMISSION_MAX_WAIT):
+            pass
+        yield ticket
+    finally:
+        ticket.release()
+
+
+def get_admission_stats() -> dict:
+    return {name: limiter.stats() for name, limiter in _limiters.items()}
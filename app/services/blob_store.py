@@ -0,0 +1,116 @@
+import hashlib
+import os
+import re
+import tempfile
+import threading
+import time
+from pathlib import Path
+from app.core.config import BLOB_DIR, BLOB_MAX_BYTES, BLOB_MAX_AGE_SECONDS, BLOB_EVICT_INTERVAL, PUBLIC_BASE_URL
+
+# Kho file định danh theo nội dung: tên file là SHA-256 + phần mở rộng, nên cùng một ảnh chỉ lưu một lần
+# và URL của nó không bao giờ đổi nội dung (cho phép trình duyệt cache vĩnh viễn).
+# Ghi bằng os.replace nên an toàn khi nhiều gunicorn worker cùng ghi; mtime dùng cho việc dọn dẹp.
+STORE_DIR = Path(BLOB_DIR).resolve()
+STORE_DIR.mkdir(parents=True, exist_ok=True)
+
+_EXTENSIONS = {
+    "image/png": ".png",
+    "image/jpeg": ".jpg",
+    "image/webp": ".webp",
+    "image/gif": ".gif",
+}
+MIME_TYPES = {ext: mime for mime, ext in _EXTENSIONS.items()}
+BLOB_ID_PATTERN = re.compile(r"^[0-9a-f]{64}\.(png|jpg|webp|gif)$")
+
+# Tổng dung lượng ước tính (lần quét gần nhất + các blob worker này đã ghi thêm), để không quét
+# thư mục ở mỗi lần ghi. Blob do worker khác ghi được tính ở lần quét định kỳ kế tiếp.
+_evict_lock = threading.Lock()
+_estimated_total: int | None = None
+_last_evict = 0.0
+
+
+def blob_url(blob_id: str) -> str:
+    return f"{PUBLIC_BASE_URL}/api/blobs/{blob_id}"
+
+
+def blob_path(blob_id: str) -> Path | None:
+    """Đường dẫn file của blob, hoặc None nếu id không hợp lệ."""
+    if not BLOB_ID_PATTERN.match(blob_id):
+        return None
+    return STORE_DIR / blob_id
+
+
+def put(data: bytes, mime_type: str) -> str:
+    """Lưu nội dung vào kho (bỏ qua nếu đã có), trả về blob id."""
+    extension = _EXTENSIONS.get(mime_type)
+    if extension is None:
+        raise ValueError(f"Định dạng không được hỗ trợ: {mime_type}")
+    blob_id = hashlib.sha256(data).hexdigest() + extension
+    path = STORE_DIR / blob_id
+    if path.exists():
+        os.utime(path)
+        return blob_id
+
+    fd, tmp_path = tempfile.mkstemp(dir=STORE_DIR, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except OSError:
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+    _maybe_evict(len(data))
+    return blob_id
+
+
+def _maybe_evict(added: int):
+    """Chỉ quét thư mục khi tổng ước tính vượt BLOB_MAX_BYTES hoặc đã quá BLOB_EVICT_INTERVAL từ lần quét trước."""
+    global _estimated_total, _last_evict
+    with _evict_lock:
+        if _estimated_total is not None:
+            _estimated_total += added
+            if _estimated_total <= BLOB_MAX_BYTES and time.monotonic() - _last_evict < BLOB_EVICT_INTERVAL:
+                return
+        _estimated_total = _evict()
+        _last_evict = time.monotonic()
+
+
+def _evict() -> int:
+    """
+    Xoá blob quá hạn BLOB_MAX_AGE_SECONDS, rồi các blob cũ nhất cho tới khi tổng dung lượng dưới giới hạn.
+    Trả về tổng dung lượng còn lại.
+    """
+    expire_before = time.time() - BLOB_MAX_AGE_SECONDS
+    entries = []
+    total = 0
+    for entry in os.scandir(STORE_DIR):
+        if entry.name.startswith(".tmp-"):
+            continue
+        try:
+            stat = entry.stat()
+        except FileNotFoundError:
+            continue
+        if stat.st_mtime < expire_before:
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+            continue
+        entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total += stat.st_size
+
+    if total <= BLOB_MAX_BYTES:
+        return total
+    entries.sort()
+    for _, size, path in entries:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        if total <= BLOB_MAX_BYTES:
+            break
+    return total
@@ -0,0 +1,140 @@
+import math
+import re
+from collections import Counter
+from app.core.config import CONTEXT_TOKEN_BUDGET, CONTEXT_CHUNK_CHARS
+from app.services.text_utils import tokenize
+
+# Ước lượng thô số token từ số ký tự (đủ dùng để chia ngân sách, không cần tokenizer thật)
+CHARS_PER_TOKEN = 4
+OUTLINE_MAX_LINES = 40
+OUTLINE_BUDGET_RATIO = 0.1
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+_MARKER_PATTERN = re.compile(r"^---\s.+\s---$")
+_HEADING_PATTERN = re.compile(
+    r"^((chương|chuong|phần|phan|mục|muc|điều|dieu|article|section|chapter)\s+[\w.]+|[IVXLC]+\.|\d+(\.\d+)*\.?)\s+\S",
+    re.IGNORECASE,
+)
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def split_chunks(text: str, max_chars: int = CONTEXT_CHUNK_CHARS) -> list[str]:
+    """Gom các dòng liên tiếp thành đoạn tối đa `max_chars` ký tự, ưu tiên cắt ở dòng trống."""
+    chunks = []
+    current: list[str] = []
+    size = 0
+    for line in text.splitlines():
+        while len(line) > max_chars:
+            if current:
+                chunks.append("\n".join(current))
+                current, size = [], 0
+            chunks.append(line[:max_chars])
+            line = line[max_chars:]
+        if current and (size + len(line) > max_chars or (not line.strip() and size > max_chars // 2)):
+            chunks.append("\n".join(current))
+            current, size = [], 0
+        if line.strip() or current:
+            current.append(line)
+            size += len(line) + 1
+    if current:
+        chunks.append("\n".join(current))
+    return [chunk for chunk in chunks if chunk.strip()]
+
+
+def build_outline(text: str, max_lines: int = OUTLINE_MAX_LINES) -> list[str]:
+    """Dàn ý ngắn: các dòng đánh dấu trang/sheet/slide và các dòng trông giống tiêu đề."""
+    outline = []
+    for raw_line in text.splitlines():
+        line = raw_line.strip()
+        if not line or len(line) > 100:
+            continue
+        is_heading = (
+            _MARKER_PATTERN.match(line)
+            or _HEADING_PATTERN.match(line)
+            or (line.isupper() and len(line) > 3)
+        )
+        if is_heading:
+            outline.append(line)
+            if len(outline) >= max_lines:
+                break
+    return outline
+
+
+class BM25Index:
+    """Chỉ mục từ vựng BM25 đơn giản trên danh sách đoạn văn."""
+
+    def __init__(self, chunks: list[str]):
+        self._term_freqs = [Counter(tokenize(chunk)) for chunk in chunks]
+        self._lengths = [sum(tf.values()) for tf in self._term_freqs]
+        self._avg_length = (sum(self._lengths) / len(self._lengths)) if self._lengths else 0.0
+        doc_freq = Counter()
+        for tf in self._term_freqs:
+            doc_freq.update(tf.keys())
+        n = len(chunks)
+        self._idf = {term: math.log(1 + (n - df + 0.5) / (df + 0.5)) for term, df in doc_freq.items()}
+
+    def scores(self, query: str) -> list[float]:
+        terms = [term for term in set(tokenize(query)) if term in self._idf]
+        results = []
+        for tf, length in zip(self._term_freqs, self._lengths):
+            score = 0.0
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * length / (self._avg_length or 1))
+            for term in terms:
+                freq = tf.get(term)
+                if freq:
+                    score += self._idf[term] * freq * (BM25_K1 + 1) / (freq + norm)
+            results.append(score)
+        return results
+
+
+def pack_document(text: str, query: str, token_budget: int = CONTEXT_TOKEN_BUDGET) -> str:
+    """
+    Rút gọn tài liệu đính kèm cho vừa ngân sách token: nếu tài liệu đã vừa thì giữ nguyên,
+    ngược lại gửi dàn ý ngắn cùng các đoạn liên quan nhất tới yêu cầu (giữ thứ tự gốc).
+    """
+    total_tokens = estimate_tokens(text)
+    if total_tokens <= token_budget:
+        return text
+
+    chunks = split_chunks(text)
+    outline = build_outline(text)
+    outline_text = "\n".join(outline)
+    while outline and estimate_tokens(outline_text) > token_budget * OUTLINE_BUDGET_RATIO:
+        outline.pop()
+        outline_text = "\n".join(outline)
+
+    remaining = token_budget - estimate_tokens(outline_text)
+    scores = BM25Index(chunks).scores(query)
+    # Đoạn có điểm cao hơn được chọn trước; cùng điểm thì ưu tiên đoạn đứng trước
+    ranked = sorted(range(len(chunks)), key=lambda i: (-scores[i], i))
+    selected = []
+    for i in ranked:
+        cost = estimate_tokens(chunks[i])
+        if cost <= remaining:
+            selected.append(i)
+            remaining -= cost
+        if remaining <= 0:
+            break
+    selected.sort()
+
+    parts = [
+        f"[Tài liệu dài khoảng {total_tokens:,} token, vượt ngân sách {token_budget:,} token. "
+        f"Dưới đây là dàn ý và {len(selected)}/{len(chunks)} đoạn liên quan nhất tới yêu cầu.]"
+    ]
+    if outline_text:
+        parts.append(f"## DÀN Ý ##\n{outline_text}")
+    excerpts = []
+    previous = -1
+    for i in selected:
+        if i != previous + 1:
+            excerpts.append("[...]")
+        excerpts.append(f"[Đoạn {i + 1}/{len(chunks)}]\n{chunks[i]}")
+        previous = i
+    if previous != len(chunks) - 1:
+        excerpts.append("[...]")
+    parts.append("## CÁC ĐOẠN TRÍCH ##\n" + "\n".join(excerpts))
+    return "\n\n".join(parts)
@@ -0,0 +1,110 @@
+import asyncio
+import hashlib
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from fastapi import UploadFile
+from app.core.config import UPLOAD_MAX_BYTES, UPLOAD_CHUNK_SIZE, PARSE_WORKERS, PARSE_PROGRESS_INTERVAL, PDF_PARSE_TIMEOUT
+from app.services.file_parser import parse_file, PARSER_VERSION
+from app.services import parsed_cache, sse
+
+
+class UploadTooLarge(ValueError):
+    pass
+
+
+def too_large_message(max_bytes: int = UPLOAD_MAX_BYTES) -> str:
+    return f"Kích thước file vượt quá {max_bytes / (1024 * 1024):g}MB."
+
+
+_parse_executor: ThreadPoolExecutor | None = None
+
+
+def _get_parse_executor() -> ThreadPoolExecutor:
+    global _parse_executor
+    if _parse_executor is None:
+        _parse_executor = ThreadPoolExecutor(max_workers=PARSE_WORKERS, thread_name_prefix="file-parse")
+    return _parse_executor
+
+
+def shutdown_parse_executor():
+    global _parse_executor
+    if _parse_executor is not None:
+        _parse_executor.shutdown(wait=False, cancel_futures=True)
+        _parse_executor = None
+
+
+async def read_upload_bytes(file: UploadFile, max_bytes: int = UPLOAD_MAX_BYTES) -> bytes:
+    """Đọc file tải lên vào bộ nhớ theo từng khối, dừng ngay khi vượt giới hạn kích thước."""
+    buffer = bytearray()
+    while True:
+        chunk = await file.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            break
+        buffer.extend(chunk)
+        if len(buffer) > max_bytes:
+            raise UploadTooLarge(too_large_message(max_bytes))
+    return bytes(buffer)
+
+
+async def save_upload(file: UploadFile, upload_dir: Path, max_bytes: int = UPLOAD_MAX_BYTES) -> tuple[Path, str]:
+    """
+    Ghi file tải lên xuống đĩa theo từng khối với đường dẫn tạm duy nhất, đồng thời tính SHA-256.
+    Việc ghi đĩa chạy ngoài event loop; file dở dang bị xoá nếu vượt giới hạn hoặc lỗi.
+    """
+    suffix = Path(file.filename or "").suffix.lower()
+    file_path = upload_dir / f"{uuid.uuid4().hex}{suffix}"
+    written = 0
+    digest = hashlib.sha256()
+    out = await asyncio.to_thread(file_path.open, "wb")
+    try:
+        while True:
+            chunk = await file.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            written += len(chunk)
+            if written > max_bytes:
+                raise UploadTooLarge(too_large_message(max_bytes))
+            digest.update(chunk)
+            await asyncio.to_thread(out.write, chunk)
+    except BaseException:
+        await asyncio.to_thread(out.close)
+        remove_upload(file_path)
+        raise
+    await asyncio.to_thread(out.close)
+    return file_path, digest.hexdigest()
+
+
+def remove_upload(file_path: Path):
+    try:
+        os.remove(file_path)
+    except FileNotFoundError:
+        pass
+
+
+def _parse_with_cache(file_path: Path, digest: str) -> str:
+    key = parsed_cache.make_key(digest, file_path.suffix, PARSER_VERSION)
+    # Lease dài hơn thời gian phân tích tối đa để worker khác không phân tích trùng
+    return parsed_cache.get_or_parse(key, lambda: parse_file(file_path), lease_ttl=PDF_PARSE_TIMEOUT + 30)
+
+
+def start_parse(file_path: Path, digest: str) -> asyncio.Future:
+    """
+    Đưa việc phân tích file vào thread pool riêng, trả về future để chờ kết quả.
+    Nếu nội dung cùng file (theo SHA-256) đã có trong cache thì bỏ qua bước phân tích.
+    """
+    loop = asyncio.get_running_loop()
+    return loop.run_in_executor(_get_parse_executor(), _parse_with_cache, file_path, digest)
+
+
+async def parse_progress_events(parse_future: asyncio.Future, filename: str):
+    """Phát các sự kiện StatusUpdate định kỳ trong khi file đang được phân tích."""
+    yield sse.status_update(f"📄 Đang đọc nội dung file `{filename}`...")
+    elapsed = 0.0
+    while True:
+        done, _ = await asyncio.wait({parse_future}, timeout=PARSE_PROGRESS_INTERVAL)
+        if done:
+            break
+        elapsed += PARSE_PROGRESS_INTERVAL
+        yield sse.status_update(f"📄 Vẫn đang đọc file `{filename}` ({int(elapsed)} giây)...")
@@ -1,87 +1,203 @@
-import pypdf
-import docx
-import openpyxl
-import pptx
-import pandas as pd
+# pypdf, python-docx, python-pptx và pandas/openpyxl được import ở lần dùng đầu tiên (hoặc làm nóng
+# dưới nền sau khi khởi động, xem import_warmup.py) để không làm chậm khởi động khi chưa có file nào.
+import math
+import time
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, wait
 from pathlib import Path
+from typing import NamedTuple
+from app.core.metrics import PARSER_SECONDS
+from app.core.config import PDF_MAX_PAGES, PDF_PARSE_TIMEOUT, PDF_PARALLEL_WORKERS, PDF_PARALLEL_MIN_PAGES
 
-def parse_pdf(file_path: Path) -> str:
-    """Đọc và trích xuất toàn bộ nội dung văn bản từ file PDF."""
-    text = ""
+class ParsedText(NamedTuple):
+    text: str
+    # False nếu nội dung không đầy đủ do lỗi hoặc quá thời gian: không được lưu vào cache
+    complete: bool = True
+
+_pdf_pool: ProcessPoolExecutor | None = None
+_pdf_pool_lock = threading.Lock()
+
+def _get_pdf_pool() -> ProcessPoolExecutor:
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is None:
+            # forkserver tránh fork trực tiếp từ một worker đang chạy nhiều thread
+            ctx = multiprocessing.get_context("forkserver")
+            _pdf_pool = ProcessPoolExecutor(max_workers=PDF_PARALLEL_WORKERS, mp_context=ctx)
+        return _pdf_pool
+
+def shutdown_pdf_pool():
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is not None:
+            _pdf_pool.shutdown(wait=False, cancel_futures=True)
+            _pdf_pool = None
+
+def _extract_pdf_range(file_path: str, start: int, stop: int, deadline: float) -> list[str]:
+    """
+    Trích xuất văn bản các trang [start, stop) — chạy trong process con.
+    Dừng ở ranh giới trang khi quá `deadline` (time.time()), để việc đã bị bỏ không chiếm pool.
+    """
+    import pypdf
+    reader = pypdf.PdfReader(file_path)
+    pages = []
+    for i in range(start, stop):
+        if time.time() > deadline:
+            break
+        pages.append(reader.pages[i].extract_text() or "")
+    return pages
+
+def _extract_pdf_parallel(file_path: Path, page_count: int, deadline: float) -> list[str]:
+    """
+    Chia các trang thành nhiều khoảng, trích xuất song song trên process pool rồi ghép lại theo thứ tự.
+    Khi hết thời gian, chỉ giữ phần liên tục từ đầu đã hoàn tất.
+    """
+    chunk_size = max(1, math.ceil(page_count / (PDF_PARALLEL_WORKERS * 2)))
+    remaining = max(0.0, deadline - time.monotonic())
+    # Process con dùng đồng hồ thực (time.time) vì không chia sẻ mốc monotonic với process cha
+    child_deadline = time.time() + remaining
+    pool = _get_pdf_pool()
+    ranges = [(start, min(start + chunk_size, page_count)) for start in range(0, page_count, chunk_size)]
+    futures = [
+        pool.submit(_extract_pdf_range, str(file_path), start, stop, child_deadline)
+        for start, stop in ranges
+    ]
+    wait(futures, timeout=remaining)
+
+    pages = []
+    for (start, stop), future in zip(ranges, futures):
+        if not future.done():
+            break
+        chunk = future.result()
+        pages.extend(chunk)
+        if len(chunk) < stop - start:
+            break
+    for future in futures:
+        future.cancel()
+    return pages
+
+def parse_pdf(file_path: Path) -> ParsedText:
+    """Đọc và trích xuất nội dung văn bản từ file PDF (tối đa PDF_MAX_PAGES trang, trong PDF_PARSE_TIMEOUT giây)."""
+    deadline = time.monotonic() + PDF_PARSE_TIMEOUT
     try:
+        import pypdf
         reader = pypdf.PdfReader(file_path)
-        for page in reader.pages:
-            text += page.extract_text() + "\n"
+        total_pages = len(reader.pages)
+        page_count = min(total_pages, PDF_MAX_PAGES)
+
+        if PDF_PARALLEL_WORKERS > 1 and page_count >= PDF_PARALLEL_MIN_PAGES:
+            pages = _extract_pdf_parallel(file_path, page_count, deadline)
+        else:
+            pages = []
+            for i in range(page_count):
+                if time.monotonic() > deadline:
+                    break
+                pages.append(reader.pages[i].extract_text() or "")
     except Exception as e:
-        return f"[Lỗi khi đọc file PDF: {e}]"
-    return text
+        return ParsedText(f"[Lỗi khi đọc file PDF: {e}]", complete=False)
+
+    parts = [f"{page_text}\n" for page_text in pages]
+    timed_out = len(pages) < page_count
+    if timed_out:
+        parts.append(f"[Đã dừng do quá thời gian xử lý: mới đọc {len(pages)}/{total_pages} trang]\n")
+    elif page_count < total_pages:
+        parts.append(f"[Chỉ đọc {page_count}/{total_pages} trang đầu tiên]\n")
+    return ParsedText("".join(parts), complete=not timed_out)
 
 def parse_docx(file_path: Path) -> str:
     """Đọc và trích xuất toàn bộ nội dung văn bản từ file DOCX."""
-    text = ""
     try:
+        import docx
         doc = docx.Document(file_path)
-        for para in doc.paragraphs:
-            text += para.text + "\n"
+        parts = [f"{para.text}\n" for para in doc.paragraphs]
     except Exception as e:
         return f"[Lỗi khi đọc file DOCX: {e}]"
-    return text
+    return "".join(parts)
 
 def parse_xlsx(file_path: Path) -> str:
     """
     Sử dụng Pandas để đọc tất cả các sheet từ file Excel và chuyển thành chuỗi văn bản.
     Đây là cách làm mạnh mẽ và ổn định hơn.
     """
-    text = ""
+    parts = []
     try:
+        import pandas as pd
         # engine='openpyxl' được chỉ định để đảm bảo khả năng tương thích
         xls = pd.ExcelFile(file_path, engine='openpyxl')
         for sheet_name in xls.sheet_names:
-            text += f"--- Sheet: {sheet_name} ---\n"
+            parts.append(f"--- Sheet: {sheet_name} ---\n")
             # Đọc từng sheet vào một DataFrame
             df = pd.read_excel(xls, sheet_name=sheet_name)
             # Chuyển DataFrame thành một chuỗi văn bản dễ đọc
-            text += df.to_string() + "\n\n"
+            parts.append(df.to_string() + "\n\n")
     except Exception as e:
         return f"[Lỗi khi đọc file XLSX: {e}]"
-    return text
+    return "".join(parts)
 
 def parse_pptx(file_path: Path) -> str:
     """Đọc và trích xuất toàn bộ nội dung văn bản từ các slide trong file PPTX."""
-    text = ""
+    parts = []
     try:
+        import pptx
         prs = pptx.Presentation(file_path)
         for i, slide in enumerate(prs.slides):
-            text += f"--- Slide {i+1} ---\n"
+            parts.append(f"--- Slide {i+1} ---\n")
             for shape in slide.shapes:
                 if hasattr(shape, "text"):
-                    text += shape.text + "\n"
+                    parts.append(shape.text + "\n")
     except Exception as e:
         return f"[Lỗi khi đọc file PPTX: {e}]"
-    return text
+    return "".join(parts)
+
+# Tăng phiên bản khi thay đổi cách trích xuất để vô hiệu hoá cache cũ
+PARSER_VERSION = "2"
+
+TEXT_EXTENSIONS = ['.txt', '.md', '.py', '.js', '.html', '.css', '.json', '.csv']
+SUPPORTED_EXTENSIONS = ['.pdf', '.docx', '.xlsx', '.pptx'] + TEXT_EXTENSIONS
 
-def parse_file(file_path: Path) -> str:
+def is_supported(file_path: Path) -> bool:
+    return file_path.suffix.lower() in SUPPORTED_EXTENSIONS
+
+def parse_file(file_path: Path) -> ParsedText:
     """
     Hàm chính để nhận diện loại file và gọi hàm xử lý tương ứng.
     """
     extension = file_path.suffix.lower()
-    
+    if extension not in SUPPORTED_EXTENSIONS:
+        raise ValueError(f"Định dạng file '{extension}' không được hỗ trợ.")
+
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        result = _parse_by_extension(file_path, extension)
+        # Các parser trả về chuỗi "[Lỗi ...]" thay vì ném exception
+        if result.text.startswith("[Lỗi"):
+            outcome = "error"
+        else:
+            outcome = "ok" if result.complete else "timeout"
+        return result
+    finally:
+        PARSER_SECONDS.observe(time.perf_counter() - start, extension.lstrip("."), outcome)
+
+def _parse_by_extension(file_path: Path, extension: str) -> ParsedText:
     if extension == ".pdf":
         return parse_pdf(file_path)
     elif extension == ".docx":
-        return parse_docx(file_path)
+        text = parse_docx(file_path)
     elif extension == ".xlsx":
-        return parse_xlsx(file_path)
+        text = parse_xlsx(file_path)
     elif extension == ".pptx":
-        return parse_pptx(file_path)
-    elif extension in ['.txt', '.md', '.py', '.js', '.html', '.css', '.json', '.csv']:
+        text = parse_pptx(file_path)
+    elif extension in TEXT_EXTENSIONS:
         try:
-            return file_path.read_text(encoding="utf-8")
+            text = file_path.read_text(encoding="utf-8")
         except Exception:
             # Thử đọc với encoding khác nếu utf-8 thất bại
             try:
-                return file_path.read_text(encoding="latin-1")
+                text = file_path.read_text(encoding="latin-1")
             except Exception as e:
-                return f"[Lỗi khi đọc file văn bản: {e}]"
+                text = f"[Lỗi khi đọc file văn bản: {e}]"
     else:
-        raise ValueError(f"Định dạng file '{extension}' không được hỗ trợ.")
\ No newline at end of file
+        raise ValueError(f"Định dạng file '{extension}' không được hỗ trợ.")
+    return ParsedText(text, complete=not text.startswith("[Lỗi"))
\ No newline at end of file
@@ -1,59 +1,65 @@
 import time
-import base64
-from pathlib import Path
-from typing import List, Union
-from PIL import Image
-import google.generativeai as genai
+from typing import List
 from google.generativeai.protos import Part
 import requests
 import urllib.parse
 import asyncio
+from app.services.model_registry import get_model
+from app.services import admission, blob_store
+from app.services.image_preprocess import prepare_image
+from app.core.config import MODEL_NANO_BANANA, IMAGE_EDIT_MAX_EDGE
 
-# Tên model được định nghĩa ở đây
-MODEL_NANO_BANANA = "gemini-2.5-flash-image-preview"
-
-def get_base64_from_response(resp) -> str:
-    """Trích xuất dữ liệu ảnh từ response và chuyển thành Base64."""
+def get_image_from_response(resp) -> tuple[bytes, str]:
+    """Trích xuất dữ liệu ảnh (bytes, mime_type) từ response."""
     for cand in getattr(resp, "candidates", []) or []:
         for part in getattr(cand, "content", {}).parts or []:
             if getattr(part, "inline_data", None):
                 data = part.inline_data
                 if data and data.data:
-                    return base64.b64encode(data.data).decode('utf-8')
+                    return data.data, data.mime_type or "image/png"
     
     debug_texts = [part.text for cand in getattr(resp, "candidates", []) for part in getattr(cand, "content", {}).parts if getattr(part, "text", None)]
     if debug_texts:
         raise RuntimeError("Nano Banana không trả về ảnh. Phản hồi của model:\n" + "\n".join(debug_texts))
     raise RuntimeError("Nano Banana không trả về ảnh.")
 
+async def _store_image(resp) -> str:
+    """Lưu ảnh trong response vào kho blob và trả về URL."""
+    data, mime_type = get_image_from_response(resp)
+    blob_id = await asyncio.to_thread(blob_store.put, data, mime_type)
+    return blob_store.blob_url(blob_id)
+
 async def nano_generate_image(prompt: str) -> str:
-    """Tạo ảnh từ văn bản và trả về chuỗi Base64."""
+    """Tạo ảnh từ văn bản, lưu vào kho blob và trả về URL của ảnh."""
     if not prompt or not prompt.strip():
         raise ValueError("Prompt để tạo ảnh không được để trống.")
 
-    # Sử dụng cách khởi tạo model tiêu chuẩn
-    model = genai.GenerativeModel(MODEL_NANO_BANANA)
+    # Dùng model chung từ registry thay vì khởi tạo lại mỗi lần gọi
+    model = get_model("nano_banana")
     enhanced_prompt = f"{prompt}, high quality, sharp focus, detailed, cinematic lighting"
     
     # Sử dụng phiên bản bất đồng bộ (async)
-    resp = await model.generate_content_async(contents=[enhanced_prompt])
-    return get_base64_from_response(resp)
+    async with admission.slot(MODEL_NANO_BANANA):
+        resp = await model.generate_content_async(contents=[enhanced_prompt])
+    return await _store_image(resp)
 
 async def nano_edit_image(image_bytes_list: List[bytes], instruction: str) -> str:
-    """Chỉnh sửa ảnh từ (các) ảnh đầu vào và hướng dẫn, trả về chuỗi Base64."""
+    """Chỉnh sửa ảnh từ (các) ảnh đầu vào và hướng dẫn, lưu vào kho blob và trả về URL của ảnh."""
     if not image_bytes_list:
         raise ValueError("Phải cung cấp ít nhất một ảnh đầu vào.")
     if not instruction or not instruction.strip():
         raise ValueError("Hướng dẫn chỉnh sửa không được để trống.")
 
-    # Sử dụng cách khởi tạo model tiêu chuẩn
-    model = genai.GenerativeModel(MODEL_NANO_BANANA)
+    # Dùng model chung từ registry thay vì khởi tạo lại mỗi lần gọi
+    model = get_model("nano_banana")
 
-    # Giả định mime_type là png, có thể cải tiến để tự nhận diện sau
-    image_parts = [Part(inline_data={'mime_type': 'image/png', 'data': img_bytes}) for img_bytes in image_bytes_list]
+    # Chuẩn hoá ảnh (định dạng thật, hướng xoay, kích thước) trước khi gửi
+    prepared_images = await asyncio.gather(*(prepare_image(img_bytes, IMAGE_EDIT_MAX_EDGE) for img_bytes in image_bytes_list))
+    image_parts = [Part(inline_data={'mime_type': img.mime_type, 'data': img.data}) for img in prepared_images]
     
     contents = [instruction] + image_parts
 
     # Sử dụng phiên bản bất đồng bộ (async)
-    resp = await model.generate_content_async(contents=contents)
-    return get_base64_from_response(resp)
\ No newline at end of file
+    async with admission.slot(MODEL_NANO_BANANA):
+        resp = await model.generate_content_async(contents=contents)
+    return await _store_image(resp)
\ No newline at end of file
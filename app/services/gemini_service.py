@@ -1,22 +1,45 @@
-import google.generativeai as genai
 from google.generativeai.protos import Part
 from google.generativeai.types import StopCandidateException
-import re
 import asyncio
 import json
-from pathlib import Path
-from PIL import Image
-from app.core.config import GEMINI_API_KEY, MODEL_PRO, MODEL_FLASH, SYSTEM_PROMPT_V7
-from app.models.schemas import ThinkingChunk, ThinkingDone, FinalAnswer, ErrorMessage, StatusUpdate
-from app.services.tool_executor import available_tools, tool_status_messages
+import time
+from app.core.config import SYSTEM_PROMPT_V7, STREAM_FINAL_ANSWER, MODEL_PRO, MODEL_FLASH, ADMISSION_STATUS_INTERVAL, LATENCY_BUDGET_MS, MAX_AGENT_STEPS
+from app.core.metrics import STAGE_SECONDS, REQUESTS_TOTAL
+from app.models.schemas import GeneratedImage
+from app.services import request_router, context_packer, history_summarizer, admission, hedging, sse
+from app.services.model_registry import get_model
+from app.services.stream_sanitizer import StreamSanitizer
+from app.services.tool_calls import ToolCallDetector, ToolRunner, format_observations
 from app.db import history_manager
 
-genai.configure(api_key=GEMINI_API_KEY)
+async def _await_admission(ticket: admission.Ticket, model_name: str):
+    """Phát StatusUpdate vị trí trong hàng đợi cho tới khi vé được cấp slot gọi model."""
+    if ticket.admitted:
+        return
+    while True:
+        yield sse.status_update(f"⏳ Hệ thống đang bận, yêu cầu của bạn đang ở vị trí {ticket.position} trong hàng đợi `{model_name}`...")
+        if await ticket.wait(ADMISSION_STATUS_INTERVAL):
+            return
 
-def sanitize_and_format_for_html(text: str) -> str:
-    cleaned_text = text.replace('**', '').replace('###', '').replace('##', '').replace('#', '')
-    formatted_text = re.sub(r'`([^`]+)`', r'<code>\1</code>', cleaned_text)
-    return formatted_text
+async def _sanitized_text(response_stream, sanitizer: StreamSanitizer):
+    """Đọc stream của model, trả về từng đoạn văn bản đã làm sạch (kể cả phần còn giữ lại ở cuối)."""
+    async for chunk in response_stream:
+        if chunk.text:
+            text = sanitizer.feed(chunk.text)
+            if text:
+                yield text
+    text = sanitizer.flush()
+    if text:
+        yield text
+
+def _observe_stage(stage: str, started: float, model: str = "", route: str = ""):
+    STAGE_SECONDS.observe(time.perf_counter() - started, stage, model, route)
+
+def _observe_ttft(started: float, model: str, route: str, track: bool = True):
+    # Mọi lượt stream đều góp mẫu TTFT cho ngưỡng hedge (trừ lượt đã được hedging tự ghi)
+    if track:
+        hedging.ttft_tracker.record(model, time.perf_counter() - started)
+    _observe_stage("ttft", started, model, route)
 
 async def process_user_request(
     prompt: str,
@@ -24,19 +47,32 @@ async def process_user_request(
     image_bytes: bytes | None = None,
     file_content: str | None = None,
     filename: str | None = None,
-    mime_type: str | None = None
+    mime_type: str | None = None,
+    latency_budget_ms: int | None = None
 ):
-    retrieved_history = history_manager.get_history(session_id, limit=10)
+    # Hạn chót để model suy luận bắt đầu trả lời; None = không giới hạn
+    budget_ms = latency_budget_ms if latency_budget_ms is not None else LATENCY_BUDGET_MS
+    deadline = time.monotonic() + budget_ms / 1000 if budget_ms > 0 else None
+    request_started = time.perf_counter()
+
+    stage_started = time.perf_counter()
+    retrieved_history = await history_summarizer.build_history(session_id)
+    _observe_stage("history_read", stage_started)
     user_message = prompt
     if filename:
         user_message += f"\n(File đính kèm: {filename})"
-    history_manager.add_message(session_id, "user", user_message)
+    stage_started = time.perf_counter()
+    await history_manager.add_message_async(session_id, "user", user_message)
+    _observe_stage("history_write", stage_started)
 
     decision = ""
     if file_content or image_bytes:
         decision = "complex_reasoning"
     else:
-        router_model = genai.GenerativeModel(MODEL_FLASH)
+        decision = request_router.route_locally(prompt)
+
+    if not decision:
+        router_model = get_model("router")
         router_prompt = f"""
         Analyze the user's prompt and classify it into one of two categories:
         1. 'simple_answer': For general knowledge questions, greetings, or topics that do not require real-time information.
@@ -44,16 +80,33 @@ async def process_user_request(
         User Prompt: "{prompt}"
         Respond with ONLY 'simple_answer' or 'complex_reasoning'.
         """
+
+        async def _ask_router() -> str:
+            async with admission.slot(MODEL_FLASH):
+                router_response = await router_model.generate_content_async(
+                    router_prompt, request_options=hedging.UPSTREAM_REQUEST_OPTIONS
+                )
+            return router_response.text
+
+        stage_started = time.perf_counter()
         try:
-            router_response = await router_model.generate_content_async(router_prompt)
-            decision = router_response.text.strip()
+            decision = await request_router.route_with_model(prompt, _ask_router)
         except Exception:
             decision = "complex_reasoning"
+        _observe_stage("router", stage_started, MODEL_FLASH)
+    # Mọi kết quả khác simple_answer đều đi theo nhánh suy luận; chuẩn hoá để dùng làm nhãn số liệu
+    if decision != "simple_answer":
+        decision = "complex_reasoning"
 
     final_model_answer = ""
+    # Các vé admission đang giữ; release() an toàn khi gọi lặp lại nên có thể trả sớm sau mỗi lời gọi
+    held_tickets = []
+    # Các công cụ của vòng agent hiện tại chạy nền song song với stream; huỷ nếu request kết thúc giữa chừng
+    tool_runner = None
+    outcome = "cancelled"
     try:
         if decision == 'simple_answer':
-            simple_model = genai.GenerativeModel(MODEL_FLASH)
+            simple_model = get_model("simple")
             chat_session = simple_model.start_chat(history=retrieved_history)
             
             if not retrieved_history:
@@ -73,18 +126,27 @@ async def process_user_request(
                 """
                 simple_prompt = f"{persona_prefix}\n\nCâu hỏi tiếp theo của người dùng: \"{prompt}\""
 
-            response = await chat_session.send_message_async(simple_prompt)
+            ticket = admission.enqueue(MODEL_FLASH)
+            held_tickets.append(ticket)
+            async for event in _await_admission(ticket, MODEL_FLASH):
+                yield event
+            stage_started = time.perf_counter()
+            response = await chat_session.send_message_async(simple_prompt, request_options=hedging.UPSTREAM_REQUEST_OPTIONS)
+            ticket.release()
+            _observe_stage("answer", stage_started, MODEL_FLASH, decision)
+            yield sse.model_info(MODEL_FLASH)
             final_model_answer = response.text
-            final_answer_obj = FinalAnswer(content=final_model_answer)
-            yield f"data: {final_answer_obj.model_dump_json()}\n\n"
+            yield sse.final_answer(final_model_answer)
         
         else:
             full_thinking_process = []
+            # Kết quả công cụ dạng JSON, dùng cho bước tổng hợp câu trả lời
+            structured_observations = []
             
             if image_bytes and mime_type:
-                yield f"data: {StatusUpdate(content='👁️ Đang phân tích hình ảnh bằng `gemini-2.5-pro`...').model_dump_json()}\n\n"
+                yield sse.status_update('👁️ Đang phân tích hình ảnh bằng `gemini-2.5-pro`...')
                 
-                vision_model = genai.GenerativeModel(MODEL_PRO)
+                vision_model = get_model("vision")
                 
                 image_part = Part(inline_data={'mime_type': mime_type, 'data': image_bytes})
                 
@@ -94,73 +156,133 @@ async def process_user_request(
                 Yêu cầu của người dùng: "{prompt}"
                 """
 
-                response = await vision_model.generate_content_async([prompt_part, image_part], stream=True)
+                ticket = admission.enqueue(MODEL_PRO)
+                held_tickets.append(ticket)
+                async for event in _await_admission(ticket, MODEL_PRO):
+                    yield event
+                stage_started = time.perf_counter()
+                response = await vision_model.generate_content_async(
+                    [prompt_part, image_part], stream=True, request_options=hedging.UPSTREAM_REQUEST_OPTIONS
+                )
+                yield sse.model_info(MODEL_PRO)
                 
-                async for chunk in response:
-                    if chunk.text:
-                        sanitized_content = sanitize_and_format_for_html(chunk.text)
-                        yield f"data: {ThinkingChunk(content=sanitized_content).model_dump_json()}\n\n"
-                        full_thinking_process.append(sanitized_content)
+                async for sanitized_content in _sanitized_text(response, StreamSanitizer(html=True)):
+                    if not full_thinking_process:
+                        _observe_ttft(stage_started, MODEL_PRO, decision)
+                    yield sse.thinking_chunk(sanitized_content)
+                    full_thinking_process.append(sanitized_content)
+                ticket.release()
+                _observe_stage("reasoning", stage_started, MODEL_PRO, decision)
 
             else:
-                model_pro = genai.GenerativeModel(MODEL_PRO)
-                chat_session = model_pro.start_chat(history=retrieved_history)
-                
                 prompt_for_thinking = f"{SYSTEM_PROMPT_V7}\n\n## USER REQUEST ##\n{prompt}"
                 if file_content:
+                    # Tài liệu lớn chỉ gửi dàn ý + các đoạn liên quan nhất, trong giới hạn token
+                    file_content = await asyncio.to_thread(context_packer.pack_document, file_content, prompt)
                     prompt_for_thinking += f"\n\n## ATTACHED FILE CONTENT: `{filename}` ##\n---\n{file_content}\n---"
                 
-                response_stream = await chat_session.send_message_async(prompt_for_thinking, stream=True)
-                
-                current_chunk_buffer = ""
-                async for chunk in response_stream:
-                    if not chunk.text: continue
-                    
-                    sanitized_content = chunk.text.replace('**', '').replace('###', '').replace('##', '').replace('#', '')
-                    yield f"data: {ThinkingChunk(content=sanitized_content).model_dump_json()}\n\n"
-                    current_chunk_buffer += sanitized_content
-                
-                full_thinking_process.append(current_chunk_buffer)
-                final_thinking_text_pass1 = current_chunk_buffer
+                stage_started = time.perf_counter()
+                # Lượt đầu qua hedging đã được ghi TTFT (không tính thời gian chờ admission)
+                track_ttft = deadline is None
+                if deadline is not None:
+                    # Đua Pro (kèm hedge) với Flash dự phòng; phiên thắng được giữ cho lượt sau công cụ
+                    started = await hedging.hedged_reasoning_stream(retrieved_history, prompt_for_thinking, deadline)
+                    ticket = started.ticket
+                    held_tickets.append(ticket)
+                    chat_session = started.chat_session
+                    reasoning_model = started.model_name
+                    response_stream = started.chunks()
+                    model_info = sse.model_info(started.model_name, hedged=started.hedged, fallback=started.fallback)
+                else:
+                    chat_session = get_model("pro").start_chat(history=retrieved_history)
+                    ticket = admission.enqueue(MODEL_PRO)
+                    held_tickets.append(ticket)
+                    async for event in _await_admission(ticket, MODEL_PRO):
+                        yield event
+                    stage_started = time.perf_counter()
+                    response_stream = await chat_session.send_message_async(
+                        prompt_for_thinking, stream=True, request_options=hedging.UPSTREAM_REQUEST_OPTIONS
+                    )
+                    reasoning_model = MODEL_PRO
+                    model_info = sse.model_info(MODEL_PRO)
+                yield model_info
                 
-                tool_call_match = re.search(r'\[CallTool: (\w+)\(query="((?:[^"\\]|\\.)*)"\)\]', final_thinking_text_pass1)
-
-                if tool_call_match:
-                    tool_name = tool_call_match.group(1)
-                    tool_query = tool_call_match.group(2)
-                    
-                    if tool_name in available_tools:
-                        status_message = tool_status_messages.get(tool_name, f"⚙️ Đang thực thi công cụ {tool_name}...")
-                        yield f"data: {StatusUpdate(content=status_message).model_dump_json()}\n\n"
-
-                        tool_function = available_tools[tool_name]
-                        tool_result = await tool_function(tool_query)
-                        
-                        observation_prompt = f"Observation: {tool_result}"
+                # Vòng agent: mỗi bước gom mọi CallTool của model, chạy song song, rồi gửi lại toàn bộ Observation
+                agent_step = 0
+                while True:
+                    detector = ToolCallDetector()
+                    tool_runner = ToolRunner()
+                    step_parts = []
+                    async for sanitized_content in _sanitized_text(response_stream, StreamSanitizer()):
+                        if not step_parts:
+                            _observe_ttft(stage_started, reasoning_model, decision, track=track_ttft)
+                        yield sse.thinking_chunk(sanitized_content)
+                        step_parts.append(sanitized_content)
+
+                        # Chạy công cụ ngay khi chỉ thị CallTool hoàn chỉnh, không chờ hết stream
+                        if agent_step < MAX_AGENT_STEPS:
+                            for tool_name, tool_query in detector.feed(sanitized_content):
+                                status_message = tool_runner.start(tool_name, tool_query)
+                                if status_message:
+                                    yield sse.status_update(status_message)
+                    ticket.release()
+                    _observe_stage("reasoning", stage_started, reasoning_model, decision)
+                    full_thinking_process.append("".join(step_parts))
+
+                    if not tool_runner.calls:
+                        break
+                    # Chỉ phần thời gian công cụ còn chạy sau khi stream đã xong mới nằm trên đường găng
+                    stage_started = time.perf_counter()
+                    tool_results = await tool_runner.results()
+                    _observe_stage("tools", stage_started, "", decision)
+                    agent_step += 1
+                    for tool_name, tool_query, tool_result in tool_results:
                         full_thinking_process.append(f"\n[Observation from {tool_name}: Received structured data]\n{tool_result}\n")
-                        
-                        follow_up_stream = await chat_session.send_message_async(observation_prompt, stream=True)
-                        async for follow_up_chunk in follow_up_stream:
-                            if follow_up_chunk.text:
-                                sanitized_content_after_tool = follow_up_chunk.text.replace('**', '').replace('###', '').replace('##', '').replace('#', '')
-                                yield f"data: {ThinkingChunk(content=sanitized_content_after_tool).model_dump_json()}\n\n"
-                                full_thinking_process.append(sanitized_content_after_tool)
+                        if tool_name == "generate_image":
+                            # Ảnh nằm trong kho blob; client tải qua URL thay vì nhận base64 trong stream.
+                            # Kết quả ảnh không phải dữ liệu cần trình bày nên câu trả lời vẫn theo suy luận
+                            try:
+                                image = json.loads(tool_result)
+                            except json.JSONDecodeError:
+                                image = None
+                            image_url = image.get("image_url") if isinstance(image, dict) else None
+                            if isinstance(image_url, str) and image_url:
+                                yield sse.encode(GeneratedImage(url=image_url, alt_text=tool_query))
+                        elif tool_result.lstrip().startswith(("{", "[")):
+                            structured_observations.append(tool_result.strip())
+
+                    ticket = admission.enqueue(reasoning_model)
+                    held_tickets.append(ticket)
+                    async for event in _await_admission(ticket, reasoning_model):
+                        yield event
+                    stage_started = time.perf_counter()
+                    track_ttft = True
+                    response_stream = await chat_session.send_message_async(
+                        format_observations(tool_results), stream=True, request_options=hedging.UPSTREAM_REQUEST_OPTIONS
+                    )
             
-            yield f"data: {ThinkingDone().model_dump_json()}\n\n"
+            yield sse.THINKING_DONE
             
-            synthesizer_model = genai.GenerativeModel(MODEL_FLASH)
+            synthesizer_model = get_model("synthesizer")
             final_thinking_text = "".join(full_thinking_process)
             
             prompt_for_synthesis = ""
-            observation_match = re.search(r"\[Observation from \w+: Received structured data\]\n(\{.*\}|\[.*\])", final_thinking_text, re.DOTALL)
             
-            if observation_match:
-                observation_data_raw = observation_match.group(1).strip()
+            if len(structured_observations) == 1:
+                observation_data_raw = structured_observations[0]
                 prompt_for_synthesis = f"""
                 Nhiệm vụ của bạn là một chuyên gia trình bày dữ liệu. Dựa vào dữ liệu JSON thô sau, hãy định dạng thành danh sách rõ ràng cho người dùng, tuân thủ các quy tắc đã biết.
                 Dữ liệu JSON thô: --- {observation_data_raw} ---
                 Soạn thảo câu trả lời cuối cùng:
                 """
+            elif structured_observations:
+                observation_data_raw = "\n---\n".join(structured_observations)
+                prompt_for_synthesis = f"""
+                Nhiệm vụ của bạn là một chuyên gia trình bày dữ liệu. Dựa vào các khối dữ liệu JSON thô sau (mỗi khối là kết quả của một lần tra cứu), hãy tổng hợp và định dạng thành câu trả lời rõ ràng cho người dùng, so sánh hoặc đối chiếu các đối tượng nếu người dùng yêu cầu, tuân thủ các quy tắc đã biết.
+                Yêu cầu của người dùng: "{prompt}"
+                Dữ liệu JSON thô: --- {observation_data_raw} ---
+                Soạn thảo câu trả lời cuối cùng:
+                """
             else:
                 raw_answer = final_thinking_text.split("</thinking>")[-1].strip()
                 if not raw_answer: 
@@ -181,17 +303,57 @@ async def process_user_request(
                     Soạn thảo câu trả lời cuối cùng đã được hoàn thiện:
                     """
             
-            synthesis_response = await synthesizer_model.generate_content_async(prompt_for_synthesis)
-            final_model_answer = synthesis_response.text
-            final_answer_obj = FinalAnswer(content=final_model_answer)
-            yield f"data: {final_answer_obj.model_dump_json()}\n\n"
+            ticket = admission.enqueue(MODEL_FLASH)
+            held_tickets.append(ticket)
+            async for event in _await_admission(ticket, MODEL_FLASH):
+                yield event
+            stage_started = time.perf_counter()
+            if STREAM_FINAL_ANSWER:
+                # Gửi dần từng phần câu trả lời; gói final_answer cuối cùng vẫn chứa toàn văn
+                synthesis_stream = await synthesizer_model.generate_content_async(
+                    prompt_for_synthesis, stream=True, request_options=hedging.UPSTREAM_REQUEST_OPTIONS
+                )
+                answer_parts = []
+                first_chunk = True
+                async for synthesis_chunk in synthesis_stream:
+                    if first_chunk:
+                        first_chunk = False
+                        _observe_ttft(stage_started, MODEL_FLASH, decision)
+                    if synthesis_chunk.text:
+                        answer_parts.append(synthesis_chunk.text)
+                        yield sse.final_answer_chunk(synthesis_chunk.text)
+                final_model_answer = "".join(answer_parts)
+            else:
+                synthesis_response = await synthesizer_model.generate_content_async(
+                    prompt_for_synthesis, request_options=hedging.UPSTREAM_REQUEST_OPTIONS
+                )
+                final_model_answer = synthesis_response.text
+            ticket.release()
+            _observe_stage("synthesis", stage_started, MODEL_FLASH, decision)
+            yield sse.final_answer(final_model_answer)
+        outcome = "ok"
 
     except StopCandidateException as e:
-        error_message = ErrorMessage(content="Yêu cầu của bạn có thể chứa nội dung không phù hợp hoặc nhạy cảm. Vui lòng thử lại với một câu hỏi khác.")
-        yield f"data: {error_message.model_dump_json()}\n\n"
+        outcome = "blocked"
+        yield sse.error("Yêu cầu của bạn có thể chứa nội dung không phù hợp hoặc nhạy cảm. Vui lòng thử lại với một câu hỏi khác.")
+    except hedging.LatencyBudgetExceeded:
+        outcome = "deadline"
+        yield sse.error("Mô hình phản hồi quá chậm so với thời gian cho phép, vui lòng thử lại.")
+    except admission.AdmissionRejected:
+        outcome = "rejected"
+        yield sse.error("Hệ thống đang quá tải, vui lòng thử lại sau ít phút.")
     except Exception as e:
-        error_message = ErrorMessage(content=f"Đã xảy ra một lỗi nội bộ: {str(e)}")
-        yield f"data: {error_message.model_dump_json()}\n\n"
+        outcome = "error"
+        yield sse.error(f"Đã xảy ra một lỗi nội bộ: {str(e)}")
+    finally:
+        if tool_runner is not None:
+            tool_runner.cancel()
+        for ticket in held_tickets:
+            ticket.release()
+        REQUESTS_TOTAL.inc(decision, outcome)
+        _observe_stage("total", request_started, "", decision)
 
     if final_model_answer:
-        history_manager.add_message(session_id, "model", final_model_answer)
\ No newline at end of file
+        stage_started = time.perf_counter()
+        await history_manager.add_message_async(session_id, "model", final_model_answer)
+        _observe_stage("history_write", stage_started)
\ No newline at end of file
@@ -0,0 +1,174 @@
+import asyncio
+import math
+import time
+from collections import defaultdict, deque
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable
+from app.core.config import (
+    MODEL_PRO, MODEL_FLASH, ADMISSION_MAX_WAIT,
+    HEDGE_ENABLED, HEDGE_PERCENTILE, HEDGE_DEFAULT_DELAY, HEDGE_MIN_SAMPLES, HEDGE_TTFT_WINDOW,
+    LATENCY_FALLBACK_FRACTION, UPSTREAM_STREAM_TIMEOUT,
+)
+from app.services import admission
+from app.services.model_registry import get_model
+
+
+class LatencyBudgetExceeded(Exception):
+    """Không model nào bắt đầu trả lời trong ngân sách thời gian của request."""
+
+
+class TTFTTracker:
+    """Lưu các mẫu time-to-first-token gần nhất theo model để tính ngưỡng hedge theo phân vị."""
+
+    def __init__(self, window: int):
+        self._samples: dict[str, deque] = defaultdict(lambda: deque(maxlen=window))
+
+    def record(self, model_name: str, seconds: float):
+        self._samples[model_name].append(seconds)
+
+    def percentile(self, model_name: str, p: float) -> float | None:
+        samples = self._samples.get(model_name)
+        if not samples or len(samples) < HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, math.ceil(p / 100 * len(ordered)) - 1)]
+
+    def stats(self) -> dict:
+        return {
+            model: {"samples": len(samples), "p50": self.percentile(model, 50), "p95": self.percentile(model, 95)}
+            for model, samples in self._samples.items()
+        }
+
+
+ttft_tracker = TTFTTracker(HEDGE_TTFT_WINDOW)
+# Hạn chót cho mọi lời gọi Gemini (với stream: toàn bộ lượt stream)
+UPSTREAM_REQUEST_OPTIONS = {"timeout": UPSTREAM_STREAM_TIMEOUT}
+
+
+@dataclass
+class StartedStream:
+    """Một lượt stream đã nhận được chunk đầu tiên."""
+    model_name: str
+    chat_session: Any
+    first_chunk: Any
+    rest: Any
+    ticket: admission.Ticket
+    hedged: bool = False
+    fallback: bool = False
+
+    async def chunks(self):
+        yield self.first_chunk
+        async for chunk in self.rest:
+            yield chunk
+
+    async def close(self):
+        """Đóng stream không dùng tới (lượt thua trong cuộc đua) và trả slot admission."""
+        self.ticket.release()
+        aclose = getattr(self.rest, "aclose", None)
+        if aclose is not None:
+            try:
+                await aclose()
+            except Exception as e:
+                print(f"Lỗi khi đóng stream {self.model_name}: {e}")
+
+
+async def open_chat_stream(role: str, model_name: str, history: list, message: str, **flags) -> StartedStream:
+    """Mở chat stream và chờ tới chunk đầu tiên (giữ slot admission cho tới khi stream kết thúc)."""
+    ticket = admission.enqueue(model_name)
+    try:
+        while not await ticket.wait(ADMISSION_MAX_WAIT):
+            pass
+        started_at = time.monotonic()
+        chat_session = get_model(role).start_chat(history=history)
+        response = await chat_session.send_message_async(
+            message, stream=True, request_options=UPSTREAM_REQUEST_OPTIONS
+        )
+        rest = response.__aiter__()
+        try:
+            first_chunk = await rest.__anext__()
+        except StopAsyncIteration:
+            raise RuntimeError(f"{model_name} trả về stream rỗng.")
+        ttft_tracker.record(model_name, time.monotonic() - started_at)
+        return StartedStream(model_name, chat_session, first_chunk, rest, ticket, **flags)
+    except BaseException:
+        ticket.release()
+        raise
+
+
+async def race_first_chunk(
+    attempts: list[tuple[float, Callable[[], Awaitable[StartedStream]]]],
+    deadline: float,
+) -> StartedStream:
+    """
+    Chạy các lượt thử theo lịch (độ trễ bắt đầu tính từ lúc gọi), trả về lượt đầu tiên có chunk đầu tiên
+    và huỷ các lượt còn lại. Lượt thử lỗi sẽ kéo lượt kế tiếp chạy ngay. Hết `deadline` thì ném
+    LatencyBudgetExceeded.
+    """
+    start = time.monotonic()
+    pending_attempts = sorted(attempts, key=lambda item: item[0])
+    running: set[asyncio.Task] = set()
+    last_error: BaseException | None = None
+    try:
+        while True:
+            now = time.monotonic()
+            while pending_attempts and (start + pending_attempts[0][0] <= now or not running):
+                _, launch = pending_attempts.pop(0)
+                running.add(asyncio.ensure_future(launch()))
+            if not running:
+                raise last_error or LatencyBudgetExceeded("Không có lượt thử nào.")
+
+            wake_at = deadline
+            if pending_attempts:
+                wake_at = min(wake_at, start + pending_attempts[0][0])
+            done, running = await asyncio.wait(
+                running, timeout=max(0.0, wake_at - time.monotonic()), return_when=asyncio.FIRST_COMPLETED
+            )
+            winner = None
+            for task in done:
+                if task.exception() is not None:
+                    last_error = task.exception()
+                elif winner is None:
+                    winner = task.result()
+                else:
+                    _close_in_background(task.result())
+            if winner is not None:
+                return winner
+            if time.monotonic() >= deadline:
+                raise LatencyBudgetExceeded("Không model nào bắt đầu trả lời trong ngân sách thời gian.")
+    finally:
+        for task in running:
+            task.cancel()
+            task.add_done_callback(_release_abandoned)
+
+
+_closing: set[asyncio.Task] = set()
+
+
+def _close_in_background(stream: StartedStream):
+    task = asyncio.ensure_future(stream.close())
+    _closing.add(task)
+    task.add_done_callback(_closing.discard)
+
+
+def _release_abandoned(task: asyncio.Task):
+    # Lượt thử bị huỷ sau khi đã có chunk đầu tiên: đóng stream và trả lại slot admission của nó
+    if not task.cancelled() and task.exception() is None:
+        _close_in_background(task.result())
+
+
+async def hedged_reasoning_stream(history: list, message: str, deadline: float) -> StartedStream:
+    """
+    Bắt đầu bước suy luận trong ngân sách thời gian:
+    - gọi MODEL_PRO ngay;
+    - nếu chưa có token đầu sau ngưỡng phân vị TTFT của Pro, gửi thêm một lượt Pro (hedge);
+    - nếu tới LATENCY_FALLBACK_FRACTION ngân sách Pro vẫn chưa bắt đầu, chạy song song MODEL_FLASH.
+    """
+    budget = max(0.0, deadline - time.monotonic())
+    fallback_after = budget * LATENCY_FALLBACK_FRACTION
+    hedge_after = ttft_tracker.percentile(MODEL_PRO, HEDGE_PERCENTILE) or HEDGE_DEFAULT_DELAY
+
+    attempts = [(0.0, lambda: open_chat_stream("pro", MODEL_PRO, history, message))]
+    if HEDGE_ENABLED and hedge_after < fallback_after:
+        attempts.append((hedge_after, lambda: open_chat_stream("pro", MODEL_PRO, history, message, hedged=True)))
+    attempts.append((fallback_after, lambda: open_chat_stream("reasoning_fallback", MODEL_FLASH, history, message, fallback=True)))
+    return await race_first_chunk(attempts, deadline)
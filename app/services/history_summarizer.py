@@ -0,0 +1,111 @@
+import asyncio
+from app.core.config import (
+    HISTORY_RECENT_TOKEN_BUDGET, HISTORY_SUMMARY_TRIGGER_TOKENS,
+    HISTORY_SUMMARY_MAX_TOKENS, HISTORY_FETCH_LIMIT, MODEL_FLASH
+)
+from app.db import history_manager
+from app.services.context_packer import estimate_tokens, CHARS_PER_TOKEN
+from app.services.model_registry import get_model
+from app.services import admission
+
+# Các phiên đang được tóm tắt trong worker này và tham chiếu tới task nền tương ứng
+_in_flight: dict[str, asyncio.Task] = {}
+
+
+def _truncate(text: str, max_tokens: int) -> str:
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars].rstrip() + " [...]"
+
+
+async def build_history(session_id: str) -> list:
+    """
+    Dựng lịch sử gửi cho `start_chat`: bản tóm tắt cuốn chiếu (nếu có) cộng một cửa sổ
+    tin nhắn gần nhất giới hạn theo token. Khi phần cũ chưa tóm tắt vượt ngưỡng,
+    một task nền sẽ gộp chúng vào bản tóm tắt cho các lượt sau.
+    """
+    summary, summarized_until = await history_manager.get_summary_async(session_id)
+    messages = await history_manager.get_messages_after_async(session_id, summarized_until, HISTORY_FETCH_LIMIT)
+
+    # Cửa sổ gần nhất: duyệt ngược từ tin mới nhất cho tới khi hết ngân sách token
+    window = []
+    used = 0
+    for message in reversed(messages):
+        cost = estimate_tokens(message["content"])
+        if window and used + cost > HISTORY_RECENT_TOKEN_BUDGET:
+            break
+        window.append(message)
+        used += cost
+    window.reverse()
+
+    older = messages[:len(messages) - len(window)]
+    older_tokens = sum(estimate_tokens(m["content"]) for m in older)
+    if older_tokens >= HISTORY_SUMMARY_TRIGGER_TOKENS:
+        _schedule_summary(session_id, summary, summarized_until, window[0]["id"])
+    else:
+        # Phần cũ còn nhỏ thì vẫn gửi kèm, tổng vẫn bị chặn bởi ngưỡng tóm tắt
+        window = older + window
+        if len(messages) >= HISTORY_FETCH_LIMIT:
+            # Có thể còn tin nhắn cũ hơn chưa được lấy về và chưa tóm tắt: gộp chúng vào bản tóm tắt
+            _schedule_summary(session_id, summary, summarized_until, window[0]["id"])
+
+    history = []
+    if summary:
+        history.append({"role": "user", "parts": [f"Tóm tắt các lượt trao đổi trước đó:\n{summary}"]})
+        history.append({"role": "model", "parts": ["Đã nắm được bối cảnh cuộc hội thoại."]})
+    budget = HISTORY_RECENT_TOKEN_BUDGET
+    for message in window:
+        history.append({"role": message["role"], "parts": [_truncate(message["content"], budget)]})
+    return history
+
+
+def _schedule_summary(session_id: str, summary: str, summarized_until: int, before_id: int):
+    if session_id in _in_flight:
+        return
+    task = asyncio.get_running_loop().create_task(_fold_into_summary(session_id, summary, summarized_until, before_id))
+    _in_flight[session_id] = task
+    task.add_done_callback(lambda _: _in_flight.pop(session_id, None))
+
+
+async def _fold_into_summary(session_id: str, summary: str, summarized_until: int, before_id: int):
+    """
+    Gộp lần lượt từng trang tin nhắn có `summarized_until` < id < `before_id` (cũ nhất trước) vào bản tóm tắt.
+    Mốc chỉ tiến tới tin nhắn cuối cùng thực sự đã được tóm tắt.
+    """
+    while True:
+        messages = await history_manager.get_messages_between_async(
+            session_id, summarized_until, before_id, HISTORY_FETCH_LIMIT
+        )
+        if not messages:
+            return
+        new_summary = await _summarize(summary, messages)
+        if new_summary is None:
+            return
+        until = messages[-1]["id"]
+        if not await history_manager.set_summary_async(session_id, new_summary, until, summarized_until):
+            # Worker khác đã cập nhật bản tóm tắt trước
+            return
+        summary, summarized_until = new_summary, until
+
+
+async def _summarize(summary: str, messages: list) -> str | None:
+    transcript = "\n".join(
+        f"{'Người dùng' if m['role'] == 'user' else 'Trợ lý'}: {_truncate(m['content'], HISTORY_SUMMARY_MAX_TOKENS)}"
+        for m in messages
+    )
+    prompt = f"""
+    Bạn đang duy trì bản tóm tắt cuốn chiếu của một cuộc hội thoại.
+    Hãy cập nhật bản tóm tắt hiện có bằng các lượt trao đổi mới, giữ lại các dữ kiện quan trọng
+    (tên, mã số thuế, số liệu, quyết định, yêu cầu còn dang dở). Viết ngắn gọn, tối đa khoảng 250 từ, không dùng markdown.
+    Bản tóm tắt hiện có: --- {summary or "(chưa có)"} ---
+    Các lượt trao đổi mới: --- {transcript} ---
+    Bản tóm tắt đã cập nhật:
+    """
+    try:
+        async with admission.slot(MODEL_FLASH):
+            response = await get_model("summarizer").generate_content_async(prompt)
+        return _truncate(response.text.strip(), HISTORY_SUMMARY_MAX_TOKENS)
+    except Exception as e:
+        print(f"Lỗi khi tóm tắt lịch sử: {e}")
+        return None
@@ -0,0 +1,33 @@
+import httpx
+from app.core.config import (
+    HTTP_MAX_CONNECTIONS, HTTP_MAX_KEEPALIVE_CONNECTIONS, HTTP_KEEPALIVE_EXPIRY,
+    HTTP_CONNECT_TIMEOUT, HTTP_DEFAULT_TIMEOUT
+)
+
+# Client HTTP bất đồng bộ dùng chung cho toàn bộ worker.
+# httpx giữ pool kết nối keep-alive theo từng host (origin), nên các lần gọi
+# tới cùng một API sẽ tái sử dụng kết nối TCP/TLS thay vì bắt tay lại.
+_client: httpx.AsyncClient | None = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Trả về client dùng chung, khởi tạo lười ở lần gọi đầu tiên."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(HTTP_DEFAULT_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+        )
+    return _client
+
+
+async def close_http_client():
+    """Đóng client và toàn bộ kết nối trong pool (gọi khi ứng dụng tắt)."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
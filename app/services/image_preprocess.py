@@ -0,0 +1,147 @@
+import asyncio
+import hashlib
+import importlib.util
+import io
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
+from app.core.config import (
+    IMAGE_MAX_EDGE, IMAGE_OUTPUT_FORMAT, IMAGE_OUTPUT_QUALITY, IMAGE_PASSTHROUGH_MAX_BYTES,
+    IMAGE_WORKERS, IMAGE_CACHE_MAX_ENTRIES,
+)
+
+# Pillow được import ở lần xử lý ảnh đầu tiên, không làm chậm khởi động.
+# pillow-heif là tuỳ chọn: không có thì ảnh HEIC/HEIF được gửi nguyên bản (Gemini vẫn đọc được)
+HEIF_SUPPORTED = importlib.util.find_spec("pillow_heif") is not None
+_heif_registered = False
+
+_OUTPUT_MIME = {"JPEG": "image/jpeg", "WEBP": "image/webp", "PNG": "image/png"}
+# Định dạng model nhận trực tiếp, được giữ nguyên nếu ảnh đã đủ nhỏ
+_PASSTHROUGH_MIME = {"image/jpeg", "image/png", "image/webp"}
+_HEIF_BRANDS = (b"heic", b"heix", b"hevc", b"hevx", b"heim", b"heis", b"mif1", b"msf1", b"heif")
+
+
+class PreparedImage(NamedTuple):
+    data: bytes
+    mime_type: str
+
+
+def sniff_mime_type(data: bytes) -> str | None:
+    """Nhận diện định dạng ảnh theo magic bytes, không tin vào tên file hay Content-Type."""
+    if data.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if data.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    if data.startswith((b"GIF87a", b"GIF89a")):
+        return "image/gif"
+    if data[4:8] == b"ftyp" and data[8:12] in _HEIF_BRANDS:
+        return "image/heic" if data[8:12].startswith(b"he") else "image/heif"
+    if data.startswith(b"BM"):
+        return "image/bmp"
+    if data.startswith((b"II*\x00", b"MM\x00*")):
+        return "image/tiff"
+    return None
+
+
+def _register_heif_opener():
+    global _heif_registered
+    if HEIF_SUPPORTED and not _heif_registered:
+        import pillow_heif
+        pillow_heif.register_heif_opener()
+        _heif_registered = True
+
+
+def _needs_transpose(img) -> bool:
+    return img.getexif().get(0x0112, 1) != 1
+
+
+def _prepare_sync(data: bytes, max_edge: int, original_mime: str | None = None) -> PreparedImage:
+    mime_type = sniff_mime_type(data)
+    if mime_type is None or (mime_type in ("image/heic", "image/heif") and not HEIF_SUPPORTED):
+        return PreparedImage(data, mime_type or original_mime)
+
+    from PIL import UnidentifiedImageError
+    try:
+        return _transcode(data, mime_type, max_edge)
+    except (UnidentifiedImageError, OSError) as e:
+        # Pillow không giải mã được: gửi nguyên bản như trước đây, để model tự xử lý
+        print(f"Không thể xử lý ảnh, gửi nguyên bản: {e}")
+        return PreparedImage(data, mime_type)
+
+
+def _transcode(data: bytes, mime_type: str, max_edge: int) -> PreparedImage:
+    from PIL import Image, ImageOps
+    _register_heif_opener()
+    img = Image.open(io.BytesIO(data))
+    if (
+        mime_type in _PASSTHROUGH_MIME
+        and len(data) <= IMAGE_PASSTHROUGH_MAX_BYTES
+        and max(img.size) <= max_edge
+        and not _needs_transpose(img)
+    ):
+        return PreparedImage(data, mime_type)
+
+    # Với JPEG, giải mã thẳng ở độ phân giải thấp hơn khi có thể (nhanh hơn nhiều so với giải mã đầy đủ rồi thu nhỏ)
+    img.draft("RGB", (max_edge, max_edge))
+    img = ImageOps.exif_transpose(img)
+    img.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+
+    output_format = IMAGE_OUTPUT_FORMAT
+    has_alpha = img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info)
+    if has_alpha and output_format == "JPEG":
+        # JPEG không có kênh alpha: ghép lên nền trắng
+        rgba = img.convert("RGBA")
+        img = Image.new("RGB", rgba.size, (255, 255, 255))
+        img.paste(rgba, mask=rgba.getchannel("A"))
+    elif has_alpha:
+        img = img.convert("RGBA")
+    elif img.mode != "RGB":
+        img = img.convert("RGB")
+
+    out = io.BytesIO()
+    if output_format == "PNG":
+        img.save(out, format="PNG", optimize=True)
+    else:
+        img.save(out, format=output_format, quality=IMAGE_OUTPUT_QUALITY)
+    return PreparedImage(out.getvalue(), _OUTPUT_MIME[output_format])
+
+
+_image_executor: ThreadPoolExecutor | None = None
+_cache: OrderedDict[tuple[str, int], PreparedImage] = OrderedDict()
+
+
+def _get_image_executor() -> ThreadPoolExecutor:
+    global _image_executor
+    if _image_executor is None:
+        _image_executor = ThreadPoolExecutor(max_workers=IMAGE_WORKERS, thread_name_prefix="image-prep")
+    return _image_executor
+
+
+def shutdown_image_executor():
+    global _image_executor
+    if _image_executor is not None:
+        _image_executor.shutdown(wait=False, cancel_futures=True)
+        _image_executor = None
+
+
+async def prepare_image(data: bytes, max_edge: int = IMAGE_MAX_EDGE, mime_type: str | None = None) -> PreparedImage:
+    """
+    Chuẩn hoá ảnh trước khi gửi cho model: nhận diện định dạng thật, xoay theo EXIF, đổi hệ màu,
+    thu nhỏ về cạnh dài tối đa `max_edge` và nén lại. Kết quả được cache theo SHA-256 của nội dung.
+    Ảnh không nhận diện/giải mã được được trả về nguyên bản (kèm `mime_type` của client nếu cần).
+    """
+    loop = asyncio.get_running_loop()
+    digest = await loop.run_in_executor(_get_image_executor(), lambda: hashlib.sha256(data).hexdigest())
+    key = (digest, max_edge)
+    cached = _cache.get(key)
+    if cached is not None:
+        _cache.move_to_end(key)
+        return cached
+
+    prepared = await loop.run_in_executor(_get_image_executor(), _prepare_sync, data, max_edge, mime_type)
+    _cache[key] = prepared
+    while len(_cache) > IMAGE_CACHE_MAX_ENTRIES:
+        _cache.popitem(last=False)
+    return prepared
@@ -0,0 +1,48 @@
+import asyncio
+import importlib
+import time
+from app.core.config import IMPORT_WARMUP, IMPORT_WARMUP_DELAY
+
+# Các thư viện chỉ cần khi xử lý file/ảnh; được import trễ trong file_parser và image_preprocess
+HEAVY_MODULES = (
+    "pypdf",
+    "docx",
+    "pptx",
+    "openpyxl",
+    "pandas",
+    "PIL.Image",
+    "PIL.ImageOps",
+)
+
+
+def import_heavy_modules() -> dict[str, float]:
+    """Import toàn bộ HEAVY_MODULES, trả về thời gian (giây) của từng module."""
+    timings = {}
+    for name in HEAVY_MODULES:
+        start = time.perf_counter()
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            print(f"Không thể import trước {name}: {e}")
+            continue
+        timings[name] = time.perf_counter() - start
+    return timings
+
+
+async def _warm_imports_later():
+    # Chờ server mở socket và phục vụ các request đầu tiên rồi mới import dưới nền
+    await asyncio.sleep(IMPORT_WARMUP_DELAY)
+    try:
+        await asyncio.to_thread(import_heavy_modules)
+    except Exception as e:
+        print(f"Lỗi khi import trước thư viện: {e}")
+
+
+_warmup_task: asyncio.Task | None = None
+
+
+def start_import_warmup():
+    """Lên lịch import nền các thư viện nặng để request có file đầu tiên không phải chờ."""
+    global _warmup_task
+    if IMPORT_WARMUP:
+        _warmup_task = asyncio.get_running_loop().create_task(_warm_imports_later())
@@ -0,0 +1,65 @@
+import asyncio
+import google.generativeai as genai
+from app.core.config import GEMINI_API_KEY, MODEL_PRO, MODEL_FLASH, MODEL_LIVE, MODEL_NANO_BANANA, MODEL_WARMUP
+
+genai.configure(api_key=GEMINI_API_KEY)
+
+# Cấu hình của từng "vai trò" model trong pipeline.
+# Mỗi vai trò được khởi tạo đúng một lần cho mỗi process và dùng lại giữa các request,
+# nhờ đó client/channel gRPC bên dưới cũng được tái sử dụng.
+MODEL_SPECS = {
+    "router":      {"model_name": MODEL_FLASH, "generation_config": {"temperature": 0}},
+    "simple":      {"model_name": MODEL_FLASH},
+    "vision":      {"model_name": MODEL_PRO},
+    "pro":         {"model_name": MODEL_PRO},
+    "reasoning_fallback": {"model_name": MODEL_FLASH},
+    "synthesizer": {"model_name": MODEL_FLASH},
+    "summarizer":  {"model_name": MODEL_FLASH, "generation_config": {"temperature": 0.2}},
+    "live":        {"model_name": MODEL_LIVE},
+    "translator":  {"model_name": MODEL_FLASH, "generation_config": {"temperature": 0}},
+    "nano_banana": {"model_name": MODEL_NANO_BANANA},
+}
+
+_models: dict[str, genai.GenerativeModel] = {}
+
+
+def get_model(role: str) -> genai.GenerativeModel:
+    """Trả về GenerativeModel dùng chung cho vai trò `role` (tạo ở lần gọi đầu tiên)."""
+    model = _models.get(role)
+    if model is None:
+        spec = MODEL_SPECS.get(role)
+        if spec is None:
+            raise KeyError(f"Vai trò model không tồn tại: {role}")
+        model = genai.GenerativeModel(**spec)
+        _models[role] = model
+    return model
+
+
+async def warmup_models():
+    """
+    Khởi tạo trước toàn bộ model và mở sẵn kết nối tới API
+    (một lệnh count_tokens nhỏ cho mỗi model) để request đầu tiên không phải chờ.
+    """
+    for role in MODEL_SPECS:
+        get_model(role)
+    if not MODEL_WARMUP:
+        return
+
+    warmed = set()
+    for role, spec in MODEL_SPECS.items():
+        if spec["model_name"] in warmed:
+            continue
+        warmed.add(spec["model_name"])
+        try:
+            await _models[role].count_tokens_async("ping")
+        except Exception as e:
+            print(f"Không thể làm nóng model {spec['model_name']}: {e}")
+
+
+_warmup_task: asyncio.Task | None = None
+
+
+def start_warmup():
+    """Chạy warmup dưới nền để không chặn quá trình khởi động."""
+    global _warmup_task
+    _warmup_task = asyncio.get_running_loop().create_task(warmup_models())
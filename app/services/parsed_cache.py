@@ -0,0 +1,36 @@
+from typing import Callable
+from app.core.config import PARSED_CACHE_TTL, PARSED_CACHE_MAX_BYTES
+from app.db.shared_cache import Namespace
+from app.services.file_parser import ParsedText
+
+# Cache nội dung văn bản đã trích xuất, định danh theo SHA-256 của file và phiên bản parser.
+# Lưu trong cache dùng chung nên mọi gunicorn worker trên máy đều thấy, và cùng một file tải lên
+# đồng thời ở nhiều worker chỉ được phân tích một lần.
+_cache = Namespace("parsed", PARSED_CACHE_TTL, PARSED_CACHE_MAX_BYTES)
+
+
+def make_key(digest: str, extension: str, parser_version: str) -> str:
+    return f"{digest}{extension.lower()}.v{parser_version}"
+
+
+def get(key: str) -> str | None:
+    return _cache.get(key)
+
+
+def put(key: str, text: str):
+    _cache.put(key, text)
+
+
+def get_or_parse(key: str, parse: Callable[[], ParsedText], lease_ttl: float) -> str:
+    """
+    Trả về nội dung trong cache hoặc gọi `parse()`. Kết quả không đầy đủ (lỗi, quá thời gian phân tích)
+    không được lưu, để lần tải lên sau được phân tích lại.
+    """
+    result = None
+
+    def _parse() -> str:
+        nonlocal result
+        result = parse()
+        return result.text
+
+    return _cache.get_or_compute(key, _parse, cacheable=lambda _: result.complete, lease_ttl=lease_ttl)
@@ -0,0 +1,172 @@
+import re
+import math
+from collections import OrderedDict, Counter
+from typing import Awaitable, Callable
+from app.core.config import (
+    ROUTER_CACHE_SIZE, ROUTER_MODEL_MIN_CONFIDENCE, ROUTER_MODEL_MAX_WORDS,
+    ROUTER_SHARED_CACHE_TTL, ROUTER_SHARED_CACHE_MAX_BYTES,
+)
+from app.db.shared_cache import Namespace
+from app.services.text_utils import WORD_PATTERN, strip_accents, normalize_text
+
+SIMPLE = "simple_answer"
+COMPLEX = "complex_reasoning"
+ROUTES = (SIMPLE, COMPLEX)
+
+# --- Luật nhận diện nhanh (áp dụng trên văn bản đã bỏ dấu, chữ thường) ---
+TAX_CODE_PATTERN = re.compile(r"(?<!\d)\d{10}(?:-\d{3})?(?!\d)|(?<!\d)\d{13}(?!\d)")
+SEARCH_INTENT_PATTERN = re.compile(
+    r"\b(tim kiem|tim|tra cuu|search|google|ma so thue|mst|tin tuc|gia ca|gia vang|ty gia|thoi tiet|"
+    r"cong ty|doanh nghiep|dia chi|nguoi dai dien|ve anh|tao anh|ve hinh|tao hinh|news|price)\b"
+)
+# Từ chỉ thời điểm chỉ coi là cần tìm kiếm khi không phải câu hỏi thăm ("hôm nay bạn thế nào")
+FRESHNESS_PATTERN = re.compile(r"\b(hom nay|moi nhat|hien nay|bay gio|latest)\b")
+SMALLTALK_PATTERN = re.compile(r"\b(ban (co )?(the nao|khoe khong|on khong)|how are you)\b")
+# Toàn bộ prompt chỉ gồm lời chào/cảm ơn/xác nhận (có thể nối nhau, kèm dấu câu)
+GREETING_PATTERN = re.compile(
+    r"^(?:(?:xin chao|chao|hello|hi|hey|alo|good (?:morning|afternoon|evening)|cam on|thanks|thank you|"
+    r"tam biet|bye|ok|oke|okay|vang|da|uhm|hihi|haha|ban la ai|ban ten gi|ban khoe khong|"
+    r"ban|a|nhe|nha|nhieu)\b[\s!.,?~]*)+$"
+)
+CHITCHAT_MAX_WORDS = 6
+
+# --- Dữ liệu mẫu cho mô hình Naive Bayes nhỏ chạy trong process ---
+_SEED_SAMPLES = {
+    SIMPLE: [
+        "xin chao ban", "chao buoi sang", "ban la ai", "ban co the lam gi", "cam on ban nhieu",
+        "giai thich khai niem tri tue nhan tao", "dinh nghia machine learning la gi",
+        "viet mot bai tho ve mua thu", "dich cau nay sang tieng anh", "tom tat doan van sau",
+        "cong thuc tinh dien tich hinh tron", "lam sao de hoc lap trinh python",
+        "giai thich vong lap for", "ke mot cau chuyen cuoi", "goi y ten cho con meo",
+        "what is photosynthesis", "explain recursion", "write a short poem", "how are you",
+        "tell me a joke", "sua loi chinh ta cho doan van", "viet email xin nghi phep",
+        "hom nay ban the nao",
+    ],
+    COMPLEX: [
+        "tim thong tin cong ty", "tra cuu ma so thue", "tin tuc moi nhat hom nay",
+        "gia vang hom nay", "ty gia usd hom nay", "nguoi dai dien phap luat cua cong ty",
+        "dia chi tru so cong ty", "so sanh cac doanh nghiep", "thong tin ve san pham moi ra mat",
+        "ket qua tran dau toi qua", "thoi tiet ha noi ngay mai", "ve cho toi mot buc anh",
+        "tao anh con meo", "phan tich thi truong chung khoan", "bao cao tai chinh quy nay",
+        "latest news about", "current price of", "who is the ceo of", "search for company",
+        "danh sach cong ty tai", "su kien sap dien ra", "quy dinh moi nhat ve thue",
+    ],
+}
+
+def normalize_prompt(prompt: str) -> str:
+    return normalize_text(prompt)
+
+
+def _features(tokens: list[str]) -> list[str]:
+    return tokens + [f"{a}_{b}" for a, b in zip(tokens, tokens[1:])]
+
+
+class _NaiveBayes:
+    """Multinomial Naive Bayes (unigram + bigram) với làm mượt Laplace."""
+
+    def __init__(self, samples: dict[str, list[str]]):
+        self._counts: dict[str, Counter] = {}
+        self._totals: dict[str, int] = {}
+        vocab = set()
+        for label, texts in samples.items():
+            counter = Counter()
+            for text in texts:
+                counter.update(_features(WORD_PATTERN.findall(text)))
+            self._counts[label] = counter
+            self._totals[label] = sum(counter.values())
+            vocab.update(counter)
+        self._vocab_size = len(vocab)
+        total_docs = sum(len(texts) for texts in samples.values())
+        self._priors = {label: math.log(len(texts) / total_docs) for label, texts in samples.items()}
+
+    def predict(self, tokens: list[str]) -> tuple[str, float]:
+        scores = {}
+        for label, counter in self._counts.items():
+            denom = self._totals[label] + self._vocab_size
+            score = self._priors[label]
+            for feature in _features(tokens):
+                score += math.log((counter[feature] + 1) / denom)
+            scores[label] = score
+        best = max(scores, key=scores.get)
+        norm = sum(math.exp(s - scores[best]) for s in scores.values())
+        return best, 1.0 / norm
+
+
+_model = _NaiveBayes(_SEED_SAMPLES)
+_cache: OrderedDict[str, str] = OrderedDict()
+_stats: dict[str, Counter] = {route: Counter() for route in ROUTES}
+# Quyết định của model router được chia sẻ giữa các worker (các quyết định cục bộ tính lại rất rẻ)
+_shared = Namespace("router", ROUTER_SHARED_CACHE_TTL, ROUTER_SHARED_CACHE_MAX_BYTES)
+
+
+def _classify(normalized: str) -> tuple[str | None, str]:
+    text = strip_accents(normalized)
+    tokens = WORD_PATTERN.findall(text)
+
+    # Ý định tìm kiếm được xét trước lời chào: "dạ cho em hỏi giá vàng" vẫn phải tra cứu
+    if TAX_CODE_PATTERN.search(text) or SEARCH_INTENT_PATTERN.search(text):
+        return COMPLEX, "rule"
+    if FRESHNESS_PATTERN.search(text) and not SMALLTALK_PATTERN.search(text):
+        return COMPLEX, "rule"
+    if len(tokens) <= CHITCHAT_MAX_WORDS and GREETING_PATTERN.match(text):
+        return SIMPLE, "rule"
+
+    if tokens and len(tokens) <= ROUTER_MODEL_MAX_WORDS:
+        label, confidence = _model.predict(tokens)
+        if confidence >= ROUTER_MODEL_MIN_CONFIDENCE:
+            return label, "model"
+    return None, "miss"
+
+
+def _store(key: str, decision: str):
+    _cache[key] = decision
+    _cache.move_to_end(key)
+    while len(_cache) > ROUTER_CACHE_SIZE:
+        _cache.popitem(last=False)
+
+
+def route_locally(prompt: str) -> str | None:
+    """
+    Quyết định tuyến xử lý mà không cần gọi mạng.
+    Trả về 'simple_answer'/'complex_reasoning', hoặc None nếu cần hỏi model router.
+    """
+    key = normalize_prompt(prompt)
+    cached = _cache.get(key)
+    if cached is not None:
+        _cache.move_to_end(key)
+        _stats[cached]["cache"] += 1
+        return cached
+
+    decision, source = _classify(key)
+    if decision is not None:
+        _store(key, decision)
+        _stats[decision][source] += 1
+    return decision
+
+
+async def route_with_model(prompt: str, ask_model: Callable[[], Awaitable[str]]) -> str:
+    """
+    Hỏi model router (LLM) khi không quyết định được cục bộ và ghi nhớ kết quả cho các lần hỏi lặp lại.
+    Kết quả dùng chung giữa các worker: cùng một câu hỏi chỉ gọi model một lần trên toàn máy.
+    """
+    key = normalize_prompt(prompt)
+    asked = False
+
+    async def _ask() -> str:
+        nonlocal asked
+        asked = True
+        return (await ask_model()).strip()
+
+    decision = await _shared.get_or_compute_async(key, _ask, cacheable=lambda d: d in ROUTES)
+    if decision in ROUTES:
+        _store(key, decision)
+        _stats[decision]["llm" if asked else "shared"] += 1
+    return decision
+
+
+def get_router_stats() -> dict:
+    return {
+        "cache_size": len(_cache),
+        "cache_capacity": ROUTER_CACHE_SIZE,
+        "routes": {route: dict(counter) for route, counter in _stats.items()},
+    }
@@ -0,0 +1,98 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable
+from app.core.config import SEARCH_CACHE_TTL, SEARCH_CACHE_MAX_ENTRIES, SEARCH_SHARED_CACHE_MAX_BYTES, SERPER_TIMEOUT
+from app.db.shared_cache import Namespace
+from app.services.text_utils import normalize_text
+
+
+class TTLSingleFlightCache:
+    """
+    Cache kết quả có TTL và giới hạn số mục (loại bỏ theo LRU), kèm single-flight:
+    các lần tra cứu giống hệt nhau đang chạy đồng thời chỉ tạo một lời gọi upstream.
+    Nếu có `shared` (cache dùng chung giữa các worker), lần trượt cache trong process sẽ hỏi tiếp ở đó.
+    `ttl` <= 0 tắt việc lưu kết quả, chỉ còn gộp các lời gọi đang chạy.
+    """
+
+    def __init__(self, ttl: float, max_entries: int, shared: Namespace | None = None, lease_ttl: float = 30):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.shared = shared
+        self.lease_ttl = lease_ttl
+        self._entries: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self._in_flight: dict[str, asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def _get_fresh(self, key: str) -> str | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def _store(self, key: str, value: str):
+        if self.ttl <= 0:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get_or_fetch(
+        self,
+        query: str,
+        fetch: Callable[[str], Awaitable[str]],
+        cacheable: Callable[[str], bool] = lambda _: True,
+    ) -> str:
+        key = normalize_text(query)
+        value = self._get_fresh(key)
+        if value is not None:
+            self.hits += 1
+            return value
+
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            if self.shared is not None:
+                task = asyncio.ensure_future(
+                    self.shared.get_or_compute_async(key, lambda: fetch(query), cacheable, self.lease_ttl)
+                )
+            else:
+                task = asyncio.ensure_future(fetch(query))
+            self._in_flight[key] = task
+
+            def _on_done(t: asyncio.Task):
+                self._in_flight.pop(key, None)
+                if not t.cancelled() and t.exception() is None and cacheable(t.result()):
+                    self._store(key, t.result())
+
+            task.add_done_callback(_on_done)
+        # shield: một request bị huỷ (client ngắt kết nối) không huỷ lời gọi mà request khác đang chờ
+        return await asyncio.shield(task)
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "capacity": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "in_flight": len(self._in_flight),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+        }
+
+
+serper_cache = TTLSingleFlightCache(
+    SEARCH_CACHE_TTL, SEARCH_CACHE_MAX_ENTRIES,
+    shared=Namespace("serper", SEARCH_CACHE_TTL, SEARCH_SHARED_CACHE_MAX_BYTES),
+    lease_ttl=SERPER_TIMEOUT + 5,
+)
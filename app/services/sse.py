@@ -0,0 +1,113 @@
+import asyncio
+import contextlib
+import json
+from pydantic import BaseModel
+from app.core.config import SSE_COALESCE_WINDOW_MS, SSE_COALESCE_MAX_BYTES
+
+# Header cho response text/event-stream: không cache và tắt buffer của proxy (nginx, Render...)
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",
+}
+
+_dumps = json.JSONEncoder(ensure_ascii=False, separators=(",", ":")).encode
+
+
+class ThinkingFrame(str):
+    """Frame thinking_chunk đã mã hoá, giữ lại nội dung gốc để có thể gộp các frame liên tiếp."""
+    __slots__ = ("text",)
+
+    def __new__(cls, text: str):
+        frame = super().__new__(cls, 'data: {"type":"thinking_chunk","content":' + _dumps(text) + "}\n\n")
+        frame.text = text
+        return frame
+
+
+def _content_frame(event_type: str):
+    # Đường nhanh cho các event chỉ có type + content (cùng hình dạng với app/models/schemas.py)
+    prefix = 'data: {"type":"' + event_type + '","content":'
+
+    def encode(content: str) -> str:
+        return prefix + _dumps(content) + "}\n\n"
+    return encode
+
+
+thinking_chunk = ThinkingFrame
+status_update = _content_frame("status_update")
+final_answer_chunk = _content_frame("final_answer_chunk")
+final_answer = _content_frame("final_answer")
+error = _content_frame("error")
+THINKING_DONE = 'data: {"type":"thinking_done"}\n\n'
+
+
+def model_info(model: str, hedged: bool = False, fallback: bool = False) -> str:
+    return 'data: {"type":"model_info","model":' + _dumps(model) + ',"hedged":' + _dumps(hedged) + ',"fallback":' + _dumps(fallback) + "}\n\n"
+
+
+def encode(event: BaseModel) -> str:
+    """Mã hoá một event bất kỳ trong schemas qua pydantic (dùng cho các event ít gặp)."""
+    return f"data: {event.model_dump_json()}\n\n"
+
+
+async def coalesce(frames, window_ms: float = SSE_COALESCE_WINDOW_MS, max_bytes: int = SSE_COALESCE_MAX_BYTES):
+    """
+    Gộp các thinking_chunk liên tiếp thành một frame. Frame gộp được gửi khi đủ `max_bytes`,
+    khi đã chờ `window_ms` kể từ chunk đầu tiên trong nhóm, hoặc ngay trước một event khác.
+    Thứ tự các event được giữ nguyên; window_ms <= 0 thì chuyển tiếp nguyên trạng.
+    """
+    if window_ms <= 0:
+        async for frame in frames:
+            yield frame
+        return
+
+    loop = asyncio.get_running_loop()
+    window = window_ms / 1000
+    iterator = frames.__aiter__()
+    pending: list[str] = []
+    pending_bytes = 0
+    flush_at = None
+    next_task = None
+    try:
+        while True:
+            if next_task is None:
+                next_task = asyncio.ensure_future(iterator.__anext__())
+            if flush_at is not None:
+                done, _ = await asyncio.wait({next_task}, timeout=max(0.0, flush_at - loop.time()))
+                if not done:
+                    yield ThinkingFrame("".join(pending))
+                    pending, pending_bytes, flush_at = [], 0, None
+                    continue
+            else:
+                await asyncio.wait({next_task})
+
+            task, next_task = next_task, None
+            try:
+                frame = task.result()
+            except StopAsyncIteration:
+                break
+
+            if isinstance(frame, ThinkingFrame):
+                pending.append(frame.text)
+                pending_bytes += len(frame.text.encode())
+                if flush_at is None:
+                    flush_at = loop.time() + window
+                if pending_bytes >= max_bytes:
+                    yield ThinkingFrame("".join(pending))
+                    pending, pending_bytes, flush_at = [], 0, None
+                continue
+
+            if pending:
+                yield ThinkingFrame("".join(pending))
+                pending, pending_bytes, flush_at = [], 0, None
+            yield frame
+
+        if pending:
+            yield ThinkingFrame("".join(pending))
+    finally:
+        if next_task is not None:
+            next_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError, Exception):
+                await next_task
+        aclose = getattr(iterator, "aclose", None)
+        if aclose is not None:
+            await aclose()
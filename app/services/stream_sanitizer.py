@@ -0,0 +1,84 @@
+# Độ dài tối đa của một đoạn `code` được giữ lại chờ dấu ` đóng; quá ngưỡng thì trả ra nguyên văn
+MAX_CODE_SPAN_CHARS = 200
+
+
+class StreamSanitizer:
+    """
+    Bỏ ký hiệu markdown (`#`, `**`) khỏi một luồng văn bản theo từng chunk, giữ trạng thái giữa các chunk
+    nên `**` hay cặp dấu ` bị cắt ngang ranh giới chunk vẫn được xử lý đúng.
+    Với html=True, các đoạn `...` được bọc trong thẻ <code>.
+    Mỗi response dùng một đối tượng riêng: gọi feed() cho từng chunk và flush() khi stream kết thúc.
+    """
+
+    def __init__(self, html: bool = False, max_code_chars: int = MAX_CODE_SPAN_CHARS):
+        self._html = html
+        self._max_code_chars = max_code_chars
+        # Dấu * lẻ ở cuối chunk trước, có thể ghép với * đầu chunk sau thành **
+        self._pending_star = False
+        # Nội dung đoạn `code` đang mở (None = không ở trong đoạn code)
+        self._code: list[str] | None = None
+        self._code_len = 0
+
+    def _strip_markdown(self, text: str) -> str:
+        if self._pending_star:
+            text = "*" + text
+            self._pending_star = False
+        if "*" in text:
+            text = text.replace("**", "")
+            if text.endswith("*"):
+                # Một dãy * lẻ ở cuối: giữ lại dấu cuối cho tới khi biết ký tự kế tiếp
+                self._pending_star = True
+                text = text[:-1]
+        if "#" in text:
+            text = text.replace("#", "")
+        return text
+
+    def _write(self, out: list, text: str):
+        if self._code is None:
+            out.append(text)
+            return
+        self._code.append(text)
+        self._code_len += len(text)
+        if self._code_len > self._max_code_chars:
+            # Không chờ thêm: trả đoạn đã giữ ra nguyên văn
+            out.append("`" + "".join(self._code))
+            self._code = None
+
+    def _format_code(self, text: str) -> str:
+        if self._code is None and "`" not in text:
+            return text
+        out = []
+        pos = 0
+        while True:
+            tick = text.find("`", pos)
+            if tick < 0:
+                if pos < len(text):
+                    self._write(out, text[pos:])
+                return "".join(out)
+            if tick > pos:
+                self._write(out, text[pos:tick])
+            if self._code is None:
+                self._code = []
+                self._code_len = 0
+            elif not self._code_len:
+                # "``": dấu trước là ký tự thường, dấu này mở đoạn code mới
+                out.append("`")
+            else:
+                out.append("<code>" + "".join(self._code) + "</code>")
+                self._code = None
+            pos = tick + 1
+
+    def feed(self, text: str) -> str:
+        text = self._strip_markdown(text)
+        return self._format_code(text) if self._html else text
+
+    def flush(self) -> str:
+        text = "*" if self._pending_star else ""
+        self._pending_star = False
+        if not self._html:
+            return text
+        text = self._format_code(text)
+        if self._code is not None:
+            text += "`" + "".join(self._code)
+            self._code = None
+        return text
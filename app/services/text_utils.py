@@ -0,0 +1,20 @@
+import re
+import unicodedata
+
+WORD_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+def normalize_text(text: str) -> str:
+    """Chuẩn hoá để làm khoá cache: NFC, chữ thường, gộp khoảng trắng."""
+    return " ".join(unicodedata.normalize("NFC", text).lower().split())
+
+
+def strip_accents(text: str) -> str:
+    """Bỏ dấu tiếng Việt (kể cả đ/Đ) để so khớp không phân biệt dấu."""
+    decomposed = unicodedata.normalize("NFD", text.replace("đ", "d").replace("Đ", "D"))
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+def tokenize(text: str) -> list[str]:
+    """Tách từ đã chuẩn hoá: chữ thường, không dấu."""
+    return WORD_PATTERN.findall(strip_accents(text.lower()))
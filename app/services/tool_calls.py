@@ -0,0 +1,109 @@
+import asyncio
+import re
+import time
+from app.core.metrics import TOOL_SECONDS
+from app.core.config import AGENT_TOOL_CONCURRENCY, TOOL_TIMEOUT, TOOL_TIMEOUT_IMAGE
+from app.services.tool_executor import available_tools, tool_status_messages
+
+# Cú pháp gọi công cụ mà SYSTEM_PROMPT yêu cầu model sinh ra
+TOOL_CALL_PATTERN = re.compile(r'\[CallTool: (\w+)\(query="((?:[^"\\]|\\.)*)"\)\]')
+_MARKER = "[CallTool:"
+# Một chỉ thị dài hơn ngưỡng này mà vẫn chưa khớp thì coi như hỏng và bỏ qua
+MAX_DIRECTIVE_CHARS = 2000
+
+# Thời gian chờ tối đa cho từng công cụ (giây)
+TOOL_TIMEOUTS = {
+    "generate_image": TOOL_TIMEOUT_IMAGE,
+}
+
+
+class ToolCallDetector:
+    """
+    Nhận diện chỉ thị `[CallTool: name(query="...")]` ngay trên luồng stream.
+    Chỉ giữ lại phần đuôi chưa xử lý (từ dấu mở chỉ thị gần nhất), nên mỗi chunk chỉ quét phần văn bản mới.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+
+    def feed(self, text: str) -> list[tuple[str, str]]:
+        """Trả về các (tên công cụ, query) vừa hoàn chỉnh sau khi nhận thêm `text`."""
+        buffer = self._buffer + text
+        calls = []
+        while True:
+            match = TOOL_CALL_PATTERN.search(buffer)
+            if match is None:
+                break
+            calls.append((match.group(1), match.group(2)))
+            buffer = buffer[match.end():]
+
+        start = buffer.find(_MARKER)
+        while start >= 0 and len(buffer) - start > MAX_DIRECTIVE_CHARS:
+            start = buffer.find(_MARKER, start + 1)
+        if start >= 0:
+            self._buffer = buffer[start:]
+        else:
+            # Giữ lại phần có thể là đầu của dấu mở chỉ thị bị cắt giữa hai chunk
+            self._buffer = buffer[-(len(_MARKER) - 1):]
+        return calls
+
+
+class ToolRunner:
+    """
+    Chạy các công cụ được gọi trong một vòng của agent: mỗi lời gọi là một task riêng,
+    tối đa `concurrency` task chạy cùng lúc, mỗi task có thời gian chờ riêng.
+    Lời gọi trùng (cùng công cụ, cùng query) trong một vòng chỉ chạy một lần.
+    """
+
+    def __init__(self, concurrency: int = AGENT_TOOL_CONCURRENCY):
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._tasks: dict[tuple[str, str], asyncio.Task] = {}
+
+    @property
+    def calls(self) -> list[tuple[str, str]]:
+        return list(self._tasks)
+
+    def start(self, tool_name: str, query: str) -> str | None:
+        """Bắt đầu chạy nền một lời gọi; trả về thông báo trạng thái, hoặc None nếu bị bỏ qua."""
+        key = (tool_name, query)
+        if tool_name not in available_tools or key in self._tasks:
+            return None
+        self._tasks[key] = asyncio.create_task(self._run(tool_name, query))
+        return tool_status_messages.get(tool_name, f"⚙️ Đang thực thi công cụ {tool_name}...")
+
+    async def _run(self, tool_name: str, query: str) -> str:
+        timeout = TOOL_TIMEOUTS.get(tool_name, TOOL_TIMEOUT)
+        async with self._semaphore:
+            start = time.perf_counter()
+            outcome = "cancelled"
+            try:
+                result = await asyncio.wait_for(available_tools[tool_name](query), timeout)
+                # Các công cụ trả về chuỗi lỗi thay vì ném exception
+                outcome = "error" if result.startswith(("Error", "[Lỗi")) else "ok"
+                return result
+            except asyncio.TimeoutError:
+                outcome = "timeout"
+                return f"Error: tool {tool_name} timed out after {timeout:g} seconds."
+            except Exception as e:
+                outcome = "error"
+                return f"Error during {tool_name}: {str(e)}"
+            finally:
+                TOOL_SECONDS.observe(time.perf_counter() - start, tool_name, outcome)
+
+    async def results(self) -> list[tuple[str, str, str]]:
+        """Chờ mọi lời gọi xong, trả về (tên công cụ, query, kết quả) theo thứ tự model đã gọi."""
+        outputs = await asyncio.gather(*self._tasks.values())
+        return [(name, query, output) for (name, query), output in zip(self._tasks, outputs)]
+
+    def cancel(self):
+        for task in self._tasks.values():
+            task.cancel()
+
+
+def format_observations(results: list[tuple[str, str, str]]) -> str:
+    """Gộp kết quả các công cụ trong một vòng thành một thông điệp Observation gửi lại cho model."""
+    if len(results) == 1:
+        return f"Observation: {results[0][2]}"
+    return "\n\n".join(
+        f'Observation [{name}(query="{query}")]: {output}' for name, query, output in results
+    )
@@ -1,13 +1,30 @@
-import requests
+import asyncio
+import httpx
 import json
 import re
-import google.generativeai as genai
 import urllib.parse
-import base64
-from app.core.config import SERPER_API_KEY, MODEL_LIVE, MODEL_FLASH
+from app.core.config import SERPER_API_KEY, SERPER_URL, SERPER_TIMEOUT, IMAGE_API_URL, IMAGE_API_TIMEOUT, MODEL_LIVE, MODEL_FLASH
+from app.services.http_client import get_http_client
+from app.services.model_registry import get_model
+from app.services.search_cache import serper_cache
+from app.services import admission, blob_store
+from app.services.image_preprocess import sniff_mime_type
+from app.db import entity_index
 
 async def serper_search(query: str) -> str:
-    url = "https://google.serper.dev/search"
+    """
+    Tra cứu doanh nghiệp/web. Truy vấn chứa MST hoặc tên doanh nghiệp đã biết được trả lời
+    từ chỉ mục cục bộ; còn lại gọi Serper (có cache TTL và gộp các truy vấn trùng đang chạy).
+    """
+    indexed_entities = await entity_index.lookup_async(query)
+    if indexed_entities:
+        return json.dumps(indexed_entities, ensure_ascii=False, indent=2)
+    return await serper_cache.get_or_fetch(
+        query, _serper_search_uncached, cacheable=lambda result: not result.startswith("Error")
+    )
+
+async def _serper_search_uncached(query: str) -> str:
+    url = SERPER_URL
     payload = json.dumps({"q": query, "num": 10})
     headers = {
         'X-API-KEY': SERPER_API_KEY,
@@ -15,7 +32,7 @@ async def serper_search(query: str) -> str:
     }
     
     try:
-        response = requests.request("POST", url, headers=headers, data=payload, timeout=10)
+        response = await get_http_client().post(url, headers=headers, content=payload, timeout=SERPER_TIMEOUT)
         response.raise_for_status()
         search_results = response.json().get("organic", [])
         if not search_results:
@@ -40,26 +57,30 @@ async def serper_search(query: str) -> str:
                 if "địa chỉ" in snippet.lower():
                     addr_match = re.search(r"Địa chỉ: (.+?)(?:-|$)", snippet, re.IGNORECASE)
                     if addr_match: found_entities[mst]["address"] = addr_match.group(1).strip()
+        if found_entities:
+            await entity_index.upsert_entities_async(list(found_entities.values()))
         if not found_entities:
             return json.dumps([{"title": r.get("title"), "snippet": r.get("snippet")} for r in search_results[:5]], ensure_ascii=False, indent=2)
         return json.dumps(list(found_entities.values()), ensure_ascii=False, indent=2)
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         return f"Error during Serper search: {str(e)}"
 
 async def gemini_live_search(query: str) -> str:
     try:
-        model = genai.GenerativeModel(MODEL_LIVE)
-        response = await model.generate_content_async(query)
+        model = get_model("live")
+        async with admission.slot(MODEL_LIVE):
+            response = await model.generate_content_async(query)
         return response.text
     except Exception as e:
         return f"Error during Gemini Live query: {str(e)}"
 
 async def translate_to_english(text: str) -> str:
     try:
-        model = genai.GenerativeModel(MODEL_FLASH)
-        response = await model.generate_content_async(
-            f"Translate the following text to English for an image generation AI. Respond with ONLY the translated English text, nothing else.\n\nText: \"{text}\""
-        )
+        model = get_model("translator")
+        async with admission.slot(MODEL_FLASH):
+            response = await model.generate_content_async(
+                f"Translate the following text to English for an image generation AI. Respond with ONLY the translated English text, nothing else.\n\nText: \"{text}\""
+            )
         return response.text.strip()
     except Exception as e:
         print(f"Lỗi khi dịch thuật: {e}")
@@ -71,19 +92,21 @@ async def generate_image(query: str) -> str:
     try:
         safe_prompt = english_prompt[:250]
         encoded_prompt = urllib.parse.quote(safe_prompt)
-        api_url = f"https://image.pollinations.ai/prompt/{encoded_prompt}?nologo=true&width=1024&height=576"
+        api_url = f"{IMAGE_API_URL}/{encoded_prompt}?nologo=true&width=1024&height=576"
         
         headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'}
-        response = requests.get(api_url, timeout=90, allow_redirects=True, headers=headers)
+        response = await get_http_client().get(api_url, timeout=IMAGE_API_TIMEOUT, follow_redirects=True, headers=headers)
         response.raise_for_status()
 
-        if 'image' in response.headers.get('Content-Type', '').lower():
-            base64_image = base64.b64encode(response.content).decode('utf-8')
-            return base64_image
+        mime_type = sniff_mime_type(response.content)
+        if 'image' in response.headers.get('Content-Type', '').lower() and mime_type in blob_store.MIME_TYPES.values():
+            # Lưu ảnh vào kho blob, chỉ trả URL ngắn thay vì cả ảnh base64
+            blob_id = await asyncio.to_thread(blob_store.put, response.content, mime_type)
+            return json.dumps({"image_url": blob_store.blob_url(blob_id), "prompt": english_prompt}, ensure_ascii=False)
         else:
             return "[Lỗi: API tạo ảnh không trả về định dạng hình ảnh hợp lệ]"
             
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         return f"[Lỗi khi gọi API tạo ảnh: {e}]"
     except Exception as e:
         return f"[Lỗi không xác định trong quá trình tạo ảnh: {e}]"
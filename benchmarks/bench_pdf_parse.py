@@ -0,0 +1,109 @@
+"""
+Benchmark trích xuất PDF: so sánh cách cũ (nối chuỗi `text +=`, tuần tự)
+với engine mới ở chế độ tuần tự và song song, trên file PDF tổng hợp nhiều trang.
+
+Chạy từ thư mục gốc dự án:
+    python -m benchmarks.bench_pdf_parse --pages 500 --workers 4
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+os.environ.setdefault("SERPER_API_KEY", "benchmark")
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import pypdf  # noqa: E402
+from app.services import file_parser  # noqa: E402
+
+
+def build_synthetic_pdf(path: Path, pages: int, lines_per_page: int = 40):
+    """Sinh một file PDF hợp lệ với `pages` trang văn bản, không cần thư viện ngoài."""
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # Pages, điền sau khi biết danh sách trang
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    page_ids = []
+    for page_no in range(pages):
+        lines = [
+            f"({'Page %d line %d: synthetic contract clause lorem ipsum dolor sit amet' % (page_no + 1, i + 1)}) Tj 0 -16 Td"
+            for i in range(lines_per_page)
+        ]
+        stream = ("BT /F1 10 Tf 40 800 Td " + " ".join(lines) + " ET").encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        content_id = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id
+        )
+        page_ids.append(len(objects))
+    kids = b" ".join(b"%d 0 R" % pid for pid in page_ids)
+    objects[1] = b"<< /Type /Pages /Kids [" + kids + b"] /Count %d >>" % pages
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % i + body + b"\nendobj\n"
+    xref_at = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % off for off in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref_at)
+    path.write_bytes(bytes(out))
+
+
+def legacy_parse_pdf(file_path: Path) -> str:
+    """Bản cũ của parse_pdf, giữ lại làm mốc so sánh."""
+    text = ""
+    reader = pypdf.PdfReader(file_path)
+    for page in reader.pages:
+        text += page.extract_text() + "\n"
+    return text
+
+
+def timed(label: str, func, repeat: int) -> float:
+    best = float("inf")
+    result = ""
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    print(f"{label:<28} {best * 1000:10.1f} ms   ({len(result):,} ký tự)")
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf_path = Path(tmp) / "synthetic.pdf"
+        build_synthetic_pdf(pdf_path, args.pages)
+        print(f"PDF tổng hợp: {args.pages} trang, {pdf_path.stat().st_size / 1024:.0f} KB\n")
+
+        file_parser.PDF_MAX_PAGES = max(file_parser.PDF_MAX_PAGES, args.pages)
+        file_parser.PDF_PARSE_TIMEOUT = 3600
+
+        legacy = timed("legacy (text +=)", lambda: legacy_parse_pdf(pdf_path), args.repeat)
+
+        file_parser.PDF_PARALLEL_WORKERS = 1
+        sequential = timed("engine mới, tuần tự", lambda: file_parser.parse_pdf(pdf_path).text, args.repeat)
+
+        file_parser.PDF_PARALLEL_WORKERS = args.workers
+        file_parser.PDF_PARALLEL_MIN_PAGES = 1
+        file_parser.parse_pdf(pdf_path)  # khởi động process pool trước khi đo
+        parallel = timed(f"engine mới, {args.workers} process", lambda: file_parser.parse_pdf(pdf_path).text, args.repeat)
+        file_parser.shutdown_pdf_pool()
+
+        print(f"\nTăng tốc tuần tự: {legacy / sequential:.2f}x, song song: {legacy / parallel:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Benchmark làm sạch markdown khi stream: so sánh chuỗi `.replace()` cũ (mỗi chunk xử lý độc lập,
+cộng regex cho chế độ HTML) với StreamSanitizer một lượt, có trạng thái giữa các chunk.
+
+Chạy từ thư mục gốc dự án:
+    python -m benchmarks.bench_sanitizer --chunks 20000 --chunk-size 24
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+os.environ.setdefault("SERPER_API_KEY", "benchmark")
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.services.stream_sanitizer import StreamSanitizer  # noqa: E402
+
+SAMPLE = (
+    "## Phân tích\n**Công ty** có mã số thuế `0101234567`, đại diện là ông Nguyễn Văn A. "
+    "### Bước tiếp theo\nTra cứu thêm bằng [CallTool: serper_search(query=\"0101234567\")] "
+    "và đối chiếu với *dữ liệu* trong file đính kèm. "
+)
+
+
+def build_chunks(count: int, size: int, seed: int = 42) -> list[str]:
+    """Cắt văn bản mẫu thành các chunk dài ngẫu nhiên quanh `size` ký tự, giống token stream của model."""
+    rng = random.Random(seed)
+    text = SAMPLE * (count * size // len(SAMPLE) + 1)
+    chunks, pos = [], 0
+    while len(chunks) < count:
+        step = rng.randint(max(1, size // 2), size * 3 // 2)
+        chunks.append(text[pos:pos + step])
+        pos += step
+    return chunks
+
+
+def legacy_plain(chunks: list[str]) -> str:
+    """Bản cũ trong gemini_service: chuỗi replace trên từng chunk."""
+    return "".join(c.replace('**', '').replace('###', '').replace('##', '').replace('#', '') for c in chunks)
+
+
+def legacy_html(chunks: list[str]) -> str:
+    """Bản cũ sanitize_and_format_for_html."""
+    out = []
+    for c in chunks:
+        cleaned = c.replace('**', '').replace('###', '').replace('##', '').replace('#', '')
+        out.append(re.sub(r'`([^`]+)`', r'<code>\1</code>', cleaned))
+    return "".join(out)
+
+
+def streaming(chunks: list[str], html: bool) -> str:
+    sanitizer = StreamSanitizer(html=html)
+    out = [sanitizer.feed(c) for c in chunks]
+    out.append(sanitizer.flush())
+    return "".join(out)
+
+
+def timed(label: str, func, repeat: int) -> float:
+    best = float("inf")
+    result = ""
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    print(f"{label:<32} {best * 1000:10.1f} ms   ({len(result):,} ký tự)")
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--chunk-size", type=int, default=24)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    chunks = build_chunks(args.chunks, args.chunk_size)
+    whole = "".join(chunks)
+    print(f"{len(chunks):,} chunk, tổng {len(whole):,} ký tự\n")
+
+    plain_old = timed("legacy replace (text)", lambda: legacy_plain(chunks), args.repeat)
+    plain_new = timed("StreamSanitizer (text)", lambda: streaming(chunks, False), args.repeat)
+    html_old = timed("legacy replace + regex (html)", lambda: legacy_html(chunks), args.repeat)
+    html_new = timed("StreamSanitizer (html)", lambda: streaming(chunks, True), args.repeat)
+
+    # Bản cũ sai khi ký hiệu bị cắt giữa hai chunk; bản mới phải cho cùng kết quả như khi xử lý cả văn bản
+    print(f"\nSai lệch do ranh giới chunk (legacy): text={legacy_plain(chunks) != legacy_plain([whole])}, "
+          f"html={legacy_html(chunks) != legacy_html([whole])}")
+    print(f"Sai lệch do ranh giới chunk (mới):    text={streaming(chunks, False) != legacy_plain([whole])}, "
+          f"html={streaming(chunks, True) != legacy_html([whole])}")
+    print(f"Tỉ lệ thời gian mới/cũ: text {plain_new / plain_old:.2f}x, html {html_new / html_old:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""
+Chạy app với backend Gemini giả lập (benchmarks/fake_genai.py) để benchmark mà không tốn quota.
+
+Chạy từ thư mục gốc dự án (cùng với benchmarks.fake_serper):
+    python -m benchmarks.fake_serper --port 8901 &
+    python -m benchmarks.bench_server --port 8000 --workers 2
+Các tham số của model giả lấy từ biến môi trường FAKE_GENAI_* (xem fake_genai.py).
+"""
+import argparse
+import os
+import sys
+from pathlib import Path
+
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+os.environ.setdefault("SERPER_API_KEY", "benchmark")
+os.environ.setdefault("SERPER_URL", "http://127.0.0.1:8901/search")
+os.environ.setdefault("IMAGE_API_URL", "http://127.0.0.1:8901/prompt")
+# Không làm nóng model và không dùng cache (tìm kiếm, router, cache dùng chung), để mỗi request đi trọn pipeline
+os.environ.setdefault("MODEL_WARMUP", "0")
+os.environ.setdefault("SEARCH_CACHE_TTL", "0")
+os.environ.setdefault("SHARED_CACHE_ENABLED", "0")
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from benchmarks import fake_genai  # noqa: E402
+
+fake_genai.install()
+
+from main import app  # noqa: E402,F401
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args()
+    # Mỗi worker import lại module này nên cũng cài backend giả trước khi tạo app
+    uvicorn.run("benchmarks.bench_server:app", host=args.host, port=args.port, workers=args.workers, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
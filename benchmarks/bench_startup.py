@@ -0,0 +1,121 @@
+"""
+Báo cáo thời gian khởi động: phân rã thời gian import `main` theo từng module (python -X importtime)
+và đo thời gian từ lúc chạy process tới khi server trả lời request đầu tiên (cold start).
+
+Chạy từ thư mục gốc dự án:
+    python -m benchmarks.bench_startup imports --top 25
+    python -m benchmarks.bench_startup first-request --server uvicorn --repeat 3
+    python -m benchmarks.bench_startup first-request --server gunicorn --workers 4 --preload 0
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+from collections import defaultdict
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+def _env(**extra) -> dict:
+    env = dict(os.environ)
+    env.setdefault("GEMINI_API_KEY", "benchmark")
+    env.setdefault("SERPER_API_KEY", "benchmark")
+    # Không gọi API thật khi khởi động
+    env.setdefault("MODEL_WARMUP", "0")
+    env.update(extra)
+    return env
+
+
+def import_report(top: int):
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=ROOT, env=_env(), capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        sys.exit(proc.stderr)
+
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((name.rstrip(), int(self_us), int(cumulative_us)))
+
+    total = sum(self_us for _, self_us, _ in rows)
+    by_package = defaultdict(int)
+    for name, self_us, _ in rows:
+        by_package[name.strip().split(".")[0]] += self_us
+
+    print(f"Tổng thời gian import main: {total / 1000:.0f} ms ({len(rows)} module)\n")
+    print(f"{'package':<36} {'ms':>8} {'%':>6}")
+    for package, self_us in sorted(by_package.items(), key=lambda item: -item[1])[:top]:
+        print(f"{package:<36} {self_us / 1000:8.1f} {self_us / total:6.1%}")
+
+    print(f"\n{'module (cộng dồn)':<60} {'ms':>8}")
+    for name, _, cumulative_us in sorted(rows, key=lambda row: -row[2])[:top]:
+        print(f"{name:<60} {cumulative_us / 1000:8.1f}")
+
+
+def _server_command(args, port: int) -> tuple[list[str], dict]:
+    if args.server == "gunicorn":
+        command = [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "main:app"]
+        return command, _env(PORT=str(port), WEB_CONCURRENCY=str(args.workers), GUNICORN_PRELOAD=args.preload)
+    command = [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"]
+    return command, _env()
+
+
+def time_to_first_request(args, port: int) -> float:
+    command, env = _server_command(args, port)
+    start = time.perf_counter()
+    proc = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - start < args.timeout:
+            if proc.poll() is not None:
+                sys.exit(f"Server dừng với mã {proc.returncode}")
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - start
+            except OSError:
+                time.sleep(0.02)
+        sys.exit("Quá thời gian chờ server khởi động")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def first_request_report(args):
+    results = []
+    for i in range(args.repeat):
+        elapsed = time_to_first_request(args, args.port)
+        results.append(elapsed)
+        print(f"lần {i + 1}: {elapsed * 1000:.0f} ms")
+    print(f"\n{args.server}: trung vị {statistics.median(results) * 1000:.0f} ms, tốt nhất {min(results) * 1000:.0f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="mode", required=True)
+    imports = sub.add_parser("imports", help="phân rã thời gian import theo module")
+    imports.add_argument("--top", type=int, default=20)
+    first = sub.add_parser("first-request", help="thời gian từ khi chạy process tới request đầu tiên")
+    first.add_argument("--server", choices=["uvicorn", "gunicorn"], default="uvicorn")
+    first.add_argument("--workers", type=int, default=4)
+    first.add_argument("--preload", choices=["0", "1"], default="1")
+    first.add_argument("--port", type=int, default=8765)
+    first.add_argument("--repeat", type=int, default=3)
+    first.add_argument("--timeout", type=float, default=60)
+    args = parser.parse_args()
+
+    if args.mode == "imports":
+        import_report(args.top)
+    else:
+        first_request_report(args)
+
+
+if __name__ == "__main__":
+    main()
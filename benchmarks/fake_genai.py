@@ -0,0 +1,181 @@
+"""
+Backend giả lập cho `google.generativeai` dùng khi benchmark: không gọi mạng, không tốn quota.
+
+Thay `genai.GenerativeModel` bằng một lớp giả có cùng các phương thức mà app dùng
+(generate_content_async, start_chat().send_message_async, count_tokens_async), stream văn bản
+với time-to-first-token và tốc độ token cấu hình được. Lượt suy luận đầu của model Pro chèn một
+chỉ thị `[CallTool: serper_search(query="...")]` để chạy trọn vòng agent.
+
+Cấu hình qua biến môi trường (đọc lúc install()):
+    FAKE_GENAI_PRO_TTFT_MS      time-to-first-token của model Pro (mặc định 800)
+    FAKE_GENAI_FLASH_TTFT_MS    time-to-first-token của các model Flash (mặc định 250)
+    FAKE_GENAI_TOKENS_PER_SEC   tốc độ sinh token (mặc định 80)
+    FAKE_GENAI_CHUNK_TOKENS     số token mỗi chunk stream (mặc định 8)
+    FAKE_GENAI_ANSWER_TOKENS    số token mỗi câu trả lời (mặc định 240)
+    FAKE_GENAI_TOOL_RATE        xác suất lượt suy luận gọi công cụ (mặc định 1.0)
+    FAKE_GENAI_TAIL_RATE        xác suất một lượt gọi bị chậm bất thường (mặc định 0.02)
+    FAKE_GENAI_TAIL_FACTOR      hệ số nhân TTFT của lượt chậm (mặc định 8)
+    FAKE_GENAI_SEED             seed cho bộ sinh ngẫu nhiên (mặc định 1234)
+"""
+import asyncio
+import os
+import random
+from dataclasses import dataclass
+
+_WORDS = (
+    "công ty doanh nghiệp mã số thuế đại diện pháp luật địa chỉ trụ sở thông tin tra cứu "
+    "phân tích kết quả dữ liệu thị trường báo cáo tài chính hợp đồng khách hàng dịch vụ"
+).split()
+
+
+@dataclass
+class FakeSettings:
+    pro_ttft: float = 0.8
+    flash_ttft: float = 0.25
+    tokens_per_sec: float = 80.0
+    chunk_tokens: int = 8
+    answer_tokens: int = 240
+    tool_rate: float = 1.0
+    tail_rate: float = 0.02
+    tail_factor: float = 8.0
+
+    @classmethod
+    def from_env(cls) -> "FakeSettings":
+        return cls(
+            pro_ttft=float(os.getenv("FAKE_GENAI_PRO_TTFT_MS", "800")) / 1000,
+            flash_ttft=float(os.getenv("FAKE_GENAI_FLASH_TTFT_MS", "250")) / 1000,
+            tokens_per_sec=float(os.getenv("FAKE_GENAI_TOKENS_PER_SEC", "80")),
+            chunk_tokens=int(os.getenv("FAKE_GENAI_CHUNK_TOKENS", "8")),
+            answer_tokens=int(os.getenv("FAKE_GENAI_ANSWER_TOKENS", "240")),
+            tool_rate=float(os.getenv("FAKE_GENAI_TOOL_RATE", "1.0")),
+            tail_rate=float(os.getenv("FAKE_GENAI_TAIL_RATE", "0.02")),
+            tail_factor=float(os.getenv("FAKE_GENAI_TAIL_FACTOR", "8")),
+        )
+
+
+settings = FakeSettings()
+_rng = random.Random(1234)
+
+
+class FakeChunk:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FakeResponse:
+    """Giống GenerateContentResponse ở mức app cần: thuộc tính .text và async-iterate theo chunk."""
+
+    def __init__(self, chunks: list[str], ttft: float, chunk_delay: float):
+        self._chunks = chunks
+        self._ttft = ttft
+        self._chunk_delay = chunk_delay
+
+    @property
+    def text(self) -> str:
+        return "".join(self._chunks)
+
+    async def __aiter__(self):
+        await asyncio.sleep(self._ttft)
+        for i, chunk in enumerate(self._chunks):
+            if i:
+                await asyncio.sleep(self._chunk_delay)
+            yield FakeChunk(chunk)
+
+
+class FakeTokenCount:
+    def __init__(self, total_tokens: int):
+        self.total_tokens = total_tokens
+
+
+def _words(count: int) -> list[str]:
+    return [_rng.choice(_WORDS) for _ in range(count)]
+
+
+def _chunk(tokens: list[str]) -> list[str]:
+    size = max(1, settings.chunk_tokens)
+    return [" ".join(tokens[i:i + size]) + " " for i in range(0, len(tokens), size)]
+
+
+def _prompt_text(contents) -> str:
+    if isinstance(contents, str):
+        return contents
+    if isinstance(contents, (list, tuple)):
+        return " ".join(item for item in contents if isinstance(item, str))
+    return str(contents)
+
+
+def _user_request(message: str) -> str:
+    marker = "## USER REQUEST ##\n"
+    if marker not in message:
+        return "công ty"
+    return message.split(marker, 1)[1].split("\n", 1)[0].strip().replace('"', "")[:120] or "công ty"
+
+
+class FakeGenerativeModel:
+    def __init__(self, model_name: str = "fake", generation_config=None, **kwargs):
+        self.model_name = model_name
+        self.generation_config = generation_config
+        self._is_pro = "pro" in model_name
+
+    def _ttft(self) -> float:
+        ttft = settings.pro_ttft if self._is_pro else settings.flash_ttft
+        if _rng.random() < settings.tail_rate:
+            ttft *= settings.tail_factor
+        # Dao động ±25% quanh giá trị cấu hình
+        return ttft * _rng.uniform(0.75, 1.25)
+
+    def _response(self, chunks: list[str]) -> FakeResponse:
+        return FakeResponse(chunks, self._ttft(), settings.chunk_tokens / settings.tokens_per_sec)
+
+    def _answer(self, prompt: str) -> list[str]:
+        if "Respond with ONLY 'simple_answer' or 'complex_reasoning'" in prompt:
+            return ["complex_reasoning"]
+        if prompt.startswith("Translate the following text"):
+            return ["a watercolor painting of a lighthouse"]
+        return _chunk(_words(settings.answer_tokens))
+
+    async def generate_content_async(self, contents=None, stream: bool = False, **kwargs):
+        response = self._response(self._answer(_prompt_text(contents)))
+        if stream:
+            return response
+        # Không stream: chờ đủ thời gian sinh toàn bộ câu trả lời rồi mới trả về
+        await asyncio.sleep(response._ttft + response._chunk_delay * max(0, len(response._chunks) - 1))
+        return response
+
+    async def count_tokens_async(self, contents=None, **kwargs):
+        return FakeTokenCount(max(1, len(_prompt_text(contents)) // 4))
+
+    def start_chat(self, history=None, **kwargs) -> "FakeChatSession":
+        return FakeChatSession(self)
+
+
+class FakeChatSession:
+    def __init__(self, model: FakeGenerativeModel):
+        self.model = model
+        self.history = []
+
+    async def send_message_async(self, content, stream: bool = False, **kwargs):
+        message = _prompt_text(content)
+        if "## USER REQUEST ##" in message:
+            # Lượt suy luận đầu: chèn chỉ thị gọi công cụ vào giữa luồng
+            tokens = _words(settings.answer_tokens // 2)
+            chunks = ["<thinking>"] + _chunk(tokens)
+            if _rng.random() < settings.tool_rate:
+                chunks.insert(len(chunks) // 2, f'[CallTool: serper_search(query="{_user_request(message)}")] ')
+            chunks.append("</thinking>")
+        else:
+            chunks = _chunk(_words(settings.answer_tokens))
+        response = self.model._response(chunks)
+        if stream:
+            return response
+        await asyncio.sleep(response._ttft + response._chunk_delay * max(0, len(response._chunks) - 1))
+        return response
+
+
+def install():
+    """Thay GenerativeModel của google.generativeai bằng bản giả (gọi trước khi app tạo model)."""
+    global settings, _rng
+    settings = FakeSettings.from_env()
+    _rng = random.Random(int(os.getenv("FAKE_GENAI_SEED", "1234")))
+    import google.generativeai as genai
+    genai.GenerativeModel = FakeGenerativeModel
@@ -0,0 +1,67 @@
+"""
+Server giả lập Serper (POST /search) và API tạo ảnh (GET /prompt/{text}) cho benchmark.
+
+Chạy từ thư mục gốc dự án:
+    python -m benchmarks.fake_serper --port 8901 --latency-ms 300
+rồi trỏ app tới server này:
+    SERPER_URL=http://127.0.0.1:8901/search IMAGE_API_URL=http://127.0.0.1:8901/prompt
+"""
+import argparse
+import asyncio
+import hashlib
+import io
+import random
+
+import uvicorn
+from fastapi import FastAPI, Request, Response
+from PIL import Image
+
+app = FastAPI(title="Fake Serper")
+LATENCY = {"mean": 0.3}
+
+
+async def _sleep():
+    await asyncio.sleep(LATENCY["mean"] * random.uniform(0.5, 1.5))
+
+
+@app.post("/search")
+async def search(request: Request):
+    body = await request.json()
+    query = str(body.get("q", ""))
+    await _sleep()
+    # MST giả ổn định theo truy vấn để chỉ mục doanh nghiệp cũng được dùng tới
+    tax_code = str(int(hashlib.sha256(query.encode()).hexdigest(), 16))[:10]
+    organic = [
+        {
+            "title": f"CÔNG TY TNHH {query.upper()[:40]} - {tax_code}",
+            "link": f"https://example.com/{tax_code}",
+            "snippet": f"Mã số thuế: {tax_code} - Đại diện pháp luật: Nguyễn Văn A - Địa chỉ: 1 Lê Lợi, Hà Nội",
+        }
+    ] + [
+        {"title": f"Kết quả {i} cho {query}", "link": f"https://example.com/{i}", "snippet": "Thông tin tham khảo."}
+        for i in range(1, 6)
+    ]
+    return {"organic": organic}
+
+
+@app.get("/prompt/{text:path}")
+async def prompt_image(text: str):
+    await _sleep()
+    img = Image.new("RGB", (1024, 576), tuple(hashlib.sha256(text.encode()).digest()[:3]))
+    out = io.BytesIO()
+    img.save(out, format="JPEG", quality=80)
+    return Response(content=out.getvalue(), media_type="image/jpeg")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8901)
+    parser.add_argument("--latency-ms", type=float, default=300)
+    args = parser.parse_args()
+    LATENCY["mean"] = args.latency_ms / 1000
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
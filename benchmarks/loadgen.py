@@ -0,0 +1,224 @@
+"""
+Load generator cho /api/chat-agent và /api/chat-with-file: chạy N request với mức đồng thời cho trước,
+đo time-to-first-event (TTFE), time-to-final-answer (TTFA), thông lượng và độ trễ event loop của server
+(đọc từ /metrics), rồi lưu/so sánh với kết quả baseline trong benchmarks/baselines/.
+
+Chạy từ thư mục gốc dự án, khi benchmarks.bench_server đang chạy:
+    python -m benchmarks.loadgen --concurrency 16 --requests 200 --save-baseline chat_agent_c16
+    python -m benchmarks.loadgen --concurrency 16 --requests 200 --compare chat_agent_c16
+    python -m benchmarks.loadgen --endpoint chat-with-file --file docs/contract.pdf --concurrency 4
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import time
+import uuid
+from pathlib import Path
+
+import httpx
+
+BASELINE_DIR = Path(__file__).resolve().parent / "baselines"
+# Số liệu mà giá trị lớn hơn là tốt hơn; các số liệu còn lại nhỏ hơn là tốt hơn
+HIGHER_IS_BETTER = {"throughput_rps", "completed"}
+
+PROMPTS = [
+    "Tra cứu thông tin công ty {n} và người đại diện pháp luật",
+    "So sánh doanh thu của công ty {n} với đối thủ",
+    "Tìm địa chỉ trụ sở của doanh nghiệp {n}",
+]
+
+
+def percentile(values: list[float], p: float) -> float | None:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(p / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+async def one_request(client: httpx.AsyncClient, args, n: int) -> dict:
+    prompt = PROMPTS[n % len(PROMPTS)].format(n=n)
+    session_id = f"bench_{uuid.uuid4().hex[:12]}"
+    if args.endpoint == "chat-with-file":
+        request = client.build_request(
+            "POST", "/api/chat-with-file",
+            data={"prompt": prompt, "session_id": session_id},
+            files={"file": (args.file.name, args.file.read_bytes())},
+        )
+    else:
+        request = client.build_request("POST", "/api/chat-agent", json={"prompt": prompt, "session_id": session_id})
+
+    result = {"ok": False, "ttfe": None, "ttfa": None, "total": None, "events": 0}
+    start = time.perf_counter()
+    try:
+        response = await client.send(request, stream=True)
+        buffer = ""
+        async for text in response.aiter_text():
+            if result["ttfe"] is None:
+                result["ttfe"] = time.perf_counter() - start
+            buffer += text
+            *frames, buffer = buffer.split("\n\n")
+            for frame in frames:
+                if not frame.startswith("data: "):
+                    continue
+                result["events"] += 1
+                event_type = json.loads(frame[6:]).get("type")
+                if event_type == "final_answer":
+                    result["ttfa"] = time.perf_counter() - start
+                    result["ok"] = True
+                elif event_type == "error":
+                    result["ok"] = False
+        await response.aclose()
+    except httpx.HTTPError as e:
+        result["error"] = str(e)
+    result["total"] = time.perf_counter() - start
+    return result
+
+
+async def read_loop_lag(client: httpx.AsyncClient) -> tuple[float, float, list[float], list[int]] | None:
+    """Đọc histogram event_loop_lag_seconds (tổng, số mẫu, bucket) từ /metrics."""
+    try:
+        text = (await client.get("/metrics")).text
+    except httpx.HTTPError:
+        return None
+    total = count = 0.0
+    bounds, cumulative = [], []
+    for line in text.splitlines():
+        if line.startswith("event_loop_lag_seconds_sum"):
+            total = float(line.rsplit(" ", 1)[1])
+        elif line.startswith("event_loop_lag_seconds_count"):
+            count = float(line.rsplit(" ", 1)[1])
+        elif line.startswith("event_loop_lag_seconds_bucket"):
+            le = line.split('le="', 1)[1].split('"', 1)[0]
+            bounds.append(float("inf") if le == "+Inf" else float(le))
+            cumulative.append(int(float(line.rsplit(" ", 1)[1])))
+    return total, count, bounds, cumulative
+
+
+def lag_summary(before, after) -> dict:
+    """Độ trễ event loop trung bình và p99 (ước lượng theo bucket) trong khoảng thời gian chạy."""
+    if not before or not after or after[1] <= before[1]:
+        return {"loop_lag_mean_ms": None, "loop_lag_p99_ms": None}
+    samples = after[1] - before[1]
+    mean = (after[0] - before[0]) / samples
+    p99 = None
+    for bound, c_after, c_before in zip(after[2], after[3], before[3] or [0] * len(after[3])):
+        if c_after - c_before >= 0.99 * samples:
+            p99 = bound
+            break
+    return {
+        "loop_lag_mean_ms": round(mean * 1000, 3),
+        "loop_lag_p99_ms": None if p99 is None or p99 == float("inf") else round(p99 * 1000, 3),
+    }
+
+
+async def run(args) -> dict:
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    timeout = httpx.Timeout(args.timeout, connect=10)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=timeout) as client:
+        lag_before = await read_loop_lag(client)
+        queue = asyncio.Queue()
+        for n in range(args.requests):
+            queue.put_nowait(n)
+        results = []
+
+        async def worker():
+            while not queue.empty():
+                results.append(await one_request(client, args, queue.get_nowait()))
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - start
+        lag_after = await read_loop_lag(client)
+
+    completed = [r for r in results if r["ok"]]
+    ttfe = [r["ttfe"] for r in results if r["ttfe"] is not None]
+    ttfa = [r["ttfa"] for r in completed]
+
+    def ms(value):
+        return None if value is None else round(value * 1000, 1)
+
+    summary = {
+        "requests": len(results),
+        "completed": len(completed),
+        "errors": len(results) - len(completed),
+        "throughput_rps": round(len(completed) / elapsed, 3) if elapsed else None,
+        "ttfe_p50_ms": ms(percentile(ttfe, 50)),
+        "ttfe_p95_ms": ms(percentile(ttfe, 95)),
+        "ttfe_p99_ms": ms(percentile(ttfe, 99)),
+        "ttfa_p50_ms": ms(percentile(ttfa, 50)),
+        "ttfa_p95_ms": ms(percentile(ttfa, 95)),
+        "ttfa_p99_ms": ms(percentile(ttfa, 99)),
+    }
+    summary.update(lag_summary(lag_before, lag_after))
+    return summary
+
+
+def compare(current: dict, baseline: dict, tolerance: float) -> bool:
+    """In bảng so sánh với baseline; trả về False nếu có số liệu xấu đi quá `tolerance` (tỉ lệ)."""
+    ok = True
+    print(f"\n{'số liệu':<20} {'baseline':>12} {'hiện tại':>12} {'thay đổi':>10}")
+    for key, base in baseline["results"].items():
+        value = current.get(key)
+        if not isinstance(base, (int, float)) or not isinstance(value, (int, float)) or key == "requests":
+            continue
+        if base:
+            change = (value - base) / base
+        else:
+            change = 0.0 if value == base else (float("inf") if value > base else float("-inf"))
+        worse = -change if key in HIGHER_IS_BETTER else change
+        flag = ""
+        if worse > tolerance:
+            flag = "  <-- xấu đi"
+            ok = False
+        print(f"{key:<20} {base:>12} {value:>12} {change:>+9.1%}{flag}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--endpoint", choices=["chat-agent", "chat-with-file"], default="chat-agent")
+    parser.add_argument("--file", type=Path, help="file gửi kèm cho chat-with-file")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--save-baseline", metavar="NAME")
+    parser.add_argument("--compare", metavar="NAME")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="mức xấu đi cho phép khi so sánh (mặc định 10%%)")
+    args = parser.parse_args()
+    if args.endpoint == "chat-with-file" and not args.file:
+        parser.error("--file là bắt buộc với chat-with-file")
+
+    results = asyncio.run(run(args))
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+
+    if args.save_baseline:
+        BASELINE_DIR.mkdir(exist_ok=True)
+        path = BASELINE_DIR / f"{args.save_baseline}.json"
+        record = {
+            "endpoint": args.endpoint,
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "environment": {
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpu_count": os.cpu_count(),
+                "fake_genai": {k: v for k, v in os.environ.items() if k.startswith("FAKE_GENAI_")},
+            },
+            "results": results,
+        }
+        path.write_text(json.dumps(record, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
+        print(f"\nĐã lưu baseline: {path}")
+
+    if args.compare:
+        baseline = json.loads((BASELINE_DIR / f"{args.compare}.json").read_text(encoding="utf-8"))
+        if not compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,15 @@
+"""
+Cấu hình gunicorn: gunicorn -c gunicorn.conf.py main:app
+
+GUNICORN_PRELOAD=1 (mặc định): process master import app một lần trước khi fork, các worker dùng chung
+phần bộ nhớ đó theo cơ chế copy-on-write nên khởi động gần như tức thì. Các thư viện nặng (pandas, pypdf...)
+không nằm trên đường khởi động: mỗi worker import chúng dưới nền sau khi đã nhận request (import_warmup.py).
+Model Gemini, kết nối HTTP, SQLite và các pool luôn được tạo trong từng worker (sự kiện startup),
+không bao giờ trong master, nên fork vẫn an toàn.
+"""
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", "4"))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = os.getenv("GUNICORN_PRELOAD", "1") == "1"
@@ -1,7 +1,20 @@
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from app.api.chat import router as chat_router
-from app.db.history_manager import init_db
+from app.api.stats import router as stats_router
+from app.api.blobs import router as blobs_router
+from app.api.routes import router as file_chat_router, close_file_memory
+from app.core.metrics import render_metrics, start_loop_lag_monitor
+from app.db.history_manager import init_db, close_db
+from app.db.entity_index import init_entity_index, close_entity_index
+from app.db.shared_cache import init_shared_cache, close_shared_cache
+from app.services.http_client import close_http_client
+from app.services.model_registry import start_warmup
+from app.services.import_warmup import start_import_warmup
+from app.services.file_ingest import shutdown_parse_executor
+from app.services.file_parser import shutdown_pdf_pool
+from app.services.image_preprocess import shutdown_image_executor
 
 app = FastAPI(
     title="Locaith AI Agent",
@@ -19,11 +32,36 @@ app.add_middleware(
 )
 
 @app.on_event("startup")
-def on_startup():
+async def on_startup():
     init_db()
+    init_entity_index()
+    init_shared_cache()
+    start_warmup()
+    start_import_warmup()
+    start_loop_lag_monitor()
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await close_http_client()
+    shutdown_parse_executor()
+    shutdown_pdf_pool()
+    shutdown_image_executor()
+    close_db()
+    close_entity_index()
+    close_shared_cache()
+    close_file_memory()
 
 # Đăng ký router chính cho chat agent
 app.include_router(chat_router, prefix="/api")
+app.include_router(stats_router, prefix="/api")
+app.include_router(blobs_router, prefix="/api")
+# Backend lưu hội thoại dạng file (MemoryStore)
+app.include_router(file_chat_router, prefix="/api/file")
+
+# Số liệu Prometheus của worker hiện tại
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
 
 # Endpoint test nhanh
 @app.get("/")